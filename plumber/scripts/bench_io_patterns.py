@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+bench_io_patterns.py — Benchmark the single-pass I/O matcher against per-pattern scans.
+
+Usage: python3 bench_io_patterns.py [--lines N] [--repeat K]
+Output: timing table to stdout.
+
+Generates large R and Python sources (one whole script, and the same code split
+into notebook-sized cells), then times the legacy approach (one re.finditer per
+pattern with lazy `(.+?)` groups) against IOPatternMatcher, and the matcher's
+single combined pass against its per-pattern passes at several chunk sizes
+(the crossover sets SINGLE_PASS_MAX_CHARS). Also checks that both report the
+same call sites.
+"""
+
+import random
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from scan_notebook import (
+    PY_READ_PATTERNS,
+    PY_WRITE_PATTERNS,
+    R_READ_PATTERNS,
+    R_WRITE_PATTERNS,
+    SINGLE_PASS_MAX_CHARS,
+    IOPatternMatcher,
+)
+
+CHUNK_LINES = (5, 20, 40, 80, 400)
+
+
+def legacy_pattern(pattern: str) -> str:
+    """Undo the tightened capture group to recover the original lazy pattern."""
+    return pattern.replace(r"([^,)\n]+?)", "(.+?)").replace(r"([^,\n]+?)", "(.+?)")
+
+
+def legacy_finditer(code: str, read_patterns: list[str], write_patterns: list[str]):
+    for kind, patterns in (("read", read_patterns), ("write", write_patterns)):
+        for pattern in patterns:
+            for m in re.finditer(legacy_pattern(pattern), code):
+                yield kind, m.group(1).strip()
+
+
+def generate_r(n_lines: int, rng: random.Random) -> str:
+    lines = []
+    for i in range(n_lines):
+        r = rng.random()
+        if r < 0.04:
+            lines.append(f'x{i} <- fread(paste0(INT, "f{i}.csv"))')
+        elif r < 0.07:
+            lines.append(f'fwrite(x{i}, file = "data/int/g{i}.csv")')
+        elif r < 0.08:
+            lines.append(f'write.csv(fread("data/raw/r{i}.csv"), "data/int/w{i}.csv")')
+        elif r < 0.10:
+            # Long line with many arguments and no I/O target: worst case for lazy groups
+            args = ", ".join(f'"v{j}"' for j in range(200))
+            lines.append(f"cat(paste(c({args})), sep = ' ')")
+        else:
+            lines.append(f"dt{i} <- dt[year > 2000 & state %in% states, "
+                         f".(v = sum(w * x)), by = .(id, year)]")
+    return "\n".join(lines) + "\n"
+
+
+def generate_py(n_lines: int, rng: random.Random) -> str:
+    lines = []
+    for i in range(n_lines):
+        r = rng.random()
+        if r < 0.04:
+            lines.append(f'df{i} = pd.read_csv(os.path.join(INT_DIR, "f{i}.csv"))')
+        elif r < 0.07:
+            lines.append(f'df{i}.to_csv("data/int/g{i}.csv", index=False)')
+        elif r < 0.08:
+            lines.append(f'plt.savefig("output/fig{i}.png", dpi=300)')
+        elif r < 0.10:
+            cols = ", ".join(f"'c{j}'" for j in range(200))
+            lines.append(f"df = df.groupby([{cols}]).agg('sum')")
+        else:
+            lines.append(f"df['y{i}'] = np.where(df['x'] > {i}, df['a'] * 2, df['b'] - 1)")
+    return "\n".join(lines) + "\n"
+
+
+def time_it(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    n_lines = 50_000
+    repeat = 3
+    if "--lines" in sys.argv:
+        n_lines = int(sys.argv[sys.argv.index("--lines") + 1])
+    if "--repeat" in sys.argv:
+        repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+
+    rng = random.Random(0)
+    cases = [
+        ("R", generate_r(n_lines, rng), R_READ_PATTERNS, R_WRITE_PATTERNS),
+        ("python", generate_py(n_lines, rng), PY_READ_PATTERNS, PY_WRITE_PATTERNS),
+    ]
+
+    print(f"{'case':<18} {'sites':>7} {'legacy (s)':>11} {'matcher (s)':>12} {'speedup':>8}")
+    for language, code, read_patterns, write_patterns in cases:
+        matcher = IOPatternMatcher(read_patterns, write_patterns)
+        lines = code.splitlines(keepends=True)
+        cells = ["".join(lines[i:i + 5]) for i in range(0, len(lines), 5)]
+
+        for label, chunks in ((f"{language} script", [code]), (f"{language} cells", cells)):
+            legacy = Counter(site for c in chunks
+                             for site in legacy_finditer(c, read_patterns, write_patterns))
+            single = Counter((kind, expr.strip()) for c in chunks
+                             for kind, _, expr in matcher.finditer(c))
+            if legacy != single:
+                print(f"MISMATCH in {label}: {sorted((legacy - single).items())[:5]} "
+                      f"vs {sorted((single - legacy).items())[:5]}", file=sys.stderr)
+                sys.exit(1)
+
+            t_legacy = time_it(lambda: [list(legacy_finditer(c, read_patterns, write_patterns))
+                                        for c in chunks], repeat)
+            t_single = time_it(lambda: [list(matcher.finditer(c)) for c in chunks], repeat)
+            print(f"{label:<18} {sum(legacy.values()):>7} {t_legacy:>11.4f} {t_single:>12.4f} "
+                  f"{t_legacy / t_single:>7.1f}x")
+
+    print(f"\nSingle pass vs per-pattern passes (SINGLE_PASS_MAX_CHARS = {SINGLE_PASS_MAX_CHARS})")
+    print(f"{'case':<18} {'avg chars':>9} {'single (s)':>11} {'per-pattern (s)':>16} {'ratio':>6}")
+    for language, code, read_patterns, write_patterns in cases:
+        matcher = IOPatternMatcher(read_patterns, write_patterns)
+        lines = code.splitlines(keepends=True)
+        for size in CHUNK_LINES:
+            chunks = ["".join(lines[i:i + size]) for i in range(0, len(lines), size)]
+            t_one = time_it(lambda: [list(matcher.single_pass(c)) for c in chunks], repeat)
+            t_per = time_it(lambda: [list(matcher.per_pattern(c)) for c in chunks], repeat)
+            avg = sum(map(len, chunks)) // len(chunks)
+            print(f"{language + f' x{size} lines':<18} {avg:>9} {t_one:>11.4f} {t_per:>16.4f} "
+                  f"{t_per / t_one:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
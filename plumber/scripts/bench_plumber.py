@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+bench_plumber.py — Benchmark plumber's tools on synthetic projects of increasing size.
+
+Usage: python3 bench_plumber.py [--scales 100,1000,10000] [--repeat K] [--seed S]
+                                [--tools t1,t2,...] [--work-dir DIR] [--keep]
+                                [--output results.json] [--baseline old_results.json]
+Output: results table to stdout; the results JSON to --output
+(default bench_results.json). Exits 1 if a tool failed.
+
+For each scale, synth_project.py generates a project with that many scripts and
+notebooks, and each tool in TOOLS runs on it as a subprocess, --repeat times
+(default 3). A tool's wall time is the fastest run; CPU time, peak RSS, bytes
+and read/write syscall counts come from that run (profile_run.run_measured:
+wait4 rusage and /proc/<pid>/io). When strace is installed, one extra run per
+tool under `strace -f -c` records the total syscall count; otherwise
+"syscalls" is null.
+
+build_dag_incremental is primed with one unmeasured run, and before each
+measured run a comment is appended to INCREMENTAL_FRACTION of the scripts, so
+it measures a typical edit-and-rebuild. find_duplicates runs with --no-cache.
+
+--baseline compares against an earlier results file: the table gains a column
+with the wall-time ratio per tool and scale, marked when it exceeds
+profile_run.REGRESSION_RATIO (and the difference is above MIN_WALL_DELTA_S).
+
+The project trees go under --work-dir (default: a temporary directory, removed
+afterwards unless --keep).
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from profile_run import REGRESSION_RATIO, fmt_bytes, run_measured
+from synth_project import generate_project
+
+SCRIPTS_DIR = Path(__file__).parent
+DEFAULT_SCALES = [100, 1000, 10000]
+DEFAULT_REPEAT = 3
+DEFAULT_OUTPUT = "bench_results.json"
+INCREMENTAL_FRACTION = 0.01
+MIN_WALL_DELTA_S = 0.1
+TIMEOUT_S = 3600
+
+PY = sys.executable
+TOOLS = {
+    "scan_notebook": [PY, "scan_notebook.py", "{root}"],
+    "scan_script": [PY, "scan_script.py", "{root}"],
+    "build_dag": [PY, "build_dag.py", "{root}"],
+    "build_dag_incremental": [PY, "build_dag.py", "{root}", "--incremental"],
+    "staleness": ["bash", "staleness.sh", "{root}", "--json"],
+    "find_duplicates": [PY, "find_duplicates.py", "{root}", "--no-cache"],
+}
+RESULT_FIELDS = ("exit_code", "cpu_s", "user_s", "sys_s", "max_rss_kb", "read_bytes", "write_bytes",
+                 "read_calls", "write_calls")
+
+
+def tool_argv(tool: str, root: Path) -> list[str]:
+    return [str(SCRIPTS_DIR / a) if a.endswith((".py", ".sh")) else a.replace("{root}", str(root))
+            for a in TOOLS[tool]]
+
+
+def edit_scripts(root: Path, rng: random.Random) -> None:
+    """Append a comment to INCREMENTAL_FRACTION of the project's scripts."""
+    scripts = sorted(p for p in (root / "code").rglob("s*.*") if p.suffix in (".R", ".py", ".jl", ".do"))
+    for path in rng.sample(scripts, max(1, int(len(scripts) * INCREMENTAL_FRACTION))):
+        comment = "* edited" if path.suffix == ".do" else "# edited"
+        with open(path, "a") as f:
+            f.write(comment + "\n")
+
+
+def strace_calls(argv: list[str], cwd: Path, work: Path) -> int | None:
+    """Total syscalls of argv and its children under strace -c, or None."""
+    strace = shutil.which("strace")
+    if strace is None:
+        return None
+    summary = work / "strace.txt"
+    subprocess.run([strace, "-f", "-c", "-o", str(summary), *argv], cwd=cwd,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=TIMEOUT_S)
+    try:
+        for line in summary.read_text().splitlines():
+            tokens = line.split()
+            if tokens and tokens[-1] == "total":
+                return int(tokens[3])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def tree_size(root: Path) -> int:
+    return sum(p.stat().st_size for p in root.rglob("*") if p.is_file())
+
+
+def bench_tool(tool: str, root: Path, work: Path, repeat: int, rng: random.Random) -> dict:
+    argv = tool_argv(tool, root)
+    log = work / "logs" / f"{root.name}_{tool}.log"
+    if tool == "build_dag_incremental":
+        run_measured(argv, root, log, TIMEOUT_S)
+    runs = []
+    for _ in range(repeat):
+        if tool == "build_dag_incremental":
+            edit_scripts(root, rng)
+        runs.append(run_measured(argv, root, log, TIMEOUT_S))
+        if runs[-1]["exit_code"] != 0:
+            break
+    best = min(runs, key=lambda r: (r["exit_code"] != 0, r["wall_s"]))
+    result = {"wall_s": best["wall_s"], "walls": [r["wall_s"] for r in runs]}
+    result.update({field: best.get(field) for field in RESULT_FIELDS})
+    result["syscalls"] = strace_calls(argv, root, work) if best["exit_code"] == 0 else None
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(scales: list[int], tools: list[str], work: Path, repeat: int, seed: int) -> dict:
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+        "scales": {},
+    }
+    rng = random.Random(seed)
+    for n in scales:
+        root = work / f"p{n}"
+        if root.exists():
+            shutil.rmtree(root)
+        print(f"Generating {n} files in {root}...", file=sys.stderr)
+        project = generate_project(root, n, seed)
+        project["bytes"] = tree_size(root)
+        scale = {"project": project, "tools": {}}
+        for tool in tools:
+            print(f"  {tool}...", file=sys.stderr)
+            scale["tools"][tool] = bench_tool(tool, root, work, repeat, rng)
+        results["scales"][str(n)] = scale
+    return results
+
+
+def compare(results: dict, baseline: dict) -> dict[tuple[str, str], float]:
+    """{(scale, tool): wall-time ratio against the baseline} where both ran."""
+    ratios = {}
+    for scale, entry in results["scales"].items():
+        old_tools = baseline.get("scales", {}).get(scale, {}).get("tools", {})
+        for tool, r in entry["tools"].items():
+            old = old_tools.get(tool)
+            if old and old.get("exit_code") == 0 and r["exit_code"] == 0 and old["wall_s"] > 0:
+                ratios[(scale, tool)] = r["wall_s"] / old["wall_s"]
+    return ratios
+
+
+def format_report(results: dict, baseline: dict | None) -> str:
+    lines = ["# plumber benchmark", ""]
+    lines.append(f"**Commit:** {results['commit'] or '?'}  **Python:** {results['python']}  "
+                 f"**CPUs:** {results['cpus']}  **Repeat:** best of {results['repeat']}")
+    ratios = {}
+    if baseline is not None:
+        ratios = compare(results, baseline)
+        lines.append(f"**Baseline:** commit {baseline.get('commit') or '?'}, {baseline.get('created', '?')}")
+    lines.append("")
+    header = "| Files | Tool | Wall | CPU | Peak RSS | Read | Written | Read/write calls | Syscalls |"
+    rule = "|---|---|---|---|---|---|---|---|---|"
+    if baseline is not None:
+        header += " vs baseline |"
+        rule += "---|"
+    lines += [header, rule]
+
+    regressions = 0
+    for scale, entry in results["scales"].items():
+        old_tools = (baseline or {}).get("scales", {}).get(scale, {}).get("tools", {})
+        for tool, r in entry["tools"].items():
+            if r["exit_code"] != 0:
+                row = f"| {scale} | {tool} | FAILED (exit {r['exit_code']}) | | | | | | |"
+            else:
+                calls = "-" if r["read_calls"] is None else f"{r['read_calls']:,}/{r['write_calls']:,}"
+                syscalls = "-" if r["syscalls"] is None else f"{r['syscalls']:,}"
+                rss = None if r["max_rss_kb"] is None else r["max_rss_kb"] * 1024
+                row = (f"| {scale} | {tool} | {r['wall_s']:.2f}s | {r['cpu_s']:.2f}s | {fmt_bytes(rss)} "
+                       f"| {fmt_bytes(r['read_bytes'])} | {fmt_bytes(r['write_bytes'])} | {calls} | {syscalls} |")
+            if baseline is not None:
+                ratio = ratios.get((scale, tool))
+                if ratio is None:
+                    row += " - |"
+                elif (ratio > REGRESSION_RATIO
+                      and r["wall_s"] - old_tools[tool]["wall_s"] > MIN_WALL_DELTA_S):
+                    regressions += 1
+                    row += f" **{ratio:.2f}x** |"
+                else:
+                    row += f" {ratio:.2f}x |"
+            lines.append(row)
+
+    if baseline is not None:
+        lines.append("")
+        lines.append(f"{regressions} regression(s) over {REGRESSION_RATIO}x the baseline wall time."
+                     if regressions else "No regressions against the baseline.")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    options = {"--scales": None, "--repeat": None, "--seed": None, "--tools": None,
+               "--work-dir": None, "--output": None, "--baseline": None}
+    try:
+        for flag in options:
+            if flag in args:
+                idx = args.index(flag)
+                options[flag] = args[idx + 1]
+                del args[idx:idx + 2]
+        scales = [int(s) for s in options["--scales"].split(",")] if options["--scales"] else DEFAULT_SCALES
+        repeat = int(options["--repeat"] or DEFAULT_REPEAT)
+        seed = int(options["--seed"] or 0)
+    except (IndexError, ValueError) as e:
+        print(f"Bad option: {e}", file=sys.stderr)
+        sys.exit(1)
+    tools = options["--tools"].split(",") if options["--tools"] else list(TOOLS)
+    unknown = [t for t in tools if t not in TOOLS]
+    if unknown:
+        print(f"Unknown tool(s): {', '.join(unknown)}. Known: {', '.join(TOOLS)}", file=sys.stderr)
+        sys.exit(1)
+
+    baseline = None
+    if options["--baseline"]:
+        with open(options["--baseline"]) as f:
+            baseline = json.load(f)
+
+    if options["--work-dir"]:
+        work = Path(options["--work-dir"]).resolve()
+        work.mkdir(parents=True, exist_ok=True)
+    else:
+        work = Path(tempfile.mkdtemp(prefix="plumber-bench-"))
+    try:
+        results = run_benchmark(scales, tools, work, repeat, seed)
+    finally:
+        if not options["--work-dir"] and "--keep" not in args:
+            shutil.rmtree(work, ignore_errors=True)
+
+    output = Path(options["--output"] or DEFAULT_OUTPUT)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(format_report(results, baseline))
+    print(f"\nResults written to {output}", file=sys.stderr)
+
+    failed = any(r["exit_code"] != 0 for s in results["scales"].values() for r in s["tools"].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
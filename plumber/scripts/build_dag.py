@@ -4,37 +4,80 @@ build_dag.py — Assemble a unified DAG from scan outputs and existing Makefile.
 
 Usage: python3 build_dag.py <project_root> [--notebook-scan nb.json] [--script-scan sc.json]
        python3 build_dag.py <project_root>  # reads from stdin if piped, or runs scanners
-
-If --notebook-scan / --script-scan are not provided, runs the scanners itself.
-Output: writes current/dag.json and current/dag_meta.json in project_root.
+       python3 build_dag.py <project_root> --incremental [--jobs N]
+       [--make-db]  # read Makefile targets from GNU make's database instead of the regex parser
+
+If --notebook-scan / --script-scan are not provided, runs the scanners in-process
+(one project walk and one settings resolution shared by both) and stores every
+file's scan record and content hash in current/dag_meta.json.
+With --incremental, reuses the stored record of every file whose content hash
+is unchanged. All files are rescanned when the resolved settings variables or
+the scanners themselves (scanner_version) change.
+Makefile targets come from parse_makefile. With --make-db they come from GNU
+make's own database instead (make_db.py, cached in current/make_db.json) when
+make is installed; make then remakes included makefiles and runs $(shell ...),
+so this executes project code.
+Output: writes current/dag.json, current/dag_meta.json and current/dag.sqlite
+(the indexed copy queried by dag_store.py) in project_root, each to a temp file
+renamed into place, so readers never see a partial file, and appends what
+changed since the previous build to current/dag_changes.jsonl (dag_diff.py).
 """
 
 import hashlib
 import json
 import os
 import re
-import subprocess
+import stat
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
-
-def parse_makefile(makefile_path: Path) -> dict[str, dict]:
-    """Parse Makefile targets into {target: {recipe, deps}}."""
+sys.path.insert(0, str(Path(__file__).parent))
+from dag_diff import record_changes
+from dag_store import write_store
+from make_db import make_targets
+from scan_notebook import (
+    discover_settings_files,
+    find_notebooks,
+    has_io,
+    parse_jobs_arg,
+    prepare_scan,
+    scan_all_notebooks,
+    scan_files,
+    scan_notebook,
+)
+from scan_script import find_scripts, scan_all_scripts, scan_script
+from settings_vars import load_settings_vars, settings_table
+
+PROFILE_NAME = "profile.json"
+IO_COSTS_NAME = "io_costs.json"
+
+# Bump when a scan record's fields change; edits to the scanner sources
+# invalidate stored records on their own (scanner_version)
+SCAN_RECORD_VERSION = 1
+SCANNER_SOURCES = ("scan_notebook.py", "scan_script.py", "py_ast_io.py", "notebook_stream.py")
+
+_MAKE_REF_RE = re.compile(r'\$\((\w+)\)')
+
+
+def parse_makefile(makefile_path: Path, variables: dict[str, str] | None = None) -> dict[str, dict]:
+    """Parse Makefile targets into {target: {recipe, deps}}.
+
+    `variables` is the project's settings table (settings_vars.settings_table),
+    which includes the Makefile's own variables; without it only the
+    Makefile's variables are resolved.
+    """
     if not makefile_path.exists():
         return {}
 
     text = makefile_path.read_text(errors="replace")
     targets = {}
 
-    # Parse variable definitions first
-    variables = {}
-    for m in re.finditer(r'^(\w+)\s*[:?]?=\s*(.+)$', text, re.MULTILINE):
-        val = m.group(2).strip()
-        def resolve(match):
-            return variables.get(match.group(1), match.group(0))
-        val = re.sub(r'\$\((\w+)\)', resolve, val)
-        variables[m.group(1)] = val
+    if variables is None:
+        variables = load_settings_vars(makefile_path.parent, [makefile_path.name])
+
+    def resolve(match):
+        return variables.get(match.group(1), match.group(0))
 
     # Parse targets: target: deps\n\trecipe
     # Match lines like: $(INT)/file.csv: dep1 dep2
@@ -44,10 +87,8 @@ def parse_makefile(makefile_path: Path) -> dict[str, dict]:
         recipe = m.group(3).strip()
 
         # Resolve variables in target and deps
-        def resolve(match):
-            return variables.get(match.group(1), match.group(0))
-        target = re.sub(r'\$\((\w+)\)', resolve, target)
-        deps = re.sub(r'\$\((\w+)\)', resolve, deps)
+        target = _MAKE_REF_RE.sub(resolve, target)
+        deps = _MAKE_REF_RE.sub(resolve, deps)
 
         # Skip phony and special targets
         if target.startswith(".") or target in ("all", "clean", "help"):
@@ -75,79 +116,206 @@ def classify_data_node(path: str) -> str:
     return "intermediate"  # default
 
 
-def build_dag(project_root: Path, notebook_scan: list[dict], script_scan: list[dict],
-              makefile_targets: dict[str, dict]) -> dict:
-    """Build unified DAG from scan results."""
-    nodes = {}  # id -> node dict
-    edges = []
-    warnings = []
-    all_unresolved = []
+class DependencyGraph:
+    """Nodes and edges of the pipeline DAG with forward and reverse adjacency.
 
-    # Process all scan results
-    for scan in notebook_scan + script_scan:
-        file_id = scan["file"]
-        language = scan.get("language", "unknown")
-
-        # Add script node
-        if file_id not in nodes:
-            nodes[file_id] = {
-                "id": file_id,
-                "type": "script",
-                "language": language,
-            }
-
-        # Add read edges (data -> script)
-        for read_path in scan.get("reads", []):
-            # Normalize path
-            read_id = normalize_path(read_path, project_root)
-            if read_id not in nodes:
-                nodes[read_id] = {
-                    "id": read_id,
-                    "type": "data",
-                    "subtype": classify_data_node(read_id),
-                }
-            edges.append({
-                "from": read_id,
-                "to": file_id,
-                "relation": "consumed_by",
-            })
+    Edges are deduplicated on (from, to, relation) as they are inserted, and
+    kept in first-insertion order so JSON output is stable. Edges and nodes can
+    be removed again, which watch.py uses to patch the graph in place.
+    """
 
-        # Add write edges (script -> data)
-        for write_path in scan.get("writes", []):
-            write_id = normalize_path(write_path, project_root)
-            if write_id not in nodes:
-                nodes[write_id] = {
-                    "id": write_id,
-                    "type": "data",
-                    "subtype": classify_data_node(write_id),
-                }
-            edges.append({
-                "from": file_id,
-                "to": write_id,
-                "relation": "produces",
-            })
+    def __init__(self):
+        self.nodes: dict[str, dict] = {}
+        self.out_edges: dict[str, list[dict]] = {}
+        self.in_edges: dict[str, list[dict]] = {}
+        self._edges: dict[tuple[str, str, str], dict] = {}
 
-        # Collect unresolved
-        for u in scan.get("unresolved", []):
-            all_unresolved.append({"file": file_id, "expression": u})
+    @property
+    def edges(self) -> list[dict]:
+        return list(self._edges.values())
+
+    def add_node(self, node: dict) -> dict:
+        """Add a node unless one with the same id exists; returns the stored node."""
+        return self.nodes.setdefault(node["id"], node)
+
+    def add_data_node(self, node_id: str) -> dict:
+        return self.add_node({
+            "id": node_id,
+            "type": "data",
+            "subtype": classify_data_node(node_id),
+        })
+
+    def add_edge(self, src: str, dst: str, relation: str) -> bool:
+        """Insert an edge; returns False if it was already present."""
+        key = (src, dst, relation)
+        if key in self._edges:
+            return False
+        edge = {"from": src, "to": dst, "relation": relation}
+        self._edges[key] = edge
+        self.out_edges.setdefault(src, []).append(edge)
+        self.in_edges.setdefault(dst, []).append(edge)
+        return True
+
+    def remove_edge(self, src: str, dst: str, relation: str) -> bool:
+        """Delete an edge; returns False if it was not present."""
+        edge = self._edges.pop((src, dst, relation), None)
+        if edge is None:
+            return False
+        self.out_edges[src].remove(edge)
+        self.in_edges[dst].remove(edge)
+        return True
+
+    def remove_node(self, node_id: str) -> None:
+        """Delete a node and every edge touching it."""
+        for e in self.out_edges.get(node_id, []) + self.in_edges.get(node_id, []):
+            self.remove_edge(e["from"], e["to"], e["relation"])
+        self.nodes.pop(node_id, None)
+        self.out_edges.pop(node_id, None)
+        self.in_edges.pop(node_id, None)
+
+    def degree(self, node_id: str) -> int:
+        return len(self.out_edges.get(node_id, ())) + len(self.in_edges.get(node_id, ()))
+
+    def successors(self, node_id: str) -> list[str]:
+        return [e["to"] for e in self.out_edges.get(node_id, [])]
+
+    def predecessors(self, node_id: str) -> list[str]:
+        return [e["from"] for e in self.in_edges.get(node_id, [])]
+
+    def producers(self, node_id: str) -> list[str]:
+        """Scripts with a `produces` edge into node_id."""
+        return [e["from"] for e in self.in_edges.get(node_id, []) if e["relation"] == "produces"]
+
+    def consumers(self, node_id: str) -> list[str]:
+        """Scripts with a `consumed_by` edge out of node_id."""
+        return [e["to"] for e in self.out_edges.get(node_id, []) if e["relation"] == "consumed_by"]
+
+
+def graph_from_dag(dag: dict) -> DependencyGraph:
+    """Rebuild the indexed graph from a loaded dag.json."""
+    graph = DependencyGraph()
+    for node in dag["nodes"]:
+        graph.add_node(node)
+    for e in dag["edges"]:
+        graph.add_edge(e["from"], e["to"], e["relation"])
+    return graph
+
+
+def strongly_connected_components(graph: DependencyGraph) -> list[list[str]]:
+    """Tarjan's SCC algorithm, iterative so deep pipelines can't hit the recursion limit.
+
+    Runs in O(nodes + edges). Components are returned in reverse topological
+    order of the condensed graph (sinks first).
+    """
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    on_stack: set[str] = set()
+    stack: list[str] = []
+    components: list[list[str]] = []
+    counter = 0
+
+    for root in graph.nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.successors(root)))]
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph.successors(child))))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                component.reverse()
+                components.append(component)
+
+    return components
+
+
+def analyze_cycles(graph: DependencyGraph) -> tuple[list[list[str]], list[str]]:
+    """Find every dependency cycle and a topological order of all nodes.
+
+    Returns (cycles, order). Each cycle is the full node list of a strongly
+    connected component with more than one node (or a self-loop). In `order`
+    every node comes after everything upstream of it; members of a cycle are
+    listed together.
+    """
+    components = strongly_connected_components(graph)
+    cycles = [c for c in components
+              if len(c) > 1 or c[0] in graph.successors(c[0])]
+    order = [node for component in reversed(components) for node in component]
+    return cycles, order
+
+
+def add_scan_record(graph: DependencyGraph, scan: dict, normalize) -> list[dict]:
+    """Add one scan record's script node, data nodes and edges to graph;
+    returns its unresolved entries."""
+    file_id = scan["file"]
+
+    # Add script node; a scanned file is a script even if another script
+    # already read or wrote its path as data
+    graph.nodes[file_id] = {
+        "id": file_id,
+        "type": "script",
+        "language": scan.get("language", "unknown"),
+    }
+
+    # Add read edges (data -> script)
+    for read_path in scan.get("reads", []):
+        read_id = normalize(read_path)
+        graph.add_data_node(read_id)
+        graph.add_edge(read_id, file_id, "consumed_by")
+
+    # Add write edges (script -> data)
+    for write_path in scan.get("writes", []):
+        write_id = normalize(write_path)
+        graph.add_data_node(write_id)
+        graph.add_edge(file_id, write_id, "produces")
+
+    return [{"file": file_id, "expression": u} for u in scan.get("unresolved", [])]
+
+
+def complete_dag(project_root: Path, graph: DependencyGraph, makefile_targets: dict[str, dict],
+                 normalize, unresolved: list[dict]) -> dict:
+    """Merge the Makefile targets into graph and derive the warnings, cycles
+    and topological order; returns the dag.json dict."""
+    warnings = []
 
     # Merge with Makefile targets
     makefile_merged = {}
     for target, info in makefile_targets.items():
-        target_id = normalize_path(target, project_root)
+        target_id = normalize(target)
         makefile_merged[target_id] = info
 
         # Check if target exists in our DAG
-        if target_id not in nodes:
-            nodes[target_id] = {
-                "id": target_id,
-                "type": "data",
-                "subtype": classify_data_node(target_id),
-            }
+        graph.add_data_node(target_id)
 
         # Check for orphan targets (in Makefile but no script produces them)
-        producing_edges = [e for e in edges if e["to"] == target_id and e["relation"] == "produces"]
-        if not producing_edges:
+        if not graph.producers(target_id):
             warnings.append({
                 "type": "makefile_target_no_producer",
                 "target": target_id,
@@ -155,69 +323,52 @@ def build_dag(project_root: Path, notebook_scan: list[dict], script_scan: list[d
             })
 
     # Check for data nodes that aren't in Makefile
-    for node_id, node in nodes.items():
+    for node_id, node in graph.nodes.items():
         if node["type"] == "data" and node.get("subtype") != "raw":
-            producing = [e for e in edges if e["to"] == node_id and e["relation"] == "produces"]
-            if producing and node_id not in makefile_merged:
+            if graph.producers(node_id) and node_id not in makefile_merged:
                 warnings.append({
                     "type": "missing_makefile_target",
                     "target": node_id,
                     "message": f"'{node_id}' is produced by a script but has no Makefile target",
                 })
 
-    # Detect cycles (simple DFS)
-    adjacency = {}
-    for e in edges:
-        adjacency.setdefault(e["from"], []).append(e["to"])
-
-    visited, in_stack = set(), set()
-    cycle_nodes = []
-
-    def dfs(node):
-        if node in in_stack:
-            cycle_nodes.append(node)
-            return True
-        if node in visited:
-            return False
-        visited.add(node)
-        in_stack.add(node)
-        for neighbor in adjacency.get(node, []):
-            if dfs(neighbor):
-                return True
-        in_stack.discard(node)
-        return False
-
-    for n in list(adjacency.keys()):
-        if n not in visited:
-            dfs(n)
-
-    if cycle_nodes:
+    cycles, topological_order = analyze_cycles(graph)
+    for cycle in cycles:
         warnings.append({
             "type": "cycle_detected",
-            "nodes": cycle_nodes,
-            "message": "Dependency cycle detected in the DAG",
+            "nodes": sorted(cycle),
+            "message": f"Dependency cycle detected in the DAG ({len(cycle)} nodes)",
         })
 
-    # Deduplicate edges
-    seen_edges = set()
-    unique_edges = []
-    for e in edges:
-        key = (e["from"], e["to"], e["relation"])
-        if key not in seen_edges:
-            seen_edges.add(key)
-            unique_edges.append(e)
-
     return {
         "project_root": str(project_root),
-        "nodes": sorted(nodes.values(), key=lambda n: n["id"]),
-        "edges": unique_edges,
+        "nodes": sorted(graph.nodes.values(), key=lambda n: n["id"]),
+        "edges": graph.edges,
         "makefile_targets": makefile_merged,
+        "topological_order": topological_order,
         "warnings": warnings,
-        "unresolved": all_unresolved,
+        "unresolved": unresolved,
         "scan_timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
     }
 
 
+def build_dag(project_root: Path, notebook_scan: list[dict], script_scan: list[dict],
+              makefile_targets: dict[str, dict],
+              normalizer: "PathNormalizer | None" = None) -> dict:
+    """Build unified DAG from scan results.
+
+    Paths go through `normalizer` (a fresh PathNormalizer if omitted); pass one
+    in to read its cache statistics afterwards.
+    """
+    if normalizer is None:
+        normalizer = PathNormalizer(project_root)
+    graph = DependencyGraph()
+    all_unresolved = []
+    for scan in notebook_scan + script_scan:
+        all_unresolved += add_scan_record(graph, scan, normalizer.normalize)
+    return complete_dag(project_root, graph, makefile_targets, normalizer.normalize, all_unresolved)
+
+
 def normalize_path(path: str, project_root: Path) -> str:
     """Normalize a path to be relative to project_root."""
     # Handle absolute paths
@@ -235,6 +386,73 @@ def normalize_path(path: str, project_root: Path) -> str:
         return path
 
 
+class PathNormalizer:
+    """normalize_path with a cache keyed by the raw path string.
+
+    Relative paths are normalized lexically (".", "..", duplicate slashes).
+    That is only wrong when a component is a symlink, so each directory prefix
+    is lstat-ed once per build (cached, and skipped below a prefix that does
+    not exist); paths that pass through a symlink, or climb out of the
+    project, fall back to normalize_path's resolve().
+    """
+
+    def __init__(self, project_root: Path):
+        self.project_root = project_root
+        self.cache: dict[str, str] = {}
+        self.links: dict[str, bool | None] = {}  # prefix -> is symlink (None: missing)
+        self.hits = 0
+        self.misses = 0
+        self.resolved = 0
+
+    def is_symlink(self, prefix: str) -> bool | None:
+        if prefix not in self.links:
+            try:
+                self.links[prefix] = stat.S_ISLNK(os.lstat(self.project_root / prefix).st_mode)
+            except OSError:
+                self.links[prefix] = None
+        return self.links[prefix]
+
+    def lexical(self, path: str) -> str | None:
+        """Normalized relative path, or None if resolving needs the filesystem."""
+        parts: list[str] = []
+        exists = True
+        for comp in path.split("/"):
+            if comp in ("", "."):
+                continue
+            if comp == "..":
+                if not parts:
+                    return None
+                parts.pop()
+                # Back in a directory that was checked (or the root): check again from here
+                exists = not parts or self.links.get("/".join(parts)) is not None
+                continue
+            parts.append(comp)
+            if exists:
+                link = self.is_symlink("/".join(parts))
+                if link:
+                    return None
+                exists = link is not None
+        return "/".join(parts) or "."
+
+    def normalize(self, path: str) -> str:
+        cached = self.cache.get(path)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        result = None if os.path.isabs(path) else self.lexical(path)
+        if result is None:
+            self.resolved += not os.path.isabs(path)
+            result = normalize_path(path, self.project_root)
+        self.cache[path] = result
+        return result
+
+
+def file_digest(path: Path) -> str:
+    """Short SHA256 digest of a file's contents."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+
 def compute_file_hashes(project_root: Path, nodes: list[dict]) -> dict[str, str]:
     """Compute hashes for script files for incremental rescan."""
     hashes = {}
@@ -242,61 +460,118 @@ def compute_file_hashes(project_root: Path, nodes: list[dict]) -> dict[str, str]
         if node["type"] == "script":
             fp = project_root / node["id"]
             if fp.exists():
-                content = fp.read_bytes()
-                hashes[node["id"]] = hashlib.sha256(content).hexdigest()[:16]
+                hashes[node["id"]] = file_digest(fp)
     return hashes
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 build_dag.py <project_root> [--notebook-scan nb.json] [--script-scan sc.json]",
+def scanner_version() -> str:
+    """SCAN_RECORD_VERSION plus a digest of the scanner sources; stored scan
+    records are reused only while it matches."""
+    h = hashlib.sha256()
+    for name in SCANNER_SOURCES:
+        h.update((Path(__file__).parent / name).read_bytes())
+    return f"{SCAN_RECORD_VERSION}-{h.hexdigest()[:16]}"
+
+
+def settings_digest(variables: dict[str, str]) -> str:
+    """Digest of the resolved settings variables; a change invalidates every scan record."""
+    blob = json.dumps(variables, sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def load_previous_meta(meta_path: Path) -> dict:
+    """Load dag_meta.json from the previous build, or {} if absent or unreadable."""
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def incremental_scan(ctx: dict, previous_meta: dict,
+                     jobs: int = 1) -> tuple[list[dict], list[dict], dict]:
+    """Scan notebooks and scripts in-process, reusing records of unchanged files.
+
+    `ctx` comes from scan_notebook.prepare_scan; pass previous_meta={} to scan
+    everything. Returns (notebook_scan, script_scan, meta) where meta holds the
+    file hashes, scan records, settings digest and scanner version to persist
+    for the next run.
+    """
+    project_root, files = ctx["project_root"], ctx["files"]
+    settings_files, variables = ctx["settings_files"], ctx["variables"]
+    vars_hash = settings_digest(variables)
+    version = scanner_version()
+
+    old_hashes = previous_meta.get("file_hashes", {})
+    old_records = previous_meta.get("scan_records", {})
+    if previous_meta.get("settings_hash") != vars_hash or previous_meta.get("scanner_version") != version:
+        old_records = {}
+
+    file_hashes, scan_records = {}, {}
+    rescanned = 0
+
+    def scan_all(paths: list[Path], scan_fn) -> list[dict]:
+        nonlocal rescanned
+        order, records, to_scan = [], {}, []
+        for path in paths:
+            rel = str(path.relative_to(project_root))
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue
+            order.append(rel)
+            file_hashes[rel] = digest
+            if old_hashes.get(rel) == digest and rel in old_records:
+                records[rel] = old_records[rel]
+            else:
+                to_scan.append(path)
+        for path, record in zip(to_scan, scan_files(to_scan, scan_fn, variables, project_root, jobs)):
+            records[str(path.relative_to(project_root))] = record
+        rescanned += len(to_scan)
+
+        results = []
+        for rel in order:
+            record = records[rel]
+            scan_records[rel] = record
+            if has_io(record):
+                results.append(record)
+        return results
+
+    notebook_scan = scan_all(find_notebooks(project_root, files), scan_notebook)
+    script_scan = scan_all(find_scripts(project_root, settings_files, files), scan_script)
+
+    if previous_meta:
+        print(f"Incremental scan: {rescanned} of {len(file_hashes)} files rescanned",
               file=sys.stderr)
-        sys.exit(1)
 
-    project_root = Path(sys.argv[1]).resolve()
-    scripts_dir = Path(__file__).parent
+    meta = {
+        "file_hashes": file_hashes,
+        "scan_records": scan_records,
+        "settings_hash": vars_hash,
+        "scanner_version": version,
+    }
+    return notebook_scan, script_scan, meta
 
-    nb_scan_path = None
-    sc_scan_path = None
-    for i, arg in enumerate(sys.argv):
-        if arg == "--notebook-scan" and i + 1 < len(sys.argv):
-            nb_scan_path = sys.argv[i + 1]
-        elif arg == "--script-scan" and i + 1 < len(sys.argv):
-            sc_scan_path = sys.argv[i + 1]
-
-    # Load or run notebook scan
-    if nb_scan_path:
-        with open(nb_scan_path) as f:
-            notebook_scan = json.load(f)
-    else:
-        result = subprocess.run(
-            [sys.executable, str(scripts_dir / "scan_notebook.py"), str(project_root)],
-            capture_output=True, text=True
-        )
-        notebook_scan = json.loads(result.stdout) if result.stdout.strip() else []
-
-    # Load or run script scan
-    if sc_scan_path:
-        with open(sc_scan_path) as f:
-            script_scan = json.load(f)
-    else:
-        result = subprocess.run(
-            [sys.executable, str(scripts_dir / "scan_script.py"), str(project_root)],
-            capture_output=True, text=True
-        )
-        script_scan = json.loads(result.stdout) if result.stdout.strip() else []
-
-    # Parse Makefile
-    makefile_targets = {}
+
+def find_makefile_targets(project_root: Path, variables: dict[str, str],
+                          use_make: bool = False) -> dict[str, dict]:
+    """Targets of code/Makefile, else ./Makefile, else {}.
+
+    Read with parse_makefile's regex, or, when use_make is set and GNU make is
+    available, from make's own database (make_db.py). That runs make, which
+    remakes included makefiles and evaluates $(shell ...): opt-in only.
+    """
     for mf_path in [project_root / "code" / "Makefile", project_root / "Makefile"]:
         if mf_path.exists():
-            makefile_targets = parse_makefile(mf_path)
-            break
+            targets = make_targets(project_root, mf_path, variables) if use_make else None
+            if targets is None:
+                targets = parse_makefile(mf_path, variables)
+            return targets
+    return {}
 
-    # Build DAG
-    dag = build_dag(project_root, notebook_scan, script_scan, makefile_targets)
 
-    # Detect project type
+def set_project_type(dag: dict) -> None:
+    """Label the DAG with its script language, or "mixed"."""
     languages = set()
     for n in dag["nodes"]:
         if n["type"] == "script":
@@ -308,34 +583,153 @@ def main():
     else:
         dag["project_type"] = "unknown"
 
-    # Write output
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    """Write JSON to a temp file and rename it over path, so readers never see a partial file.
+
+    The temp name carries the pid, so concurrent writers (build_dag, watch.py,
+    staleness.py --fingerprint) never share one.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def annotate_nodes(project_root: Path, dag: dict) -> None:
+    """Copy measurements onto nodes: each script's latest run from
+    current/profile.json (profile_run.py) as "runtime_s" and "profile", and
+    each data file's size, shape and fan-out from current/io_costs.json
+    (io_cost.py) as "io"."""
+    out_dir = project_root / "current"
+    try:
+        with open(out_dir / PROFILE_NAME) as f:
+            profiles = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        profiles = {}
+    try:
+        with open(out_dir / IO_COSTS_NAME) as f:
+            io_stats = json.load(f).get("nodes", {})
+    except (OSError, json.JSONDecodeError, AttributeError):
+        io_stats = {}
+    for node in dag["nodes"]:
+        if node["type"] == "script" and node["id"] in profiles:
+            node["runtime_s"] = profiles[node["id"]]["wall_s"]
+            node["profile"] = profiles[node["id"]]
+        elif node["type"] == "data" and node["id"] in io_stats:
+            node["io"] = io_stats[node["id"]]
+
+
+def write_dag(project_root: Path, dag: dict, scan_meta: dict | None = None) -> Path:
+    """Write current/dag.json, current/dag_meta.json and the SQLite store
+    current/dag.sqlite (dag_store.py); returns the dag.json path.
+
+    The structural changes since the previous write are appended to the
+    change feed first (dag_diff.py), and dag["change_seq"] records its position.
+
+    `scan_meta` (from incremental_scan) is merged into the metadata. Input
+    fingerprints recorded by `staleness.py --fingerprint` are carried over
+    from the existing dag_meta.json, and nodes get their latest
+    profile_run.py / io_cost.py measurements.
+    """
     out_dir = project_root / "current"
     out_dir.mkdir(exist_ok=True)
+    meta_path = out_dir / "dag_meta.json"
+    previous_meta = load_previous_meta(meta_path)
 
     dag_path = out_dir / "dag.json"
-    with open(dag_path, "w") as f:
-        json.dump(dag, f, indent=2)
-        f.write("\n")
+    annotate_nodes(project_root, dag)
+    dag["change_seq"], _ = record_changes(project_root, dag)
+    write_json_atomic(dag_path, dag)
 
-    # Write metadata for incremental rescan
     meta = {
-        "file_hashes": compute_file_hashes(project_root, dag["nodes"]),
+        "file_hashes": scan_meta["file_hashes"] if scan_meta is not None
+        else compute_file_hashes(project_root, dag["nodes"]),
         "scan_timestamp": dag["scan_timestamp"],
         "node_count": len(dag["nodes"]),
         "edge_count": len(dag["edges"]),
         "warning_count": len(dag["warnings"]),
     }
-    meta_path = out_dir / "dag_meta.json"
-    with open(meta_path, "w") as f:
-        json.dump(meta, f, indent=2)
-        f.write("\n")
+    if scan_meta is not None:
+        meta.update(scan_meta)
+    if "fingerprints" in previous_meta:
+        meta["fingerprints"] = previous_meta["fingerprints"]
+    write_json_atomic(meta_path, meta)
+    write_store(project_root, dag, meta["file_hashes"])
+    return dag_path
 
-    # Summary to stderr
+
+def dag_summary(dag: dict) -> str:
     n_scripts = sum(1 for n in dag["nodes"] if n["type"] == "script")
     n_data = sum(1 for n in dag["nodes"] if n["type"] == "data")
-    print(f"DAG built: {n_scripts} scripts, {n_data} data files, "
-          f"{len(dag['edges'])} edges, {len(dag['warnings'])} warnings",
-          file=sys.stderr)
+    return (f"{n_scripts} scripts, {n_data} data files, "
+            f"{len(dag['edges'])} edges, {len(dag['warnings'])} warnings")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 build_dag.py <project_root> [--notebook-scan nb.json] [--script-scan sc.json] "
+              "[--incremental] [--jobs N] [--make-db]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    jobs, argv = parse_jobs_arg(sys.argv)
+    project_root = Path(argv[1]).resolve()
+
+    nb_scan_path = None
+    sc_scan_path = None
+    incremental = "--incremental" in argv
+    for i, arg in enumerate(argv):
+        if arg == "--notebook-scan" and i + 1 < len(argv):
+            nb_scan_path = argv[i + 1]
+        elif arg == "--script-scan" and i + 1 < len(argv):
+            sc_scan_path = argv[i + 1]
+
+    out_dir = project_root / "current"
+    meta_path = out_dir / "dag_meta.json"
+    scan_meta = None
+
+    ctx = None
+    if not (nb_scan_path and sc_scan_path):
+        ctx = prepare_scan(project_root, save_settings=True)
+
+    if not (nb_scan_path or sc_scan_path):
+        previous_meta = load_previous_meta(meta_path) if incremental else {}
+        notebook_scan, script_scan, scan_meta = incremental_scan(ctx, previous_meta, jobs)
+    else:
+        # Load or run notebook scan
+        if nb_scan_path:
+            with open(nb_scan_path) as f:
+                notebook_scan = json.load(f)
+        else:
+            notebook_scan = scan_all_notebooks(ctx, jobs)
+
+        # Load or run script scan
+        if sc_scan_path:
+            with open(sc_scan_path) as f:
+                script_scan = json.load(f)
+        else:
+            script_scan = scan_all_scripts(ctx, jobs)
+
+    # Parse Makefile, resolving variables from the same table the scanners used
+    if ctx:
+        variables = ctx["variables"]
+    else:
+        variables = settings_table(project_root, discover_settings_files(project_root), save=True)
+    makefile_targets = find_makefile_targets(project_root, variables, "--make-db" in argv)
+
+    # Build DAG
+    normalizer = PathNormalizer(project_root)
+    dag = build_dag(project_root, notebook_scan, script_scan, makefile_targets, normalizer)
+    print(f"Path normalization: {normalizer.hits} cache hits, {normalizer.misses} misses "
+          f"({normalizer.resolved} resolved through symlinks or '..')", file=sys.stderr)
+    set_project_type(dag)
+
+    dag_path = write_dag(project_root, dag, scan_meta)
+
+    # Summary to stderr
+    print(f"DAG built: {dag_summary(dag)}", file=sys.stderr)
     print(str(dag_path))
 
 
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+dag_diff.py — Structural changes between DAG builds, and the feed that records them.
+
+Usage: python3 dag_diff.py [project_dir] [--since SEQ] [--json]
+Output: the latest change (or, with --since, the net change over every build
+after change SEQ) as a Markdown summary, or JSON
+{seq, complete, changes} with --json. Exits 1 if the project has no feed.
+
+Every build_dag.py run (and every watch.py update) goes through
+record_changes: the new DAG is reduced to a snapshot of hashed sets (node id
+-> digest of the node's structural fields, edges, digest -> warning), the set differences against the previous snapshot are appended to
+current/dag_changes.jsonl with a sequence number, and the snapshot replaces
+current/dag_snapshot.json. Builds that change nothing add no entry. Node
+annotations that builds carry over (runtime_s, profile, io) are not
+structural and are ignored. dag.json's "change_seq" is the feed position it
+matches, so a consumer that has read it can follow with --since change_seq.
+
+An entry lists nodes_added / nodes_changed (node objects), nodes_removed
+(ids), edges_added / edges_removed (edge objects) and warnings_added /
+warnings_removed. The first build of a project records a "baseline" entry
+with counts only, and so does a build whose previous snapshot is missing or
+unreadable. Sequence numbers keep counting from the feed across baselines,
+so a change_seq never refers to two different DAGs. The feed keeps the last
+FEED_KEEP entries; a consumer whose SEQ is older than that, newer than the
+latest entry (the feed was reset), or whose range contains a baseline, gets
+complete: false and should re-read dag.json instead.
+
+build_dag.py and watch.py can publish at the same time, so record_changes
+holds an exclusive flock on current/dag_changes.lock from reading the
+snapshot until the new one is in place: each seq is handed out once.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from project_walk import find_root
+
+SNAPSHOT_NAME = "dag_snapshot.json"
+FEED_NAME = "dag_changes.jsonl"
+LOCK_NAME = "dag_changes.lock"
+SNAPSHOT_VERSION = 1
+FEED_KEEP = 500
+ANNOTATION_KEYS = ("runtime_s", "profile", "io")
+CHANGE_LISTS = ("nodes_added", "nodes_removed", "nodes_changed", "edges_added", "edges_removed",
+                "warnings_added", "warnings_removed")
+
+
+def digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def structural(node: dict) -> dict:
+    return {k: v for k, v in node.items() if k not in ANNOTATION_KEYS}
+
+
+def node_digest(node: dict) -> str:
+    # repr of the sorted items: node fields are strings, and this is several
+    # times cheaper than a canonical json.dumps per node
+    fields = sorted((k, v) for k, v in node.items() if k not in ANNOTATION_KEYS)
+    return hashlib.sha256(repr(fields).encode()).hexdigest()[:16]
+
+
+def snapshot(dag: dict) -> dict:
+    """Hashed node, edge and warning sets of a DAG.
+
+    Nodes map id -> digest and warnings digest -> warning; an edge is its own
+    key, a (from, to, relation) tuple (a list once saved as JSON).
+    """
+    return {
+        "version": SNAPSHOT_VERSION,
+        "scan_timestamp": dag.get("scan_timestamp"),
+        "nodes": {n["id"]: node_digest(n) for n in dag["nodes"]},
+        "edges": {(e["from"], e["to"], e["relation"]) for e in dag["edges"]},
+        "warnings": {digest(w): w for w in dag["warnings"]},
+    }
+
+
+def diff_snapshots(old: dict, new: dict, dag: dict) -> dict:
+    """The change lists taking old to new; node objects come from dag."""
+    by_id = {n["id"]: n for n in dag["nodes"]}
+    old_nodes, new_nodes = old["nodes"], new["nodes"]
+    return {
+        "nodes_added": [structural(by_id[n]) for n in sorted(new_nodes.keys() - old_nodes.keys())],
+        "nodes_removed": sorted(old_nodes.keys() - new_nodes.keys()),
+        "nodes_changed": [structural(by_id[n]) for n in sorted(new_nodes.keys() & old_nodes.keys())
+                          if new_nodes[n] != old_nodes[n]],
+        "edges_added": [edge_dict(e) for e in sorted(new["edges"] - old["edges"])],
+        "edges_removed": [edge_dict(e) for e in sorted(old["edges"] - new["edges"])],
+        "warnings_added": [new["warnings"][k] for k in sorted(new["warnings"].keys() - old["warnings"].keys())],
+        "warnings_removed": [old["warnings"][k] for k in sorted(old["warnings"].keys() - new["warnings"].keys())],
+    }
+
+
+def edge_dict(triple: tuple[str, str, str]) -> dict:
+    return {"from": triple[0], "to": triple[1], "relation": triple[2]}
+
+
+def load_snapshot(project_root: Path) -> dict | None:
+    try:
+        with open(project_root / "current" / SNAPSHOT_NAME) as f:
+            snap = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if snap.get("version") != SNAPSHOT_VERSION:
+        return None
+    snap["edges"] = {tuple(e) for e in snap["edges"]}
+    return snap
+
+
+def read_feed(project_root: Path) -> list[dict]:
+    entries = []
+    try:
+        with open(project_root / "current" / FEED_NAME) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash mid-append
+    except OSError:
+        pass
+    return entries
+
+
+@contextmanager
+def feed_lock(out_dir: Path):
+    """Hold an exclusive lock on the feed and snapshot (blocks other publishers)."""
+    with open(out_dir / LOCK_NAME, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def record_changes(project_root: Path, dag: dict) -> tuple[int, dict | None]:
+    """Append dag's changes since the previous snapshot to the feed and save
+    its snapshot; returns (the feed's latest seq, the new entry or None if
+    nothing changed)."""
+    out_dir = project_root / "current"
+    out_dir.mkdir(exist_ok=True)
+    with feed_lock(out_dir):
+        return _record_changes(project_root, dag)
+
+
+def _record_changes(project_root: Path, dag: dict) -> tuple[int, dict | None]:
+    out_dir = project_root / "current"
+    previous = load_snapshot(project_root)
+    current = snapshot(dag)
+    if previous is not None:
+        seq = previous["seq"] + 1
+    else:
+        # Keep counting after whatever the feed holds, so consumers holding
+        # an older change_seq see a gap rather than a reused number
+        seq = max((e["seq"] for e in read_feed(project_root)), default=0) + 1
+    entry = {"seq": seq, "scan_timestamp": dag.get("scan_timestamp")}
+    if previous is None:
+        entry.update({"baseline": True, "nodes": len(current["nodes"]), "edges": len(current["edges"]),
+                      "warnings": len(current["warnings"])})
+    else:
+        changes = diff_snapshots(previous, current, dag)
+        if not any(changes.values()):
+            return previous["seq"], None
+        entry.update(changes)
+    current["seq"] = seq
+
+    feed_path = out_dir / FEED_NAME
+    with open(feed_path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    if seq % FEED_KEEP == 0:
+        kept = [e for e in read_feed(project_root) if e["seq"] > seq - FEED_KEEP]
+        tmp = feed_path.with_name(f"{feed_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in kept)
+        os.replace(tmp, feed_path)
+
+    snap_path = out_dir / SNAPSHOT_NAME
+    tmp = snap_path.with_name(f"{snap_path.name}.{os.getpid()}.tmp")
+    current["edges"] = sorted(current["edges"])
+    with open(tmp, "w") as f:
+        f.write(json.dumps(current))
+    os.replace(tmp, snap_path)
+    return seq, entry
+
+
+def merge_changes(entries: list[dict]) -> dict:
+    """Net change lists of consecutive feed entries (an edge added and later
+    removed cancels out; a node removed and re-added counts as changed)."""
+    added: dict[str, dict] = {}
+    changed: dict[str, dict] = {}
+    removed: set[str] = set()
+    edges: dict[tuple, bool] = {}      # edge -> True if net added, False if net removed
+    warnings: dict[str, tuple[bool, dict]] = {}
+
+    for entry in entries:
+        for node_id in entry.get("nodes_removed", []):
+            if added.pop(node_id, None) is None:
+                changed.pop(node_id, None)
+                removed.add(node_id)
+        for node in entry.get("nodes_added", []):
+            if node["id"] in removed:
+                removed.discard(node["id"])
+                changed[node["id"]] = node
+            else:
+                added[node["id"]] = node
+        for node in entry.get("nodes_changed", []):
+            (added if node["id"] in added else changed)[node["id"]] = node
+        for key, is_added in (("edges_removed", False), ("edges_added", True)):
+            for edge in entry.get(key, []):
+                k = (edge["from"], edge["to"], edge["relation"])
+                if edges.get(k) is (not is_added):
+                    del edges[k]
+                else:
+                    edges[k] = is_added
+        for key, is_added in (("warnings_removed", False), ("warnings_added", True)):
+            for warning in entry.get(key, []):
+                k = digest(warning)
+                if k in warnings and warnings[k][0] is (not is_added):
+                    del warnings[k]
+                else:
+                    warnings[k] = (is_added, warning)
+
+    return {
+        "nodes_added": [added[n] for n in sorted(added)],
+        "nodes_removed": sorted(removed),
+        "nodes_changed": [changed[n] for n in sorted(changed)],
+        "edges_added": [edge_dict(list(k)) for k in sorted(edges) if edges[k]],
+        "edges_removed": [edge_dict(list(k)) for k in sorted(edges) if not edges[k]],
+        "warnings_added": [w for k, (a, w) in sorted(warnings.items()) if a],
+        "warnings_removed": [w for k, (a, w) in sorted(warnings.items()) if not a],
+    }
+
+
+def changes_since(project_root: Path, since: int) -> dict:
+    """{seq, complete, changes}: the net change after feed entry `since`.
+
+    complete is False when entries after `since` have been trimmed from the
+    feed or include a baseline, or when `since` is past the latest entry (the
+    feed was reset); the consumer should re-read dag.json then.
+    """
+    entries = [e for e in read_feed(project_root) if e["seq"] > since]
+    latest = (load_snapshot(project_root) or {}).get("seq", 0)
+    complete = (since <= latest and not any(e.get("baseline") for e in entries)
+                and [e["seq"] for e in entries] == list(range(since + 1, latest + 1)))
+    return {"seq": latest, "complete": complete, "changes": merge_changes(entries) if complete else None}
+
+
+def change_counts(changes: dict) -> str:
+    parts = []
+    for kind in ("nodes", "edges", "warnings"):
+        plus = len(changes.get(f"{kind}_added", []))
+        minus = len(changes.get(f"{kind}_removed", []))
+        changed = len(changes.get(f"{kind}_changed", []))
+        if plus or minus or changed:
+            parts.append(f"{kind} +{plus} -{minus}" + (f" ~{changed}" if changed else ""))
+    return ", ".join(parts) or "no changes"
+
+
+def format_changes(changes: dict, title: str) -> str:
+    lines = [f"# {title}", "", f"**Summary:** {change_counts(changes)}"]
+    sections = [
+        ("Nodes added", [f"`{n['id']}` ({n['type']})" for n in changes["nodes_added"]]),
+        ("Nodes removed", [f"`{n}`" for n in changes["nodes_removed"]]),
+        ("Nodes changed", [f"`{n['id']}` ({n['type']})" for n in changes["nodes_changed"]]),
+        ("Edges added", [f"`{e['from']}` → `{e['to']}` ({e['relation']})" for e in changes["edges_added"]]),
+        ("Edges removed", [f"`{e['from']}` → `{e['to']}` ({e['relation']})" for e in changes["edges_removed"]]),
+        ("Warnings added", [f"[{w['type']}] {w.get('message', '')}" for w in changes["warnings_added"]]),
+        ("Warnings resolved", [f"[{w['type']}] {w.get('message', '')}" for w in changes["warnings_removed"]]),
+    ]
+    for heading, items in sections:
+        if items:
+            lines += ["", f"## {heading}", ""] + [f"- {item}" for item in items]
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    as_json = "--json" in args
+    since = None
+    if "--since" in args:
+        idx = args.index("--since")
+        try:
+            since = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print("--since expects a change number", file=sys.stderr)
+            sys.exit(1)
+        del args[idx:idx + 2]
+    positional = [a for a in args if not a.startswith("--")]
+
+    project_dir = Path(positional[0] if positional else os.getcwd()).resolve()
+    project_root = find_root(project_dir)
+    latest = (load_snapshot(project_root) or {}).get("seq")
+    if latest is None:
+        print(f"ERROR: No DAG change feed in {project_root / 'current'}")
+        print("Run '/plumber audit' or '/plumber status' to build the DAG first.")
+        sys.exit(1)
+
+    if since is None:
+        entries = [e for e in read_feed(project_root) if e["seq"] == latest]
+        report = {"seq": latest, "complete": bool(entries) and not entries[0].get("baseline"),
+                  "changes": None}
+        if report["complete"]:
+            report["changes"] = {k: entries[0].get(k, []) for k in CHANGE_LISTS}
+        title = f"DAG change #{latest}"
+    else:
+        report = changes_since(project_root, since)
+        if report["seq"] > since + 1:
+            title = f"DAG changes #{since + 1}–#{report['seq']}"
+        else:
+            title = f"DAG change #{report['seq']}" if report["seq"] > since else "DAG changes"
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+    elif report["changes"] is None:
+        if since is None:
+            print(f"Change #{latest} is a full rebuild: re-read current/dag.json.")
+        else:
+            print(f"The changes after #{since} include a full rebuild, are no longer in the feed "
+                  f"or postdate a reset feed: re-read current/dag.json.")
+    else:
+        print(format_changes(report["changes"], title))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+dag_store.py — Indexed SQLite copy of the DAG, and the upstream/downstream queries on it.
+
+Usage: python3 dag_store.py <project_root> <upstream|downstream|producers|consumers> <path> [--json]
+Output: one "node_id<TAB>type" line per matching node (sorted), or a JSON list
+of node objects with --json. Exits 1 if the node is not in the DAG.
+
+build_dag.py writes current/dag.sqlite next to dag.json (temp file + rename).
+Tables: nodes, edges (indexed both ways), warnings, file_hashes and info
+(project_root, project_type, scan_timestamp). upstream/downstream are
+recursive CTEs over the edge indexes, so a query touches only the part of the
+graph it returns instead of loading dag.json. If dag.json is newer than the
+store (written by an older plumber), the store is rebuilt from it first.
+
+Edges point in the direction data flows: data -> script (consumed_by) and
+script -> data (produces). upstream is everything with a path to the node,
+downstream everything reachable from it; a node is not part of its own closure.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+STORE_NAME = "dag.sqlite"
+SCHEMA_VERSION = 1
+QUERIES = ("upstream", "downstream", "producers", "consumers")
+
+SCHEMA = """
+CREATE TABLE nodes (
+    key INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    subtype TEXT,
+    language TEXT
+);
+CREATE TABLE edges (
+    src INTEGER NOT NULL REFERENCES nodes (key),
+    dst INTEGER NOT NULL REFERENCES nodes (key),
+    relation TEXT NOT NULL,
+    PRIMARY KEY (src, dst, relation)
+) WITHOUT ROWID;
+CREATE INDEX edges_by_dst ON edges (dst, src);
+CREATE TABLE warnings (
+    type TEXT NOT NULL,
+    target TEXT,
+    message TEXT,
+    detail TEXT NOT NULL
+);
+CREATE INDEX warnings_by_target ON warnings (target);
+CREATE TABLE file_hashes (
+    path TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+# Edges hold integer node keys: the recursion compares and dedups ints, and
+# ids are joined back in once at the end. Closures follow edges from the
+# start node; UNION (not UNION ALL) drops already-visited nodes, so cycles
+# terminate.
+_START = "(SELECT key FROM nodes WHERE id = :node)"
+_SELECT = "SELECT n.id, n.type, n.subtype, n.language FROM"
+_CLOSURE_SQL = {
+    "downstream": f"""
+        WITH RECURSIVE reach(key) AS (
+            SELECT dst FROM edges WHERE src = {_START}
+            UNION
+            SELECT e.dst FROM edges e JOIN reach r ON e.src = r.key
+        )
+        {_SELECT} reach JOIN nodes n USING (key) WHERE n.id != :node ORDER BY n.id""",
+    "upstream": f"""
+        WITH RECURSIVE reach(key) AS (
+            SELECT src FROM edges WHERE dst = {_START}
+            UNION
+            SELECT e.src FROM edges e JOIN reach r ON e.dst = r.key
+        )
+        {_SELECT} reach JOIN nodes n USING (key) WHERE n.id != :node ORDER BY n.id""",
+    "producers": f"""
+        {_SELECT} edges e JOIN nodes n ON n.key = e.src
+        WHERE e.dst = {_START} AND e.relation = 'produces' ORDER BY n.id""",
+    "consumers": f"""
+        {_SELECT} edges e JOIN nodes n ON n.key = e.dst
+        WHERE e.src = {_START} AND e.relation = 'consumed_by' ORDER BY n.id""",
+}
+
+
+def store_path(project_root: Path) -> Path:
+    return project_root / "current" / STORE_NAME
+
+
+def write_store(project_root: Path, dag: dict, file_hashes: dict[str, str] | None = None) -> Path:
+    """Write dag (and the script file hashes) to current/dag.sqlite; returns its path.
+
+    The database is built in a temp file of its own (concurrent writers, such
+    as a query rebuilding the store while build_dag.py or watch.py writes it,
+    never share one) and renamed into place.
+    """
+    path = store_path(project_root)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        keys = {n["id"]: key for key, n in enumerate(dag["nodes"])}
+        conn.executemany(
+            "INSERT INTO nodes VALUES (?, ?, ?, ?, ?)",
+            ((key, n["id"], n["type"], n.get("subtype"), n.get("language"))
+             for key, n in enumerate(dag["nodes"])))
+        conn.executemany(
+            "INSERT OR IGNORE INTO edges VALUES (?, ?, ?)",
+            ((keys[e["from"]], keys[e["to"]], e["relation"]) for e in dag["edges"]))
+        conn.executemany(
+            "INSERT INTO warnings VALUES (?, ?, ?, ?)",
+            ((w["type"], w.get("target"), w.get("message"), json.dumps(w)) for w in dag["warnings"]))
+        conn.executemany("INSERT INTO file_hashes VALUES (?, ?)", (file_hashes or {}).items())
+        conn.executemany(
+            "INSERT INTO info VALUES (?, ?)",
+            ((key, dag.get(key)) for key in ("project_root", "project_type", "scan_timestamp")))
+        conn.commit()
+        conn.close()
+        os.replace(tmp, path)
+    except BaseException:
+        conn.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def open_store(project_root: Path) -> sqlite3.Connection:
+    """Open current/dag.sqlite read-only, (re)building it from dag.json when it
+    is missing, from an older schema, or older than dag.json.
+
+    Raises FileNotFoundError if the project has no DAG.
+    """
+    path = store_path(project_root)
+    dag_file = project_root / "current" / "dag.json"
+    try:
+        fresh = os.stat(path).st_mtime_ns >= os.stat(dag_file).st_mtime_ns
+    except FileNotFoundError:
+        fresh = path.exists()
+    if fresh:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return conn
+        conn.close()
+
+    with open(dag_file) as f:
+        dag = json.load(f)
+    try:
+        with open(project_root / "current" / "dag_meta.json") as f:
+            file_hashes = json.load(f).get("file_hashes", {})
+    except (OSError, json.JSONDecodeError):
+        file_hashes = {}
+    write_store(project_root, dag, file_hashes)
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def node_id(project_root: Path, path: str) -> str:
+    """DAG node id for a user-supplied path: relative to project_root, normalized."""
+    if os.path.isabs(path):
+        path = os.path.relpath(path, project_root)
+    return os.path.normpath(path)
+
+
+def query(conn: sqlite3.Connection, kind: str, node: str) -> list[dict] | None:
+    """Nodes answering `kind` for node, or None if node is not in the DAG."""
+    if conn.execute("SELECT 1 FROM nodes WHERE id = ?", (node,)).fetchone() is None:
+        return None
+    results = []
+    for id_, type_, subtype, language in conn.execute(_CLOSURE_SQL[kind], {"node": node}):
+        row = {"id": id_, "type": type_}
+        if subtype is not None:
+            row["subtype"] = subtype
+        if language is not None:
+            row["language"] = language
+        results.append(row)
+    return results
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[2] not in QUERIES:
+        print(f"Usage: python3 dag_store.py <project_root> <{'|'.join(QUERIES)}> <path> [--json]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    project_root = Path(sys.argv[1]).resolve()
+    kind = sys.argv[2]
+    node = node_id(project_root, sys.argv[3])
+
+    try:
+        conn = open_store(project_root)
+    except FileNotFoundError:
+        print(f"No DAG found for {project_root}. Run build_dag.py first.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        results = query(conn, kind, node)
+    finally:
+        conn.close()
+
+    if results is None:
+        print(f"'{node}' is not a node of the DAG", file=sys.stderr)
+        sys.exit(1)
+    if "--json" in sys.argv:
+        print(json.dumps(results, indent=2))
+    else:
+        for row in results:
+            print(f"{row['id']}\t{row['type']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,27 @@
 """
 find_duplicates.py — Find duplicate data files across project + server_copy dirs.
 
-Usage: python3 find_duplicates.py <project_dir> [extra_dir1 extra_dir2 ...]
+Usage: python3 find_duplicates.py <project_dir> [extra_dir1 ...] [--io-workers N] [--no-cache]
+                                  [--full-hash] [--reclaim [--apply] [--link auto|reflink|hardlink]]
+       python3 find_duplicates.py --undo <journal>
 Output: Markdown duplicate report to stdout, also writes current/duplicate_report.md
 
-For files under 50MB: SHA256 comparison (identical vs divergent).
-For files over 50MB: size + mtime comparison only.
+Finds identical content regardless of filename, in stages so most files are
+never read: collapse hardlinks to one inode into one copy, group by size, then hash the first and last 1MB of each same-size
+candidate, then fully SHA256 only what still collides. Files over 50MB get a
+sampled fingerprint instead of a full read: SAMPLE_COUNT evenly spaced 64KB
+blocks plus the head and tail, read with pread. --full-hash escalates files that
+match on the sample to a full SHA256. Same-name files whose content differs are
+reported as divergent.
+
+--reclaim replaces the extra copies in each identical group with reflinks or
+hardlinks (see reclaim.py). It is a dry run unless --apply is given; applied
+runs write an undo journal to current/reclaim_journal_<timestamp>.jsonl.
+
+Hashing runs on a thread pool of --io-workers threads (default 8, 0 for one
+per CPU; hashlib releases the GIL). Digests persist in current/hash_cache.json
+keyed by (device, inode, size, mtime_ns), so a repeat run only reads new or
+changed files.
 """
 
 import hashlib
@@ -14,51 +30,159 @@ import json
 import os
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-SIZE_THRESHOLD = 50 * 1024 * 1024  # 50MB
+sys.path.insert(0, str(Path(__file__).parent))
+from hash_cache import HashCache, sha256_file
+from project_walk import walk_files
+from reclaim import METHODS, reclaim, undo
+
+SIZE_THRESHOLD = 50 * 1024 * 1024  # 50MB: above this, no full hash
+BLOCK_SIZE = 1024 * 1024  # head/tail block size for partial hashes
+SAMPLE_COUNT = 16  # evenly spaced blocks in a sampled fingerprint
+SAMPLE_BLOCK = 64 * 1024
+DEFAULT_IO_WORKERS = 8
 DATA_EXTENSIONS = {
     ".csv", ".dta", ".rds", ".rda", ".parquet", ".feather", ".arrow",
     ".xlsx", ".xls", ".sas7bdat", ".json", ".tsv", ".fst",
 }
 
 
-def hash_file(path: Path) -> str:
-    """SHA256 hash of file contents (first 50MB for large files)."""
+def partial_hash(path: Path, size: int) -> str:
+    """SHA256 of the first and last BLOCK_SIZE bytes (the whole file if it is small)."""
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-            if f.tell() >= SIZE_THRESHOLD:
-                break
+        h.update(f.read(BLOCK_SIZE))
+        if size > 2 * BLOCK_SIZE:
+            f.seek(size - BLOCK_SIZE)
+            h.update(f.read(BLOCK_SIZE))
+        elif size > BLOCK_SIZE:
+            h.update(f.read())
     return h.hexdigest()[:16]
 
 
+def sampled_hash(path: Path, size: int, samples: int = SAMPLE_COUNT) -> str:
+    """SHA256 over the size, head, tail and `samples` evenly spaced SAMPLE_BLOCK blocks.
+
+    Uses pread, so each block is one positioned read with no seek round trip.
+    """
+    step = max(size - SAMPLE_BLOCK, 0) / (samples + 1)
+    offsets = [0, *(int(step * i) for i in range(1, samples + 1)), max(size - SAMPLE_BLOCK, 0)]
+    h = hashlib.sha256(str(size).encode())
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for offset in offsets:
+            h.update(os.pread(fd, SAMPLE_BLOCK, offset))
+    finally:
+        os.close(fd)
+    return h.hexdigest()[:16]
+
+
+def group_by(files: list[dict], key) -> list[list[dict]]:
+    """Groups of 2+ files sharing key(f); files where key is None are dropped."""
+    groups: dict = defaultdict(list)
+    for f in files:
+        k = key(f)
+        if k is not None:
+            groups[k].append(f)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def find_identical(files: list[dict], cache: HashCache | None = None,
+                   workers: int = DEFAULT_IO_WORKERS, full_hash: bool = False) -> list[list[dict]]:
+    """Staged duplicate detection: size, then head/tail hash, then full hash.
+
+    Paths that are hardlinks to one inode take no extra space, so they count
+    as one copy: the first is grouped and the others are listed in its
+    f["links"]. Sets f["hash"] and f["comparison"] on every file it reads.
+    Returns groups of 2+ distinct copies with identical content (empty files
+    are ignored). Files over SIZE_THRESHOLD are compared by sampled
+    fingerprint, and fully hashed only if full_hash is set. Hashes are
+    computed on a pool of `workers` threads and looked up in `cache` first.
+    """
+    def digest(f: dict, field: str, compute) -> str | None:
+        path = Path(f["path"])
+        try:
+            if cache is None:
+                return compute(path)
+            return cache.cached(path, f["stat"], field, compute)
+        except OSError:
+            return None
+
+    def hash_all(group: list[dict], field: str, compute, comparison) -> None:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(lambda f: digest(f, field, compute), group))
+        for f, value in zip(group, results):
+            if value is not None:
+                f["hash"] = value
+                f["comparison"] = comparison(f)
+
+    def regroup(groups: list[list[dict]], comparison: str) -> list[list[dict]]:
+        return [g for group in groups
+                for g in group_by(group, lambda f: f["hash"] if f["comparison"] == comparison else None)]
+
+    by_inode: dict[tuple[int, int], dict] = {}
+    for f in files:
+        first = by_inode.get((f["stat"].st_dev, f["stat"].st_ino))
+        if first is None:
+            f["links"] = []
+            by_inode[(f["stat"].st_dev, f["stat"].st_ino)] = f
+        else:
+            first["links"].append(f)
+
+    # Stage 1: same size
+    candidates = [f for g in group_by(list(by_inode.values()), lambda f: f["size"] or None) for f in g]
+
+    # Stage 2: same size and same first/last block. Files of at most two
+    # blocks are read whole here, so this hash is already exact for them.
+    hash_all(candidates, "partial", lambda p: partial_hash(p, p.stat().st_size),
+             lambda f: "sha256" if f["size"] <= 2 * BLOCK_SIZE else "partial")
+    partial_groups = group_by(candidates, lambda f: (f["size"], f["hash"]) if "hash" in f else None)
+
+    identical = [g for g in partial_groups if g[0]["comparison"] == "sha256"]
+    small = [g for g in partial_groups if g[0]["comparison"] == "partial" and g[0]["size"] <= SIZE_THRESHOLD]
+    large = [g for g in partial_groups if g[0]["comparison"] == "partial" and g[0]["size"] > SIZE_THRESHOLD]
+
+    # Stage 3: large files that still collide get a sampled fingerprint
+    hash_all([f for g in large for f in g], "sampled", lambda p: sampled_hash(p, p.stat().st_size),
+             lambda f: "sampled")
+    large = regroup(large, "sampled")
+    if full_hash:
+        small += large
+    else:
+        identical.extend(large)
+
+    # Stage 4: full hash of what still collides
+    hash_all([f for g in small for f in g], "sha256", sha256_file, lambda f: "sha256")
+    identical.extend(regroup(small, "sha256"))
+
+    return identical
+
+
 def scan_dir(directory: Path) -> list[dict]:
-    """Scan a directory for data files, return metadata."""
+    """Scan a directory for data files, return metadata.
+
+    Hidden, venv and nested server_copy* dirs are pruned by the walk; server_copy
+    dirs directly under the project are scanned as directories of their own.
+    """
     files = []
     if not directory.exists():
         return files
 
-    for p in directory.rglob("*"):
-        if not p.is_file():
+    found = walk_files(directory, DATA_EXTENSIONS)
+    for p in sorted(p for paths in found.values() for p in paths):
+        try:
+            stat = p.stat()
+        except OSError:
             continue
-        if p.suffix.lower() not in DATA_EXTENSIONS:
-            continue
-        # Skip hidden dirs
-        if any(part.startswith(".") for part in p.parts):
-            continue
-
-        stat = p.stat()
         files.append({
             "path": str(p),
             "name": p.name,
             "size": stat.st_size,
             "mtime": stat.st_mtime,
+            "stat": stat,
             "dir": str(directory),
         })
 
@@ -66,41 +190,96 @@ def scan_dir(directory: Path) -> list[dict]:
 
 
 def main():
+    usage = ("Usage: python3 find_duplicates.py <project_dir> [extra_dirs...] "
+             "[--io-workers N] [--no-cache] [--full-hash] "
+             "[--reclaim [--apply] [--link auto|reflink|hardlink]]\n"
+             "       python3 find_duplicates.py --undo <journal>")
     if len(sys.argv) < 2:
-        print("Usage: python3 find_duplicates.py <project_dir> [extra_dirs...]", file=sys.stderr)
+        print(usage, file=sys.stderr)
         sys.exit(1)
 
-    project_dir = Path(sys.argv[1]).resolve()
-    extra_dirs = [Path(d).resolve() for d in sys.argv[2:]]
+    args = sys.argv[1:]
+    if args[0] == "--undo":
+        if len(args) < 2:
+            print(usage, file=sys.stderr)
+            sys.exit(1)
+        for path, status in undo(Path(args[1])):
+            print(f"{status}: {path}")
+        return
+
+    workers = DEFAULT_IO_WORKERS
+    if "--io-workers" in args:
+        idx = args.index("--io-workers")
+        try:
+            workers = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print("--io-workers expects an integer", file=sys.stderr)
+            sys.exit(1)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        del args[idx:idx + 2]
+    method = "auto"
+    if "--link" in args:
+        idx = args.index("--link")
+        try:
+            method = args[idx + 1]
+        except IndexError:
+            print(usage, file=sys.stderr)
+            sys.exit(1)
+        del args[idx:idx + 2]
+        if method not in METHODS:
+            print(f"ERROR: --link must be one of {', '.join(METHODS)}", file=sys.stderr)
+            sys.exit(1)
+    use_cache = "--no-cache" not in args
+    full_hash = "--full-hash" in args
+    do_reclaim = "--reclaim" in args
+    apply = "--apply" in args
+    args = [a for a in args if a not in ("--no-cache", "--full-hash", "--reclaim", "--apply")]
+    if not args:
+        print(usage, file=sys.stderr)
+        sys.exit(1)
+
+    project_dir = Path(args[0]).resolve()
+    extra_dirs = [Path(d).resolve() for d in args[1:]]
 
     # Auto-discover server_copy dirs
     server_copies = sorted(project_dir.glob("server_copy*"))
     all_dirs = [project_dir] + server_copies + extra_dirs
 
-    # Scan all directories
+    # Scan all directories (a dir given explicitly may repeat an auto-discovered one)
     all_files = []
+    seen_paths = set()
+    own_cache = str(project_dir / "current" / "hash_cache.json")
     for d in all_dirs:
-        all_files.extend(scan_dir(d))
+        for f in scan_dir(d):
+            if f["path"] != own_cache and f["path"] not in seen_paths:
+                seen_paths.add(f["path"])
+                all_files.append(f)
 
-    # Group by filename
+    cache = HashCache.for_project(project_dir) if use_cache else None
+    identical = find_identical(all_files, cache, workers, full_hash)
+    reclaimed = reclaim(identical, project_dir, apply, method, workers) if do_reclaim else None
+    if cache is not None:
+        cache.save()
+    identical_paths = {g["path"]: i for i, group in enumerate(identical)
+                       for f in group for g in [f] + f["links"]}
+
+    # Same name in 2+ places but not all one identical-content group
     by_name: dict[str, list[dict]] = defaultdict(list)
     for f in all_files:
         by_name[f["name"]].append(f)
+    divergent = []
+    for name, files in sorted(by_name.items()):
+        if len(files) < 2:
+            continue
+        # Empty files never enter find_identical but are all the same content;
+        # hardlinks to one inode are one file
+        groups = {identical_paths.get(f["path"], "" if f["size"] == 0 else (f["stat"].st_dev, f["stat"].st_ino))
+                  for f in files}
+        if len(groups) > 1:
+            divergent.append((name, files))
 
-    # Find duplicates (same name, 2+ locations)
-    duplicates = {name: files for name, files in by_name.items() if len(files) > 1}
-
-    # Compute hashes for comparison
-    for name, files in duplicates.items():
-        for f in files:
-            p = Path(f["path"])
-            if p.exists():
-                if f["size"] <= SIZE_THRESHOLD:
-                    f["hash"] = hash_file(p)
-                    f["comparison"] = "sha256"
-                else:
-                    f["hash"] = f"size:{f['size']}"
-                    f["comparison"] = "size_only"
+    identical.sort(key=lambda g: (g[0]["name"], g[0]["path"]))
 
     # Generate report
     lines = []
@@ -108,23 +287,12 @@ def main():
     lines.append(f"\nProject: {project_dir}")
     lines.append(f"Directories scanned: {len(all_dirs)}")
     lines.append(f"Total data files: {len(all_files)}")
-    lines.append(f"Files with duplicates: {sum(len(v) for v in duplicates.values())}")
+    lines.append(f"Files with duplicates: {sum(len(g) for g in identical)}")
     lines.append(f"Scan date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
 
-    if not duplicates:
+    if not identical and not divergent:
         lines.append("\nNo duplicate data files found.")
     else:
-        # Categorize: identical vs divergent
-        identical = []
-        divergent = []
-
-        for name, files in sorted(duplicates.items()):
-            hashes = set(f.get("hash", "") for f in files)
-            if len(hashes) == 1:
-                identical.append((name, files))
-            else:
-                divergent.append((name, files))
-
         if divergent:
             lines.append(f"\n## DIVERGENT copies ({len(divergent)} files)")
             lines.append("These files have the same name but different content!")
@@ -133,17 +301,24 @@ def main():
                 for f in sorted(files, key=lambda x: x["mtime"], reverse=True):
                     mtime_str = datetime.fromtimestamp(f["mtime"]).strftime("%Y-%m-%d %H:%M")
                     size_mb = f["size"] / (1024 * 1024)
-                    comparison = f.get("comparison", "unknown")
+                    comparison = f.get("comparison", "size")
+                    digest = f.get("hash", f"size:{f['size']}")
                     rel_path = os.path.relpath(f["path"], project_dir)
                     lines.append(f"- `{rel_path}` — {size_mb:.1f}MB, modified {mtime_str} "
-                                 f"[{f.get('hash', '?')[:8]}] ({comparison})")
+                                 f"[{digest[:8]}] ({comparison})")
 
         if identical:
-            lines.append(f"\n## Identical copies ({len(identical)} files)")
+            lines.append(f"\n## Identical copies ({len(identical)} groups)")
             lines.append("These are exact duplicates that could potentially be deduplicated.")
+            if any(g[0]["comparison"] == "sampled" for g in identical):
+                lines.append("Groups marked (sampled) matched on size and sampled blocks only; "
+                             "rerun with --full-hash before deleting any of them.")
             total_waste = 0
-            for name, files in identical:
-                lines.append(f"\n### {name}")
+            for files in identical:
+                names = sorted({f["name"] for f in files})
+                heading = names[0] if len(names) == 1 else " = ".join(names)
+                comparison = files[0]["comparison"]
+                lines.append(f"\n### {heading} ({comparison})")
                 waste = sum(f["size"] for f in files[1:])
                 total_waste += waste
                 for f in sorted(files, key=lambda x: x["mtime"], reverse=True):
@@ -151,9 +326,26 @@ def main():
                     size_mb = f["size"] / (1024 * 1024)
                     rel_path = os.path.relpath(f["path"], project_dir)
                     lines.append(f"- `{rel_path}` — {size_mb:.1f}MB, modified {mtime_str}")
+                    for link in f["links"]:
+                        lines.append(f"- `{os.path.relpath(link['path'], project_dir)}` — "
+                                     f"hardlink to the file above, no extra space")
 
             lines.append(f"\nPotential space savings from dedup: {total_waste / (1024*1024):.1f}MB")
 
+    if reclaimed is not None:
+        title = "Reclaim" if reclaimed["applied"] else "Reclaim (dry run; rerun with --apply)"
+        lines.append(f"\n## {title}")
+        for a in reclaimed["actions"]:
+            rel_path = os.path.relpath(a["path"], project_dir)
+            rel_keeper = os.path.relpath(a["keeper"], project_dir)
+            reason = f": {a['reason']}" if a["reason"] else ""
+            lines.append(f"- `{rel_path}` -> `{rel_keeper}` [{a['status']}{reason}]")
+        verb = "Reclaimed" if reclaimed["applied"] else "Would reclaim"
+        lines.append(f"\n{verb}: {reclaimed['bytes_reclaimed'] / (1024*1024):.1f}MB")
+        if reclaimed["journal"]:
+            lines.append(f"Undo journal: {reclaimed['journal']}")
+            lines.append(f"Undo with: python3 {Path(__file__).resolve()} --undo {reclaimed['journal']}")
+
     report = "\n".join(lines) + "\n"
     print(report)
 
@@ -162,6 +354,8 @@ def main():
     out_dir.mkdir(exist_ok=True)
     (out_dir / "duplicate_report.md").write_text(report)
     print(f"\nReport written to: {out_dir / 'duplicate_report.md'}", file=sys.stderr)
+    if cache is not None:
+        print(f"Hash cache: {cache.hits} hits, {cache.misses} files read", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+hash_cache.py — Persistent content-hash cache for plumber.
+
+Stores digests in {project_root}/current/hash_cache.json keyed by a file's
+(device, inode, size, mtime_ns), so unchanged multi-GB files are never re-read
+and a renamed file keeps its entry. Shared by staleness.py --fingerprint and
+find_duplicates.py; each entry can hold several kinds of digest (full SHA256,
+head/tail partial hash). Entries unused for MAX_AGE_DAYS are dropped on save.
+Saving merges this run's entries into whatever is on disk at that moment, so
+concurrent runs (a nightly find_duplicates and a staleness --fingerprint) keep
+each other's digests.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024  # 1MB reads
+CACHE_NAME = "hash_cache.json"
+MAX_AGE_DAYS = 30
+
+
+def stat_key(st: os.stat_result) -> str:
+    """Cache key: a file's identity and version."""
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def sha256_file(path: Path) -> str:
+    """Short SHA256 digest of a file's full contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def read_entries(cache_path: Path) -> dict[str, dict]:
+    """The entries stored in a cache file; {} if it is missing or unreadable."""
+    try:
+        with open(cache_path) as f:
+            entries = json.load(f).get("entries", {})
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+class HashCache:
+    """Digests keyed by stat_key; safe to use from a thread pool."""
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.entries: dict[str, dict] = read_entries(cache_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._today = int(time.time() // 86400)
+
+    @classmethod
+    def for_project(cls, project_root: Path) -> "HashCache":
+        return cls(project_root / "current" / CACHE_NAME)
+
+    def cached(self, path: Path, st: os.stat_result, field: str, compute) -> str:
+        """Return the `field` digest for path, running compute(path) only on a miss."""
+        key = stat_key(st)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and field in entry:
+                entry["used"] = self._today
+                self.hits += 1
+                return entry[field]
+            self.misses += 1
+        value = compute(path)
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry[field] = value
+            entry["used"] = self._today
+        return value
+
+    def hash_file(self, path: Path, st: os.stat_result | None = None) -> str:
+        """Full SHA256 of path, read from disk only on a cache miss."""
+        if st is None:
+            st = os.stat(path)
+        return self.cached(path, st, "sha256", sha256_file)
+
+    def save(self) -> None:
+        """Merge into the entries on disk, drop stale ones and write the cache
+        atomically (a temp file of this process's own + rename)."""
+        entries = read_entries(self.cache_path)
+        with self._lock:
+            for key, entry in self.entries.items():
+                merged = entries.setdefault(key, {})
+                used = max(merged.get("used", 0), entry.get("used", 0))
+                merged.update(entry)
+                merged["used"] = used
+        cutoff = self._today - MAX_AGE_DAYS
+        entries = {k: e for k, e in entries.items() if e.get("used", 0) >= cutoff}
+        self.cache_path.parent.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_path.parent,
+                                        prefix=f".{self.cache_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_name, self.cache_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+io_cost.py — Size, shape and fan-out of data files, and which intermediates to convert to a columnar format.
+
+Usage: python3 io_cost.py [project_dir] [--json] [--top N] [--workers N]
+Reads current/dag.json. Output: human-readable ranking to stdout (or the JSON
+report with --json); the report is always written to current/io_costs.json,
+and each data node in dag.json gets an "io" annotation
+{size_bytes, format, rows, columns, rows_estimated, fanout} (kept by later
+build_dag.py runs).
+
+Shapes are estimated cheaply: CSV/TSV rows from newline counts over the mmap'ed
+file (exact up to EXACT_LIMIT bytes, else SAMPLE_COUNT evenly spaced blocks),
+columns from the header line; Stata .dta rows and columns from the file header.
+Estimates are cached in hash_cache.json by (device, inode, size, mtime).
+
+The ranking covers CSV, RDS and DTA intermediates. Each read of a file is
+modelled as on-disk size / read throughput (FORMATS). Converting to a
+columnar format changes both, and the estimated saving per pipeline run is the
+fan-out (number of reading scripts) times the change in one read. The target is
+fst when every reader is R, parquet otherwise; files read by Stata are left
+alone, since Stata cannot read either. The FORMATS figures are rough
+single-thread defaults; the ranking matters more than the absolute seconds.
+"""
+
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from build_dag import IO_COSTS_NAME, annotate_nodes, graph_from_dag, write_json_atomic
+from hash_cache import HashCache
+from project_walk import find_root
+from staleness import DEFAULT_WORKERS, parallel_map, stat_nodes
+
+EXACT_LIMIT = 64 * 1024 * 1024
+SAMPLE_COUNT = 32
+SAMPLE_BLOCK = 1024 * 1024
+DEFAULT_TOP = 20
+MIN_SAVING_S = 0.5  # smaller savings are left out of the ranking
+
+# format -> (on-disk size relative to the same table as CSV, read MB/s of on-disk bytes)
+FORMATS = {
+    "csv": (1.0, 150.0),
+    "rds": (0.25, 120.0),
+    "dta": (0.8, 500.0),
+    "parquet": (0.25, 500.0),
+    "fst": (0.35, 1000.0),
+}
+EXTENSION_FORMATS = {".csv": "csv", ".tsv": "csv", ".rds": "rds", ".dta": "dta",
+                     ".parquet": "parquet", ".pq": "parquet", ".fst": "fst",
+                     ".feather": "feather", ".arrow": "feather"}
+CONVERTIBLE = {"csv", "rds", "dta"}
+
+
+def data_format(node_id: str) -> str | None:
+    return EXTENSION_FORMATS.get(os.path.splitext(node_id)[1].lower())
+
+
+def csv_shape(path: Path) -> list:
+    """[rows excluding the header, columns, estimated?] of a delimited text file."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return [0, 0, False]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = mm.find(b"\n", 0, SAMPLE_BLOCK)
+        header = mm[:end if end != -1 else min(size, SAMPLE_BLOCK)].decode("utf-8", "replace").rstrip("\r")
+        if size <= EXACT_LIMIT:
+            lines = 0
+            for offset in range(0, size, SAMPLE_BLOCK):
+                lines += mm[offset:offset + SAMPLE_BLOCK].count(b"\n")
+            estimated = False
+        else:
+            # Newline density of evenly spaced blocks, scaled to the file size
+            step = (size - SAMPLE_BLOCK) // (SAMPLE_COUNT - 1)
+            sampled = sum(mm[i * step:i * step + SAMPLE_BLOCK].count(b"\n") for i in range(SAMPLE_COUNT))
+            lines = round(sampled / (SAMPLE_COUNT * SAMPLE_BLOCK) * size)
+            estimated = True
+        if mm[size - 1] != ord("\n"):
+            lines += 1  # last line without a trailing newline
+    delimiter = "\t" if str(path).lower().endswith(".tsv") else max(",;\t|", key=header.count)
+    columns = len(next(csv.reader([header], delimiter=delimiter), []))
+    return [max(lines - 1, 0), columns, estimated]
+
+
+def dta_shape(path: Path) -> list | None:
+    """[rows, columns, False] from a Stata .dta header, or None if unrecognised."""
+    with open(path, "rb") as f:
+        head = f.read(256)
+    if head.startswith(b"<stata_dta>"):
+        # Format 117+: <release>NNN</release><byteorder>LSF|MSF</byteorder><K>..</K><N>..</N>
+        try:
+            release = int(head[head.index(b"<release>") + 9:head.index(b"</release>")])
+            order = "<" if b"<byteorder>LSF" in head else ">"
+            k_at = head.index(b"<K>") + 3
+            n_at = head.index(b"<N>") + 3
+        except ValueError:
+            return None
+        k_fmt = "I" if release >= 119 else "H"
+        n_fmt = "I" if release == 117 else "Q"
+        columns = struct.unpack_from(order + k_fmt, head, k_at)[0]
+        rows = struct.unpack_from(order + n_fmt, head, n_at)[0]
+        return [rows, columns, False]
+    if len(head) >= 10 and head[0] in range(102, 116) and head[1] in (1, 2):
+        # Format 102-115: release byte, byte order (1 = MSF, 2 = LSF), nvar u16, nobs u32
+        order = ">" if head[1] == 1 else "<"
+        columns, rows = struct.unpack_from(order + "HI", head, 4)
+        return [rows, columns, False]
+    return None
+
+
+def file_shape(path: Path, fmt: str) -> list | None:
+    try:
+        if fmt == "csv":
+            return csv_shape(path)
+        if fmt == "dta":
+            return dta_shape(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    return None
+
+
+def read_seconds(size: float, fmt: str) -> float:
+    return size / (FORMATS[fmt][1] * 1024 * 1024)
+
+
+def target_format(reader_languages: set[str]) -> str | None:
+    """Columnar format every reader can use, or None if a reader is Stata."""
+    if "stata" in reader_languages:
+        return None
+    if reader_languages == {"R"}:
+        return "fst"
+    return "parquet"
+
+
+def io_costs(dag: dict, project_root: Path, workers: int = DEFAULT_WORKERS) -> dict:
+    graph = graph_from_dag(dag)
+    data_ids = [n for n, node in graph.nodes.items() if node["type"] == "data"]
+    stats = stat_nodes(project_root, data_ids, workers)
+    cache = HashCache.for_project(project_root)
+
+    def measure(node_id: str) -> dict | None:
+        st = stats[node_id]
+        if st is None or not os.path.isfile(project_root / node_id):
+            return None
+        fmt = data_format(node_id)
+        info = {"size_bytes": st.st_size, "format": fmt, "rows": None, "columns": None,
+                "rows_estimated": False, "fanout": len(set(graph.consumers(node_id)))}
+        if fmt in ("csv", "dta"):
+            shape = cache.cached(project_root / node_id, st, "shape", lambda p: file_shape(p, fmt))
+            if shape is not None:
+                info["rows"], info["columns"], info["rows_estimated"] = shape
+        return info
+
+    nodes = {n: info for n, info in zip(data_ids, parallel_map(measure, data_ids, workers))
+             if info is not None}
+    cache.save()
+
+    candidates = []
+    for node_id, info in nodes.items():
+        fmt = info["format"]
+        if fmt not in CONVERTIBLE or info["fanout"] == 0:
+            continue
+        if graph.nodes[node_id].get("subtype") != "intermediate":
+            continue
+        readers = sorted(set(graph.consumers(node_id)))
+        languages = {graph.nodes[r].get("language", "unknown") for r in readers}
+        target = target_format(languages)
+        now = read_seconds(info["size_bytes"], fmt)
+        entry = {
+            "id": node_id,
+            "format": fmt,
+            "size_bytes": info["size_bytes"],
+            "rows": info["rows"],
+            "columns": info["columns"],
+            "fanout": info["fanout"],
+            "readers": readers,
+            "read_s": now,
+            "target": target,
+        }
+        if target is None:
+            entry.update({"target_read_s": None, "saving_s": 0.0,
+                          "note": "read by Stata; keep a format Stata reads"})
+        else:
+            target_size = info["size_bytes"] / FORMATS[fmt][0] * FORMATS[target][0]
+            after = read_seconds(target_size, target)
+            entry.update({"target_read_s": after,
+                          "saving_s": info["fanout"] * (now - after)})
+        candidates.append(entry)
+    candidates.sort(key=lambda c: (-c["saving_s"], c["id"]))
+
+    return {
+        "project_root": str(project_root),
+        "nodes": nodes,
+        "candidates": candidates,
+        "total_saving_s": sum(c["saving_s"] for c in candidates if c["saving_s"] >= MIN_SAVING_S),
+    }
+
+
+def fmt_size(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def fmt_seconds(s: float) -> str:
+    return f"{s:.1f}s" if s < 120 else f"{s / 60:.1f}m"
+
+
+def format_report(report: dict, top: int) -> str:
+    lines = ["# Data I/O Cost", ""]
+    nodes = report["nodes"]
+    lines.append(f"**Data files measured:** {len(nodes)}  "
+                 f"**Total size:** {fmt_size(sum(n['size_bytes'] for n in nodes.values()))}")
+    lines.append(f"**Estimated read time saved per full pipeline run:** "
+                 f"{fmt_seconds(report['total_saving_s'])}")
+    lines.append("")
+
+    ranked = [c for c in report["candidates"] if c["saving_s"] >= MIN_SAVING_S][:top]
+    if ranked:
+        lines.append("## Convert to a columnar format")
+        lines.append("")
+        lines.append("| File | Size | Rows x Cols | Readers | Read now | Target | Read after | Saving/run |")
+        lines.append("|---|---|---|---|---|---|---|---|")
+        for c in ranked:
+            shape = "?" if c["rows"] is None else f"{'~' if nodes[c['id']]['rows_estimated'] else ''}" \
+                                                  f"{c['rows']:,} x {c['columns']}"
+            lines.append(f"| `{c['id']}` | {fmt_size(c['size_bytes'])} | {shape} | {c['fanout']} "
+                         f"| {fmt_seconds(c['read_s'])} | {c['target']} "
+                         f"| {fmt_seconds(c['target_read_s'])} | {fmt_seconds(c['saving_s'])} |")
+        lines.append("")
+        lines.append("Read times are per script; savings multiply by the number of readers.")
+
+    kept = [c for c in report["candidates"] if c["target"] is None]
+    if kept:
+        lines.append("")
+        lines.append("## Not convertible")
+        lines.append("")
+        for c in kept[:top]:
+            lines.append(f"- `{c['id']}` ({fmt_size(c['size_bytes'])}, read by {c['fanout']} "
+                         f"script(s)): {c['note']}")
+    if not ranked and not kept:
+        lines.append("No CSV, RDS or DTA intermediate is read often enough, or is large enough, "
+                     "for a conversion to pay off.")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    as_json = "--json" in args
+    workers = DEFAULT_WORKERS
+    top = DEFAULT_TOP
+    for flag in ("--workers", "--top"):
+        if flag in args:
+            idx = args.index(flag)
+            try:
+                value = int(args[idx + 1])
+            except (IndexError, ValueError):
+                print(f"{flag} expects an integer", file=sys.stderr)
+                sys.exit(1)
+            del args[idx:idx + 2]
+            if flag == "--workers":
+                workers = value if value > 0 else os.cpu_count() or 1
+            elif value > 0:
+                top = value
+            else:
+                print("--top expects a positive integer", file=sys.stderr)
+                sys.exit(1)
+    positional = [a for a in args if not a.startswith("--")]
+
+    project_dir = Path(positional[0] if positional else os.getcwd()).resolve()
+    project_root = find_root(project_dir)
+    dag_file = project_root / "current" / "dag.json"
+
+    if not dag_file.exists():
+        print(f"ERROR: No DAG found at {dag_file}")
+        print("Run '/plumber audit' or '/plumber status' to build the DAG first.")
+        sys.exit(1)
+
+    with open(dag_file) as f:
+        dag = json.load(f)
+
+    report = io_costs(dag, project_root, workers)
+
+    write_json_atomic(project_root / "current" / IO_COSTS_NAME, report)
+    annotate_nodes(project_root, dag)
+    write_json_atomic(dag_file, dag)
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report, top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+make_db.py — Makefile targets from GNU make's own database (`make -pnq`).
+
+Usage: python3 make_db.py <project_root> [makefile]
+Output: JSON {target: {recipe, deps, order_only, declared[, pattern]}} to stdout;
+exits 1 if make is unavailable or cannot read the Makefile.
+
+Runs `make -pnqr` once in the Makefile's directory, with an empty goal of its
+own so missing prerequisites are not errors, and make itself handles
+include, $(wildcard ...), conditionals and variable flavors, and parses the
+printed database: explicit rules with their prerequisites (order-only ones
+after `|` kept apart), pattern rules, target-specific variables, and .PHONY.
+Recipes are expanded with the database's variables, the target's own
+variables and the automatic variables ($@ $< $^ $+ $* $| $? and their D/F
+forms); function calls inside a recipe are left as written. A file that is a
+prerequisite (or a recipe-less target) and matches a pattern rule whose
+prerequisites exist or are mentioned gets that rule, shortest stem first, as
+make would; chains of implicit rules are not followed. Built-in rules are off
+(-r); built-in variables stay. The project's settings variables are passed
+in the environment, so the Makefile's own definitions win over them.
+Running make executes project code: with -n it still runs the recipes that
+remake included makefiles, and it evaluates every $(shell ...). build_dag.py
+and watch.py use it only with --make-db.
+
+The result is cached in current/make_db.json, keyed by the mtimes of every
+file in MAKEFILE_LIST and a hash of the settings variables. $(wildcard) and
+$(shell) results are cached with the rest; they refresh when a Makefile or
+the settings change.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+CACHE_NAME = "make_db.json"
+CACHE_VERSION = 1
+MAKE_TIMEOUT_S = 60
+MAX_DEPTH = 32
+SKIP_TARGETS = ("all", "clean", "help")
+
+# Goal added on the command line so make has nothing to check or (not) run
+_GOAL = ".plumber-db"
+
+_VAR_RE = re.compile(r'^([^\s:#=]+) (:{0,2}=|\+=|\?=) ?(.*)$')
+_RULE_RE = re.compile(r'^([^:\s][^:]*?)(::?)(?:\s+(.*))?$')
+_TARGET_VAR_RE = re.compile(r'^(?:override )?(?:private )?([^\s:#=]+) (:{0,2}=|\+=|\?=) ?(.*)$')
+_STEM_RE = re.compile(r"^#  Implicit/static pattern stem: '(.*)'$")
+_SECTIONS = {"# Variables": "variables", "# Pattern-specific Variable Values": None,
+             "# Directories": None, "# Implicit Rules": "implicit", "# Files": "files",
+             "# VPATH Search Paths": None}
+
+
+def make_database(makefile_path: Path, variables: dict[str, str]) -> str | None:
+    """Output of `make -pnqr` for makefile_path, or None if GNU make is missing or fails."""
+    make = shutil.which("make")
+    if make is None:
+        return None
+    env = dict(os.environ)
+    for name in ("MAKEFLAGS", "MFLAGS", "MAKELEVEL"):
+        env.pop(name, None)
+    for name, value in variables.items():
+        env.setdefault(name, value)
+    try:
+        out = subprocess.run([make, "-pnqr", "--no-print-directory", "-f", makefile_path.name,
+                              f"--eval={_GOAL}:", _GOAL],
+                             cwd=makefile_path.parent, env=env, stdin=subprocess.DEVNULL,
+                             capture_output=True, text=True, errors="replace", timeout=MAKE_TIMEOUT_S)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    # The goal is a no-op, so exit status 2 means the Makefile itself could not be read
+    if out.returncode not in (0, 1) or not out.stdout.startswith("# GNU Make"):
+        return None
+    return out.stdout
+
+
+def parse_rule(line: str) -> tuple[str, bool, list[str], list[str]] | None:
+    """(target, double_colon, prerequisites, order_only) of a database rule line."""
+    m = _RULE_RE.match(line)
+    if not m:
+        return None
+    words = (m.group(3) or "").split()
+    if "|" in words:
+        idx = words.index("|")
+        return m.group(1), m.group(2) == "::", words[:idx], words[idx + 1:]
+    return m.group(1), m.group(2) == "::", words, []
+
+
+def parse_database(text: str) -> dict:
+    """Variables, file entries and pattern rules of a `make -p` database.
+
+    Returns {"variables": {name: (flavor, value)}, "files": {name: entry},
+    "patterns": [rule, ...]}; entries have target, deps, order_only, recipe,
+    phony, not_target, stem, double_colon and vars ({name: (flavor, value)}).
+    """
+    variables: dict[str, tuple[str, str]] = {}
+    files: dict[str, dict] = {}
+    patterns: list[dict] = []
+    section = None
+    origin = ""
+    block: list[str] = []
+
+    def flush() -> None:
+        entry = parse_entry(block)
+        block.clear()
+        if entry is None:
+            return
+        if section == "implicit":
+            patterns.append(entry)
+            return
+        previous = files.get(entry["target"])
+        if previous is not None and entry["double_colon"]:
+            previous["deps"] += [d for d in entry["deps"] if d not in previous["deps"]]
+            previous["recipe"] = "\n".join(r for r in (previous["recipe"], entry["recipe"]) if r)
+        else:
+            files[entry["target"]] = entry
+
+    lines = iter(text.splitlines())
+    for line in lines:
+        if line in _SECTIONS:
+            flush()
+            section = _SECTIONS[line]
+            continue
+        if section == "variables":
+            if line.startswith("#"):
+                origin = line[2:]
+            elif line.startswith("define "):
+                body = []
+                for inner in lines:
+                    if inner == "endef":
+                        break
+                    body.append(inner)
+                if origin != "automatic":
+                    variables[line[7:].strip()] = ("=", "\n".join(body))
+            else:
+                m = _VAR_RE.match(line)
+                if m and origin != "automatic":
+                    variables[m.group(1)] = (m.group(2), m.group(3))
+        elif section in ("files", "implicit"):
+            if line == "":
+                flush()
+            else:
+                block.append(line)
+    flush()
+    return {"variables": variables, "files": files, "patterns": patterns}
+
+
+def parse_entry(block: list[str]) -> dict | None:
+    entry = None
+    target_vars: dict[str, tuple[str, str]] = {}
+    not_target = phony = False
+    stem = None
+    recipe: list[str] = []
+    for line in block:
+        if line.startswith("\t"):
+            recipe.append(line[1:])
+        elif line.startswith("#"):
+            if line == "# Not a target:":
+                not_target = True
+            elif line.startswith("#  Phony target"):
+                phony = True
+            elif line.startswith("#  Implicit/static"):
+                m = _STEM_RE.match(line)
+                stem = m.group(1) if m else None
+        elif entry is None:
+            parsed = parse_rule(line)
+            if parsed is None:
+                continue
+            target, double_colon, deps, order_only = parsed
+            rest = line[len(target) + (2 if double_colon else 1):].strip()
+            var = _TARGET_VAR_RE.match(rest)
+            if var and not double_colon:
+                target_vars[var.group(1)] = (var.group(2), var.group(3))
+                continue
+            entry = {"target": target, "double_colon": double_colon, "deps": deps,
+                     "order_only": order_only}
+    if entry is None:
+        return None
+    entry.update({"recipe": "\n".join(recipe), "phony": phony, "not_target": not_target,
+                  "stem": stem, "vars": target_vars})
+    return entry
+
+
+class Expander:
+    """Expands $(VAR) references against the database's global variables,
+    one target's variables and its automatic variables."""
+
+    def __init__(self, variables: dict[str, tuple[str, str]]):
+        self.variables = variables
+
+    def expand(self, text: str, local: dict[str, tuple[str, str]], depth: int = 0) -> str:
+        if "$" not in text:
+            return text
+        out = []
+        i = 0
+        n = len(text)
+        while i < n:
+            dollar = text.find("$", i)
+            if dollar == -1 or dollar + 1 == n:
+                out.append(text[i:])
+                break
+            out.append(text[i:dollar])
+            i = dollar
+            opener = text[i + 1]
+            if opener == "$":
+                out.append("$")
+                i += 2
+                continue
+            if opener in "({":
+                closer = ")" if opener == "(" else "}"
+                j = i + 2
+                level = 1
+                while j < n and level:
+                    if text[j] == opener:
+                        level += 1
+                    elif text[j] == closer:
+                        level -= 1
+                    j += 1
+                if level:
+                    out.append(text[i:])
+                    break
+                out.append(self.reference(text[i + 2:j - 1], text[i:j], local, depth))
+                i = j
+            else:
+                out.append(self.reference(opener, text[i:i + 2], local, depth))
+                i += 2
+        return "".join(out)
+
+    def reference(self, body: str, written: str, local: dict[str, tuple[str, str]], depth: int) -> str:
+        if depth >= MAX_DEPTH or any(ch in body for ch in " \t,"):
+            return written  # a function call ($(wildcard ...), $(shell ...)): left as written
+        if "$" in body:
+            body = self.expand(body, local, depth + 1)
+        substitution = None
+        if ":" in body and "=" in body.split(":", 1)[1]:
+            body, pattern = body.split(":", 1)
+            substitution = pattern.split("=", 1)
+        if len(body) == 2 and body[0] in "@<^+*?|%" and body[1] in "DF":
+            words = self.value(body[0], local, depth).split()
+            if body[1] == "D":
+                value = " ".join(os.path.dirname(w) or "." for w in words)
+            else:
+                value = " ".join(os.path.basename(w) for w in words)
+        else:
+            value = self.value(body, local, depth)
+        if substitution is not None:
+            old, new = substitution
+            if "%" not in old:
+                old, new = "%" + old, "%" + new
+            prefix, _, suffix = old.partition("%")
+            words = []
+            for w in value.split():
+                if w.startswith(prefix) and w.endswith(suffix) and len(w) >= len(prefix) + len(suffix):
+                    w = new.replace("%", w[len(prefix):len(w) - len(suffix)], 1)
+                words.append(w)
+            value = " ".join(words)
+        return value
+
+    def value(self, name: str, local: dict[str, tuple[str, str]], depth: int) -> str:
+        flavor, value = local.get(name) or self.variables.get(name) or ("=", "")
+        if flavor == "+=":
+            base = self.value(name, {k: v for k, v in local.items() if k != name}, depth)
+            value = f"{base} {value}" if base else value
+            flavor = "="
+        if flavor in (":=", "::="):
+            return value
+        return self.expand(value, local, depth + 1)
+
+
+def automatic_vars(target: str, deps: list[str], order_only: list[str], stem: str | None) -> dict:
+    unique = list(dict.fromkeys(deps))
+    return {
+        "@": (":=", target),
+        "<": (":=", deps[0] if deps else ""),
+        "^": (":=", " ".join(unique)),
+        "+": (":=", " ".join(deps)),
+        "?": (":=", " ".join(unique)),
+        "|": (":=", " ".join(order_only)),
+        "*": (":=", stem or ""),
+        "%": (":=", ""),
+    }
+
+
+def match_pattern(pattern: str, name: str) -> str | None:
+    """The stem of name under a % pattern (matched against the basename when
+    the pattern has no slash), or None."""
+    if "/" not in pattern:
+        name = os.path.basename(name)
+    prefix, _, suffix = pattern.partition("%")
+    if len(name) < len(prefix) + len(suffix) or not (name.startswith(prefix) and name.endswith(suffix)):
+        return None
+    return name[len(prefix):len(name) - len(suffix)]
+
+
+def instantiate(rule: dict, pattern: str, name: str, stem: str) -> list[str]:
+    """The pattern rule's prerequisites for name."""
+    directory = os.path.dirname(name) if "/" not in pattern else ""
+    deps = []
+    for dep in rule["deps"]:
+        if "%" in dep:
+            dep = dep.replace("%", stem, 1)
+            if directory:
+                dep = os.path.join(directory, dep)
+        deps.append(dep)
+    return deps
+
+
+def database_targets(db: dict, cwd: Path) -> dict[str, dict]:
+    """{target: {recipe, deps, order_only, declared[, pattern]}} from a parsed database."""
+    files = db["files"]
+    expander = Expander(db["variables"])
+    makefiles = set(expander.value("MAKEFILE_LIST", {}, 0).split())
+    mentioned = {d for e in files.values() for d in e["deps"] + e["order_only"]}
+
+    def pattern_rule(name: str) -> tuple[dict, str, str, list[str]] | None:
+        best = None
+        for rule in db["patterns"]:
+            for pattern in rule["target"].split():
+                stem = match_pattern(pattern, name)
+                if stem is None:
+                    continue
+                deps = instantiate(rule, pattern, name, stem)
+                ok = all(os.path.exists(cwd / d) or (d in files and not rule["double_colon"])
+                         for d in deps)
+                if ok and (best is None or len(stem) < len(best[2])):
+                    best = (rule, pattern, stem, deps)
+        return best
+
+    targets = {}
+    for name in sorted(files):
+        entry = files[name]
+        if entry["phony"] or name.startswith(".") or name in SKIP_TARGETS or name in makefiles:
+            continue
+        if entry["not_target"] and name not in mentioned:
+            continue
+        deps, order_only, stem = entry["deps"], entry["order_only"], entry["stem"]
+        recipe = entry["recipe"]
+        pattern = None
+        if not recipe and "%" not in name:
+            found = pattern_rule(name)
+            if found is not None:
+                rule, pattern, stem, extra = found
+                deps = list(dict.fromkeys(deps + extra))
+                order_only = order_only + rule["order_only"]
+                recipe = rule["recipe"]
+        if entry["not_target"] and pattern is None:
+            continue
+        local = {**entry["vars"], **automatic_vars(name, deps, order_only, stem)}
+        info = {"recipe": expander.expand(recipe, local).strip(), "deps": deps,
+                "order_only": order_only, "declared": True}
+        if pattern is not None:
+            info["pattern"] = pattern
+        targets[name] = info
+    return targets
+
+
+def makefile_mtimes(cwd: Path, makefiles: list[str]) -> dict[str, int | None]:
+    mtimes = {}
+    for mf in makefiles:
+        try:
+            mtimes[mf] = os.stat(cwd / mf).st_mtime_ns
+        except OSError:
+            mtimes[mf] = None
+    return mtimes
+
+
+def variables_hash(variables: dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(variables, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def make_targets(project_root: Path, makefile_path: Path, variables: dict[str, str]) -> dict[str, dict] | None:
+    """Targets of makefile_path from make's database, from current/make_db.json
+    when no Makefile or setting changed; None if make cannot provide them."""
+    cache_path = project_root / "current" / CACHE_NAME
+    cwd = makefile_path.parent
+    key = {"makefile": str(makefile_path), "variables_hash": variables_hash(variables)}
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if (cached.get("version") == CACHE_VERSION
+                and all(cached.get(k) == v for k, v in key.items())
+                and cached["mtimes"] == makefile_mtimes(cwd, list(cached["mtimes"]))):
+            return cached["targets"]
+    except (OSError, json.JSONDecodeError, AttributeError, KeyError, TypeError):
+        pass
+
+    text = make_database(makefile_path, variables)
+    if text is None:
+        return None
+    db = parse_database(text)
+    targets = database_targets(db, cwd)
+    makefiles = Expander(db["variables"]).value("MAKEFILE_LIST", {}, 0).split()
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": CACHE_VERSION, **key,
+                       "mtimes": makefile_mtimes(cwd, makefiles or [makefile_path.name]),
+                       "targets": targets}, f, indent=2)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # read-only project: the targets are still returned
+    return targets
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 make_db.py <project_root> [makefile]", file=sys.stderr)
+        sys.exit(1)
+
+    from scan_notebook import discover_settings_files
+    from settings_vars import settings_table
+
+    project_root = Path(sys.argv[1]).resolve()
+    if len(sys.argv) > 2:
+        makefile_path = Path(sys.argv[2]).resolve()
+    else:
+        candidates = [project_root / "code" / "Makefile", project_root / "Makefile"]
+        makefile_path = next((p for p in candidates if p.exists()), candidates[-1])
+    if not makefile_path.exists():
+        print(f"No Makefile at {makefile_path}", file=sys.stderr)
+        sys.exit(1)
+
+    variables = settings_table(project_root, discover_settings_files(project_root))
+    targets = make_targets(project_root, makefile_path, variables)
+    if targets is None:
+        print("GNU make is not available or could not read the Makefile", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(targets, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+notebook_stream.py — Read code-cell sources from an .ipynb without loading outputs.
+
+json.load on a notebook builds every output payload (base64 plots, HTML
+tables) as Python objects even though the scanners only need each cell's
+cell_type and source. read_code_cells streams the file in CHUNK_SIZE pieces
+and walks the JSON structure itself: cell_type and source values are decoded,
+and everything else is skipped with one regex match per run of strings and
+scalars between brackets, with skipped bytes dropped from the buffer as it goes. Peak memory and parse
+time then follow the size of the code rather than the size of the file.
+
+Works on bytes: '"' and '\\' never occur inside multi-byte UTF-8 sequences, so
+string boundaries can be found without decoding.
+"""
+
+import json
+import re
+from pathlib import Path
+
+CHUNK_SIZE = 256 * 1024
+
+_WS_RE = re.compile(rb"[ \t\n\r]*")
+# Everything up to the next bracket: scalars, punctuation and complete short
+# strings. Stops on a '"' for long strings (base64 images), which skip_string
+# jumps over with bytes.find, and for strings that run past the buffer end.
+_SKIP_RE = re.compile(rb'(?:[^"\[\]{}]+|"[^"\\]{0,512}(?:\\.[^"\\]{0,512})*")*')
+_SCALAR_END_RE = re.compile(rb"[,\]}\s]")
+_KEEP_KEYS = {"cell_type", "source"}
+
+
+class _Stream:
+    """Buffered byte cursor over a file. Bytes before the cursor are dropped on
+    refill unless pinned by `mark` (set while a kept value is being read)."""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = b""
+        self.pos = 0
+        self.mark: int | None = None
+        self.eof = False
+
+    def fill(self) -> None:
+        """Drop consumed bytes and append the next chunk; raises at end of file."""
+        if self.eof:
+            raise ValueError("Unexpected end of notebook JSON")
+        keep = self.pos if self.mark is None else self.mark
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        if not chunk:
+            self.eof = True
+
+    def peek(self) -> int:
+        """Next non-whitespace byte, without consuming it."""
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.fill()
+
+    def expect(self, char: bytes) -> None:
+        if self.peek() != char[0]:
+            raise ValueError(f"Expected {char!r} at byte offset {self.pos} of buffer")
+        self.pos += 1
+
+    def skip_string(self) -> None:
+        """Cursor on an opening quote; move past the matching closing quote."""
+        scan = floor = self.pos + 1
+        while True:
+            end = self.buf.find(b'"', scan)
+            if end == -1:
+                # Keep any trailing backslashes: they may escape a quote in the next chunk
+                scan = len(self.buf)
+                while scan > floor and self.buf[scan - 1] == 0x5C:
+                    scan -= 1
+                self.pos = scan
+                self.fill()
+                scan = floor = self.pos
+                continue
+            k = end - 1
+            while k >= 0 and self.buf[k] == 0x5C:
+                k -= 1
+            if (end - 1 - k) % 2 == 0:
+                self.pos = end + 1
+                return
+            scan = end + 1
+
+    def skip_scalar(self) -> None:
+        while True:
+            m = _SCALAR_END_RE.search(self.buf, self.pos)
+            if m:
+                self.pos = m.start()
+                return
+            if self.eof:
+                self.pos = len(self.buf)
+                return
+            self.fill()
+
+    def skip_value(self) -> None:
+        c = self.peek()
+        if c == 0x22:  # "
+            self.skip_string()
+            return
+        if c not in (0x5B, 0x7B):  # [ {
+            self.skip_scalar()
+            return
+        depth = 0
+        while True:
+            self.pos = _SKIP_RE.match(self.buf, self.pos).end()
+            if self.pos == len(self.buf):
+                self.fill()
+                continue
+            ch = self.buf[self.pos]
+            if ch == 0x22:
+                self.skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if ch in (0x5B, 0x7B) else -1
+            if depth == 0:
+                return
+
+    def read_value(self):
+        """Decode the next value with json.loads; meant for small values."""
+        self.peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buf[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+    def iter_object(self):
+        """Yield the keys of the object at the cursor. The caller must consume
+        each key's value (read_value or skip_value) before resuming."""
+        self.expect(b"{")
+        if self.peek() == 0x7D:
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(b":")
+            yield key
+            if self.peek() == 0x2C:
+                self.pos += 1
+                continue
+            self.expect(b"}")
+            return
+
+    def iter_array(self):
+        """Yield once per element of the array at the cursor, which the caller consumes."""
+        self.expect(b"[")
+        if self.peek() == 0x5D:
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == 0x2C:
+                self.pos += 1
+                continue
+            self.expect(b"]")
+            return
+
+
+def read_code_cells(nb_path: Path, chunk_size: int = CHUNK_SIZE) -> list[dict]:
+    """Code cells of a notebook as [{"cell_type": "code", "source": ...}].
+
+    Raises ValueError if the file is not a valid notebook document.
+    """
+    cells = []
+    with open(nb_path, "rb") as f:
+        s = _Stream(f, chunk_size)
+        for key in s.iter_object():
+            if key != "cells":
+                s.skip_value()
+                continue
+            for _ in s.iter_array():
+                cell = {}
+                for cell_key in s.iter_object():
+                    if cell_key in _KEEP_KEYS:
+                        cell[cell_key] = s.read_value()
+                    else:
+                        s.skip_value()
+                if cell.get("cell_type") == "code":
+                    cells.append(cell)
+    return cells
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+plan_build.py — Parallel build schedule for the pipeline: waves, critical path, speedup at N cores.
+
+Usage: python3 plan_build.py [project_dir] [--json] [--cores 1,2,4,8,16]
+                             [--runtimes runtimes.json] [--makefile PATH]
+Reads current/dag.json. Output: human-readable schedule to stdout (or the JSON
+plan with --json); the JSON plan (the job list) is always written to
+current/build_plan.json. --makefile also writes a stamp-file Makefile for
+`make -f PATH -j N`, run from the project root.
+
+Jobs are scripts; script B depends on script A when B reads a file A writes.
+Scripts on a dependency cycle are merged into one job that runs them one
+after another.
+Runtimes (seconds) come from --runtimes ({script: seconds}), else a node's
+"runtime_s" in dag.json, else DEFAULT_RUNTIME; the report says which.
+
+- waves: wave k holds the jobs whose longest chain of prerequisites has k jobs;
+  everything in a wave can run at once.
+- critical path: the chain with the largest total runtime, a lower bound on wall
+  time however many cores are used. A job's slack is how long it can be delayed
+  without lengthening the build; critical-path jobs have none.
+- parallelism: wall time simulated on N cores, starting ready jobs in order of
+  their longest remaining path (critical-path list scheduling).
+"""
+
+import heapq
+import json
+import os
+import shlex
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from build_dag import DependencyGraph, graph_from_dag, strongly_connected_components
+from project_walk import find_root
+
+DEFAULT_RUNTIME = 60.0
+DEFAULT_CORES = [1, 2, 4, 8, 16]
+STAMP_DIR = "current/stamps"
+
+# extension -> command that runs the script from its own directory
+RUN_COMMANDS = {
+    ".ipynb": "jupyter nbconvert --execute --to notebook --inplace",
+    ".py": "python3",
+    ".r": "Rscript",
+    ".jl": "julia",
+    ".do": "stata -b do",
+}
+
+
+def runtime_estimates(dag: dict, overrides: dict[str, float]) -> dict[str, tuple[float, str]]:
+    """{script: (seconds, source)} with source "runtimes", "dag" or "default"."""
+    estimates = {}
+    for node in dag["nodes"]:
+        if node["type"] != "script":
+            continue
+        if node["id"] in overrides:
+            estimates[node["id"]] = (float(overrides[node["id"]]), "runtimes")
+        elif node.get("runtime_s") is not None:
+            estimates[node["id"]] = (float(node["runtime_s"]), "dag")
+        else:
+            estimates[node["id"]] = (DEFAULT_RUNTIME, "default")
+    return estimates
+
+
+def script_graph(graph: DependencyGraph) -> DependencyGraph:
+    """Scripts only, with an edge A -> B when B consumes something A produces."""
+    scripts = DependencyGraph()
+    for node in graph.nodes.values():
+        if node["type"] == "script":
+            scripts.add_node(node)
+    for node_id in scripts.nodes:
+        for data_id in graph.predecessors(node_id):
+            for producer in graph.producers(data_id):
+                if producer != node_id:
+                    scripts.add_edge(producer, node_id, "precedes")
+    return scripts
+
+
+def build_jobs(graph: DependencyGraph, estimates: dict[str, tuple[float, str]]) -> list[dict]:
+    """Jobs in topological order, each {id, scripts, runtime_s, runtime_source, deps}.
+
+    A job is one script, or all scripts of a dependency cycle (id: the first of
+    them, runtime: their sum).
+    """
+    scripts = script_graph(graph)
+    job_of: dict[str, str] = {}
+    jobs = []
+    for component in reversed(strongly_connected_components(scripts)):
+        members = sorted(component)
+        job = {
+            "id": members[0],
+            "scripts": members,
+            "runtime_s": sum(estimates[s][0] for s in members),
+            "runtime_source": ("mixed" if len({estimates[s][1] for s in members}) > 1
+                               else estimates[members[0]][1]),
+            "deps": [],
+        }
+        for s in members:
+            job_of[s] = job["id"]
+        jobs.append(job)
+
+    for job in jobs:
+        deps = {job_of[p] for s in job["scripts"] for p in scripts.predecessors(s)}
+        deps.discard(job["id"])
+        job["deps"] = sorted(deps)
+        # Inputs the job reads that no job writes, and everything it writes
+        job["inputs"] = sorted({d for s in job["scripts"] for d in graph.predecessors(s)
+                                if not graph.producers(d)})
+        job["outputs"] = sorted({d for s in job["scripts"] for d in graph.successors(s)})
+    return jobs
+
+
+def schedule(jobs: list[dict]) -> dict:
+    """Annotate jobs (topologically ordered) with wave, earliest start, slack and
+    bottom level; return the waves and the critical path."""
+    by_id = {job["id"]: job for job in jobs}
+    dependents: dict[str, list[str]] = {job["id"]: [] for job in jobs}
+    for job in jobs:
+        for dep in job["deps"]:
+            dependents[dep].append(job["id"])
+
+    for job in jobs:
+        deps = [by_id[d] for d in job["deps"]]
+        job["wave"] = 1 + max((d["wave"] for d in deps), default=-1)
+        job["earliest_start_s"] = max((d["earliest_start_s"] + d["runtime_s"] for d in deps), default=0.0)
+    length = max((j["earliest_start_s"] + j["runtime_s"] for j in jobs), default=0.0)
+
+    # bottom level: the job's runtime plus the longest chain after it
+    for job in reversed(jobs):
+        after = [by_id[d]["bottom_level_s"] for d in dependents[job["id"]]]
+        job["bottom_level_s"] = job["runtime_s"] + max(after, default=0.0)
+        job["slack_s"] = length - job["earliest_start_s"] - job["bottom_level_s"]
+
+    critical = []
+    candidates = [j for j in jobs if not j["deps"]]
+    while candidates:
+        job = max(candidates, key=lambda j: (j["bottom_level_s"], j["id"]))
+        critical.append(job["id"])
+        candidates = [by_id[d] for d in dependents[job["id"]]]
+
+    waves: list[list[str]] = []
+    for job in jobs:
+        if job["wave"] == len(waves):
+            waves.append([])
+        waves[job["wave"]].append(job["id"])
+    return {"waves": [sorted(w) for w in waves],
+            "critical_path": {"jobs": critical, "length_s": length}}
+
+
+def simulate(jobs: list[dict], cores: int) -> float:
+    """Wall time on `cores` cores, starting ready jobs by longest remaining path."""
+    waiting = {job["id"]: len(job["deps"]) for job in jobs}
+    by_id = {job["id"]: job for job in jobs}
+    dependents: dict[str, list[str]] = {job["id"]: [] for job in jobs}
+    for job in jobs:
+        for dep in job["deps"]:
+            dependents[dep].append(job["id"])
+
+    ready = [(-job["bottom_level_s"], job["id"]) for job in jobs if not job["deps"]]
+    heapq.heapify(ready)
+    running: list[tuple[float, str]] = []
+    now = 0.0
+    while ready or running:
+        while ready and len(running) < cores:
+            _, job_id = heapq.heappop(ready)
+            heapq.heappush(running, (now + by_id[job_id]["runtime_s"], job_id))
+        now, job_id = heapq.heappop(running)
+        for dependent in dependents[job_id]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heapq.heappush(ready, (-by_id[dependent]["bottom_level_s"], dependent))
+    return now
+
+
+def plan_build(dag: dict, overrides: dict[str, float], cores: list[int]) -> dict:
+    graph = graph_from_dag(dag)
+    estimates = runtime_estimates(dag, overrides)
+    jobs = build_jobs(graph, estimates)
+    plan = schedule(jobs)
+    serial = sum(job["runtime_s"] for job in jobs)
+    plan["serial_s"] = serial
+    plan["max_width"] = max((len(w) for w in plan["waves"]), default=0)
+    plan["parallelism"] = []
+    for n in cores:
+        wall = simulate(jobs, n)
+        plan["parallelism"].append({
+            "cores": n,
+            "wall_s": wall,
+            "speedup": serial / wall if wall else 1.0,
+            "efficiency": serial / wall / n if wall else 1.0,
+        })
+    plan["runtime_sources"] = {
+        source: sum(1 for s, src in estimates.values() if src == source)
+        for source in ("runtimes", "dag", "default")
+    }
+    plan["jobs"] = [{**job, "command": run_commands(job["scripts"])} for job in jobs]
+    return plan
+
+
+def script_command(script: str) -> tuple[str, list[str]] | None:
+    """(directory, argv) that runs a script from its own directory, or None
+    for an unknown file type."""
+    directory, name = os.path.split(script)
+    command = RUN_COMMANDS.get(os.path.splitext(name)[1].lower())
+    if command is None:
+        return None
+    return directory or ".", shlex.split(command) + [name]
+
+
+def run_commands(scripts: list[str]) -> list[str]:
+    """Shell commands running each script from its own directory."""
+    commands = []
+    for script in scripts:
+        cmd = script_command(script)
+        if cmd is None:
+            commands.append(f"false # unknown language: {shlex.quote(script)}")
+        else:
+            directory, argv = cmd
+            commands.append(f"cd {shlex.quote(directory)} && {shlex.join(argv)}")
+    return commands
+
+
+def make_path(path: str) -> str:
+    """A path as a make target or prerequisite (spaces and $ escaped)."""
+    return path.replace("$", "$$").replace(" ", "\\ ")
+
+
+def stamp(job_id: str) -> str:
+    return f"$(STAMPS)/{make_path(job_id)}.done"
+
+
+def write_makefile(plan: dict, project_root: Path, path: Path) -> None:
+    """Stamp-file Makefile: one target per job, prerequisites are the job's
+    script(s), its inputs that no job writes (those present on disk; make
+    would stop on the others) and its prerequisite jobs' stamps."""
+    lines = [
+        "# Generated by plumber plan_build.py from current/dag.json.",
+        f"# Run from the project root: make -f {path.name} -j<cores>",
+        f"# Critical path: {fmt_seconds(plan['critical_path']['length_s'])} "
+        f"of {fmt_seconds(plan['serial_s'])} serial runtime.",
+        "",
+        f"STAMPS := {STAMP_DIR}",
+        "",
+        ".PHONY: all",
+        "all: " + " ".join(stamp(job["id"]) for job in plan["jobs"]),
+        "",
+    ]
+    for job in plan["jobs"]:
+        inputs = [i for i in job["inputs"] if (project_root / i).exists()]
+        prereqs = [make_path(p) for p in job["scripts"] + inputs] + [stamp(d) for d in job["deps"]]
+        lines.append(f"{stamp(job['id'])}: " + " ".join(prereqs))
+        lines.extend(f"\t{command}" for command in job["command"])
+        lines.append("\t@mkdir -p $(@D) && touch $@")
+        lines.append("")
+    path.write_text("\n".join(lines))
+
+
+def fmt_seconds(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def format_report(plan: dict) -> str:
+    lines = ["# Build Plan", ""]
+    jobs = plan["jobs"]
+    sources = plan["runtime_sources"]
+    lines.append(f"**Jobs:** {len(jobs)}  **Waves:** {len(plan['waves'])}  "
+                 f"**Widest wave:** {plan['max_width']}")
+    lines.append(f"**Serial runtime:** {fmt_seconds(plan['serial_s'])}  "
+                 f"**Critical path:** {fmt_seconds(plan['critical_path']['length_s'])}")
+    if sources["default"]:
+        lines.append(f"**Note:** {sources['default']} script(s) have no runtime estimate and "
+                     f"count as {fmt_seconds(DEFAULT_RUNTIME)} each.")
+    lines.append("")
+
+    lines.append("## Parallelism")
+    lines.append("")
+    lines.append("| Cores | Wall time | Speedup | Efficiency |")
+    lines.append("|---|---|---|---|")
+    for p in plan["parallelism"]:
+        lines.append(f"| {p['cores']} | {fmt_seconds(p['wall_s'])} | {p['speedup']:.2f}x "
+                     f"| {p['efficiency']:.0%} |")
+    lines.append("")
+
+    by_id = {job["id"]: job for job in jobs}
+    lines.append("## Critical Path")
+    lines.append("")
+    for job_id in plan["critical_path"]["jobs"]:
+        job = by_id[job_id]
+        members = f" (cycle: {', '.join(job['scripts'])})" if len(job["scripts"]) > 1 else ""
+        lines.append(f"- `{job_id}` — {fmt_seconds(job['runtime_s'])}{members}")
+    lines.append("")
+
+    lines.append("## Waves")
+    lines.append("")
+    for k, wave in enumerate(plan["waves"]):
+        wave_time = max(by_id[j]["runtime_s"] for j in wave)
+        lines.append(f"**Wave {k + 1}** ({len(wave)} jobs, longest {fmt_seconds(wave_time)}): "
+                     + ", ".join(f"`{j}`" for j in wave))
+    return "\n".join(lines)
+
+
+def parse_cores(value: str) -> list[int]:
+    try:
+        cores = sorted({int(c) for c in value.split(",")})
+    except ValueError:
+        cores = []
+    if not cores or cores[0] < 1:
+        print("--cores expects positive integers, e.g. 4 or 1,2,4,8", file=sys.stderr)
+        sys.exit(1)
+    return cores
+
+
+def main():
+    args = sys.argv[1:]
+    as_json = "--json" in args
+    cores = DEFAULT_CORES
+    runtimes_path = makefile_path = None
+    for flag in ("--cores", "--runtimes", "--makefile"):
+        if flag in args:
+            idx = args.index(flag)
+            if idx + 1 >= len(args):
+                print(f"{flag} expects a value", file=sys.stderr)
+                sys.exit(1)
+            value = args[idx + 1]
+            del args[idx:idx + 2]
+            if flag == "--cores":
+                cores = parse_cores(value)
+            elif flag == "--runtimes":
+                runtimes_path = value
+            else:
+                makefile_path = Path(value)
+    positional = [a for a in args if not a.startswith("--")]
+
+    project_dir = Path(positional[0] if positional else os.getcwd()).resolve()
+    project_root = find_root(project_dir)
+    dag_file = project_root / "current" / "dag.json"
+
+    if not dag_file.exists():
+        print(f"ERROR: No DAG found at {dag_file}")
+        print("Run '/plumber audit' or '/plumber status' to build the DAG first.")
+        sys.exit(1)
+
+    with open(dag_file) as f:
+        dag = json.load(f)
+    overrides = {}
+    if runtimes_path:
+        with open(runtimes_path) as f:
+            overrides = json.load(f)
+
+    plan = plan_build(dag, overrides, cores)
+
+    with open(project_root / "current" / "build_plan.json", "w") as f:
+        json.dump(plan, f, indent=2)
+        f.write("\n")
+    if makefile_path:
+        write_makefile(plan, project_root, makefile_path)
+
+    if as_json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print(format_report(plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+profile_run.py — Run pipeline scripts and record wall time, CPU time, peak memory and I/O per script.
+
+Usage: python3 profile_run.py [project_dir] [--scripts s1 s2 ...] [--keep-going]
+                              [--timeout S] [--dry-run] [--json]
+Reads current/dag.json. Runs the given scripts (default: every script in the
+DAG) one at a time in dependency order, each from its own directory with the
+commands plan_build.py uses, stopping at the first failure unless --keep-going.
+Output: a report of this run's measurements to stdout (or JSON with --json);
+exits 1 if a script failed or hit --timeout (its process group is killed).
+
+Each run is appended to current/profile_history.jsonl; current/profile.json
+holds every script's latest successful run, which build_dag.py copies onto
+the script nodes of dag.json ("runtime_s" and "profile", also updated here).
+A script's output goes to current/profile_logs/<script>.log.
+
+Measurements come from the kernel, so they include everything the script
+starts (a notebook's kernel, a Stata batch process):
+- wall time from the clock; user/sys CPU time and peak RSS from wait4's rusage;
+- bytes read/written (all read/write calls, and those that reached storage)
+  and the number of read/write syscalls from /proc/<pid>/io, read after the
+  script exits but before it is reaped.
+Where /proc or wait4 are unavailable the fields are null.
+
+A run is flagged as a regression when wall time or peak RSS exceeds
+REGRESSION_RATIO times the median of the script's previous HISTORY_WINDOW
+successful runs (and the difference is above a noise floor).
+"""
+
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from build_dag import PROFILE_NAME, annotate_nodes, graph_from_dag, write_json_atomic
+from plan_build import build_jobs, runtime_estimates, script_command
+from project_walk import find_root
+
+HISTORY_NAME = "profile_history.jsonl"
+LOG_DIR = "profile_logs"
+HISTORY_WINDOW = 5
+REGRESSION_RATIO = 1.5
+MIN_WALL_DELTA_S = 1.0
+MIN_RSS_DELTA_KB = 50 * 1024
+
+# /proc/<pid>/io field -> measurement name
+_PROC_IO_FIELDS = {
+    "rchar": "read_bytes",
+    "wchar": "write_bytes",
+    "read_bytes": "disk_read_bytes",
+    "write_bytes": "disk_write_bytes",
+    "syscr": "read_calls",
+    "syscw": "write_calls",
+}
+
+
+def read_proc_io(pid: int) -> dict[str, int | None]:
+    """I/O counters of a process (including its reaped children), or nulls."""
+    counters: dict[str, int | None] = dict.fromkeys(_PROC_IO_FIELDS.values())
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in _PROC_IO_FIELDS:
+                    counters[_PROC_IO_FIELDS[key]] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def run_measured(argv: list[str], cwd: Path, log_path: Path, timeout: float | None) -> dict:
+    """Run argv in cwd with output to log_path; return its measurements."""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "wb") as log:
+        start = time.perf_counter()
+        try:
+            # Own session, so a timeout can kill everything the script started
+            proc = subprocess.Popen(argv, cwd=cwd, stdin=subprocess.DEVNULL, stdout=log,
+                                    stderr=subprocess.STDOUT, start_new_session=True)
+        except OSError as e:
+            log.write(f"{e}\n".encode())
+            return {"exit_code": 127, "wall_s": 0.0, "error": str(e)}
+
+        timed_out = threading.Event()
+
+        def kill() -> None:
+            timed_out.set()
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer is not None:
+            timer.start()
+        io = dict.fromkeys(_PROC_IO_FIELDS.values())
+        usage = None
+        try:
+            if hasattr(os, "waitid"):
+                # Wait without reaping so /proc/<pid>/io still holds the totals
+                os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        wall = time.perf_counter() - start
+        if hasattr(os, "wait4"):
+            io = read_proc_io(proc.pid)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+
+    result = {"exit_code": proc.returncode, "wall_s": round(wall, 3)}
+    if timed_out.is_set():
+        result["timed_out"] = True
+    if usage is not None:
+        result.update({
+            "user_s": round(usage.ru_utime, 3),
+            "sys_s": round(usage.ru_stime, 3),
+            "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+            # ru_maxrss is in kilobytes on Linux, bytes on macOS
+            "max_rss_kb": usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss,
+        })
+    else:
+        result.update(dict.fromkeys(("user_s", "sys_s", "cpu_s", "max_rss_kb")))
+    result.update(io)
+    return result
+
+
+def load_history(path: Path) -> dict[str, list[dict]]:
+    """{script: runs, oldest first} from the history file."""
+    history: dict[str, list[dict]] = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                history.setdefault(run.get("script"), []).append(run)
+    except OSError:
+        pass
+    return history
+
+
+def regressions(run: dict, previous: list[dict]) -> list[str]:
+    """Human-readable regressions of run against the median of previous successful runs."""
+    baseline = [r for r in previous if r.get("exit_code") == 0][-HISTORY_WINDOW:]
+    if run.get("exit_code") != 0 or not baseline:
+        return []
+    found = []
+    for field, floor, unit in (("wall_s", MIN_WALL_DELTA_S, "s"), ("max_rss_kb", MIN_RSS_DELTA_KB, "KB")):
+        values = [r[field] for r in baseline if r.get(field) is not None]
+        if run.get(field) is None or not values:
+            continue
+        median = statistics.median(values)
+        if run[field] > median * REGRESSION_RATIO and run[field] - median > floor:
+            found.append(f"{field} {run[field]:g}{unit} vs median {median:g}{unit} "
+                         f"of last {len(values)} run(s)")
+    return found
+
+
+def select_scripts(dag: dict, wanted: list[str] | None) -> list[str]:
+    """Scripts to run, in dependency order (jobs of plan_build.build_jobs)."""
+    graph = graph_from_dag(dag)
+    ordered = [s for job in build_jobs(graph, runtime_estimates(dag, {})) for s in job["scripts"]]
+    if wanted is None:
+        return ordered
+    wanted_set = {os.path.normpath(w) for w in wanted}
+    unknown = wanted_set - set(ordered)
+    if unknown:
+        print(f"Not scripts in the DAG: {', '.join(sorted(unknown))}", file=sys.stderr)
+        sys.exit(1)
+    return [s for s in ordered if s in wanted_set]
+
+
+def fmt_bytes(n: int | None) -> str:
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def format_report(runs: list[dict]) -> str:
+    lines = ["# Profile", ""]
+    lines.append("| Script | Exit | Wall | CPU | Peak RSS | Read | Written |")
+    lines.append("|---|---|---|---|---|---|---|")
+    for run in runs:
+        cpu = "-" if run.get("cpu_s") is None else f"{run['cpu_s']:.2f}s"
+        rss = None if run.get("max_rss_kb") is None else run["max_rss_kb"] * 1024
+        lines.append(f"| `{run['script']}` | {run['exit_code']} | {run['wall_s']:.2f}s | {cpu} "
+                     f"| {fmt_bytes(rss)} | {fmt_bytes(run.get('read_bytes'))} "
+                     f"| {fmt_bytes(run.get('write_bytes'))} |")
+    flagged = [run for run in runs if run["regressions"]]
+    if flagged:
+        lines.append("")
+        lines.append("## Regressions")
+        lines.append("")
+        for run in flagged:
+            for r in run["regressions"]:
+                lines.append(f"- `{run['script']}`: {r}")
+    failed = [run for run in runs if run["exit_code"] != 0]
+    if failed:
+        lines.append("")
+        lines.append("## Failed")
+        lines.append("")
+        for run in failed:
+            how = "timed out" if run.get("timed_out") else f"exited {run['exit_code']}"
+            lines.append(f"- `{run['script']}` {how} (log: {run['log']})")
+    return "\n".join(lines)
+
+
+def main():
+    usage = ("Usage: python3 profile_run.py [project_dir] [--scripts s1 s2 ...] [--keep-going] "
+             "[--timeout S] [--dry-run] [--json]")
+    args = sys.argv[1:]
+    as_json = "--json" in args
+    keep_going = "--keep-going" in args
+    dry_run = "--dry-run" in args
+    timeout = None
+    if "--timeout" in args:
+        idx = args.index("--timeout")
+        try:
+            timeout = float(args[idx + 1])
+        except (IndexError, ValueError):
+            timeout = None
+        if timeout is None or not timeout > 0:
+            print("--timeout expects a positive number of seconds", file=sys.stderr)
+            print(usage, file=sys.stderr)
+            sys.exit(1)
+        del args[idx:idx + 2]
+    wanted = None
+    if "--scripts" in args:
+        idx = args.index("--scripts")
+        wanted = []
+        for a in args[idx + 1:]:
+            if a.startswith("--"):
+                break
+            wanted.append(a)
+        del args[idx:idx + 1 + len(wanted)]
+    positional = [a for a in args if not a.startswith("--")]
+
+    project_dir = Path(positional[0] if positional else os.getcwd()).resolve()
+    project_root = find_root(project_dir)
+    out_dir = project_root / "current"
+    dag_file = out_dir / "dag.json"
+
+    if not dag_file.exists():
+        print(f"ERROR: No DAG found at {dag_file}")
+        print("Run '/plumber audit' or '/plumber status' to build the DAG first.")
+        sys.exit(1)
+
+    with open(dag_file) as f:
+        dag = json.load(f)
+    scripts = select_scripts(dag, wanted)
+
+    if dry_run:
+        for script in scripts:
+            cmd = script_command(script)
+            print(f"{script}: " + ("(unknown language, skipped)" if cmd is None
+                                   else f"cd {cmd[0]} && {' '.join(cmd[1])}"))
+        return
+
+    history_path = out_dir / HISTORY_NAME
+    history = load_history(history_path)
+    try:
+        with open(out_dir / PROFILE_NAME) as f:
+            latest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        latest = {}
+
+    runs = []
+    for script in scripts:
+        cmd = script_command(script)
+        if cmd is None:
+            print(f"Skipping {script}: unknown language", file=sys.stderr)
+            continue
+        directory, argv = cmd
+        log_path = out_dir / LOG_DIR / f"{script}.log"
+        print(f"Running {script} ...", file=sys.stderr)
+        run = {"script": script,
+               "profiled_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+               **run_measured(argv, project_root / directory, log_path, timeout),
+               "command": " ".join(argv), "log": str(log_path.relative_to(project_root))}
+        with open(history_path, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        run["regressions"] = regressions(run, history.get(script, []))
+        runs.append(run)
+        if run["exit_code"] == 0:
+            latest[script] = {k: v for k, v in run.items() if k not in ("regressions", "log")}
+        elif not keep_going:
+            print(f"{script} failed (exit {run['exit_code']}); stopping. "
+                  f"Use --keep-going to continue.", file=sys.stderr)
+            break
+
+    write_json_atomic(out_dir / PROFILE_NAME, latest)
+    # Re-read: the watch daemon may have rewritten dag.json while scripts ran
+    with open(dag_file) as f:
+        dag = json.load(f)
+    annotate_nodes(project_root, dag)
+    write_json_atomic(dag_file, dag)
+
+    if as_json:
+        print(json.dumps(runs, indent=2))
+    else:
+        print(format_report(runs))
+    if any(run["exit_code"] != 0 for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
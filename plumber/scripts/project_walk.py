@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+project_walk.py — Single pruned directory walk shared by the plumber scanners.
+
+Used by scan_notebook, scan_script, build_dag and find_duplicates instead of
+one Path.rglob per extension. Walks with os.scandir, skips excluded directories
+before descending into them, and buckets files by extension and name in the
+same pass.
+"""
+
+import os
+from pathlib import Path
+
+# A directory is pruned if it is hidden or its name contains one of these
+# (so server_copy, server_copy2, server_copy_old are all skipped).
+EXCLUDE_DIRS = ("server_copy", "__pycache__", ".ipynb_checkpoints", "venv", ".venv", "node_modules")
+
+SETTINGS_NAMES = ["settings.R", "settings.jl", "config.py", "settings.py"]
+SCRIPT_EXTENSIONS = {".r", ".jl", ".py", ".do"}
+NOTEBOOK_EXTENSIONS = {".ipynb"}
+
+
+def find_root(start: Path) -> Path:
+    """Walk up looking for code/, data/ or a Makefile; fall back to start."""
+    for d in [start, *start.parents]:
+        if (d / "code").is_dir() or (d / "Makefile").is_file() or (d / "data").is_dir():
+            return d
+    return start
+
+
+def is_excluded_dir(name: str, exclude_dirs=EXCLUDE_DIRS) -> bool:
+    return name.startswith(".") or any(ex in name for ex in exclude_dirs)
+
+
+def walk_files(root: Path, extensions=(), names=(),
+               exclude_dirs=EXCLUDE_DIRS) -> dict[str, list[Path]]:
+    """Walk root once and bucket files by lowercased extension and by exact name.
+
+    Returns {key: sorted paths} with one entry for every requested extension
+    and name (empty list if none found). Symlinked directories are not followed.
+    """
+    extensions = {e.lower() for e in extensions}
+    names = set(names)
+    found: dict[str, list[Path]] = {key: [] for key in extensions | names}
+
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not is_excluded_dir(entry.name, exclude_dirs):
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if entry.name in names:
+                    found[entry.name].append(Path(entry.path))
+                ext = os.path.splitext(entry.name)[1].lower()
+                if ext in extensions:
+                    found[ext].append(Path(entry.path))
+
+    for paths in found.values():
+        paths.sort()
+    return found
+
+
+def walk_project(project_root: Path) -> dict[str, list[Path]]:
+    """One walk collecting notebooks, scripts and settings files for the scanners."""
+    return walk_files(project_root, SCRIPT_EXTENSIONS | NOTEBOOK_EXTENSIONS, SETTINGS_NAMES)
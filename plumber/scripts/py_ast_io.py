@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+py_ast_io.py — Python I/O extraction from the AST, with constant folding.
+
+Replaces the regex patterns for .py scripts and Python notebook cells. One pass
+over ast.parse output, statement by statement in source order, folds string-valued assignments
+(constants, +, f-strings, os.path.join, Path(...) / ..., str(...)) into an
+environment seeded with the settings variables, and reports each read/write
+call site with the folded path and its line number. Keyword arguments
+(`df.to_csv(path_or_buf=...)`) and open() modes are understood.
+
+Raises SyntaxError (or ValueError, for null bytes) on code that does not parse;
+callers fall back to the regexes.
+"""
+
+import ast
+import bisect
+import os
+import re
+
+# attribute name -> (positional index of the path, keyword names for it)
+READ_CALLS = {
+    name: (0, ("filepath_or_buffer", "io", "path", "path_or_buf", "source"))
+    for name in ("read_csv", "read_table", "read_fwf", "read_excel", "read_parquet",
+                 "read_stata", "read_feather", "read_pickle", "read_json", "read_sas",
+                 "read_spss", "read_hdf")
+}
+WRITE_CALLS = {
+    name: (0, ("path_or_buf", "excel_writer", "path", "fname", "buf"))
+    for name in ("to_csv", "to_excel", "to_parquet", "to_stata", "to_feather",
+                 "to_pickle", "to_json", "to_hdf", "to_latex", "to_html")
+}
+WRITE_CALLS["savefig"] = (0, ("fname",))
+NUMPY_READ_CALLS = {name: (0, ("file", "fname")) for name in ("load", "loadtxt", "genfromtxt")}
+NUMPY_WRITE_CALLS = {name: (0, ("file", "fname")) for name in ("save", "savetxt", "savez", "savez_compressed")}
+NUMPY_NAMES = {"np", "numpy"}
+PATH_NAMES = {"Path", "PurePath", "PosixPath", "pathlib.Path"}
+PATH_READ_METHODS = {"read_text", "read_bytes"}
+PATH_WRITE_METHODS = {"write_text", "write_bytes"}
+
+# An I/O function name followed by "(": marks the lines worth searching for calls
+_CALL_RE = re.compile(r"\b(?:open|read_\w+|to_\w+|savefig|load\w*|genfromtxt|save\w*|"
+                      r"write_(?:text|bytes))\s*\(")
+# Something that may bind a name (assignment, augmented or annotated assignment)
+_ASSIGN_RE = re.compile(r"^[ \t]*\w+[ \t]*(?::[^=\n]*)?[-+/]?=(?!=)", re.MULTILINE)
+
+# IPython line magics and shell escapes, blanked so notebook cells parse
+_MAGIC_RE = re.compile(r"^([ \t]*[%!].*)$", re.MULTILINE)
+
+
+def dotted_name(node: ast.AST) -> str | None:
+    """"os.path.join" for an Attribute/Name chain, None for anything else."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def join_paths(parts: list[str]) -> str:
+    return os.path.join(*parts) if parts else ""
+
+
+class IOExtractor:
+    """Collects (kind, path or None, expression text, line) for each I/O call.
+
+    Statements are visited in source order so assignments fold before later
+    uses. Only statements spanning a line in `call_lines` (lines where an I/O
+    function name is followed by "(") are searched for calls; the rest are
+    only checked for assignments.
+    """
+
+    def __init__(self, env: dict[str, str], call_lines: list[int]):
+        self.env = env
+        self.call_lines = call_lines
+        self.modules: set[str] = set()
+        self.sites: list[tuple[str, str | None, str, int]] = []
+
+    def visit_block(self, stmts: list[ast.stmt]) -> None:
+        for stmt in stmts:
+            i = bisect.bisect_left(self.call_lines, stmt.lineno)
+            touches = i < len(self.call_lines) and self.call_lines[i] <= stmt.end_lineno
+            self.visit_fields(stmt, touches)
+            if isinstance(stmt, ast.Assign):
+                value = self.fold(stmt.value)
+                for target in stmt.targets:
+                    self.assign(target, value)
+            elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+                self.assign(stmt.target, self.fold(stmt.value))
+            elif isinstance(stmt, ast.AugAssign):
+                self.assign(stmt.target, self.fold(ast.BinOp(stmt.target, stmt.op, stmt.value)))
+            elif isinstance(stmt, ast.Import):
+                self.modules.update(alias.asname or alias.name for alias in stmt.names)
+
+    def visit_fields(self, node: ast.AST, touches: bool) -> None:
+        """Recurse into nested statement bodies; search other fields for calls."""
+        for _field, value in ast.iter_fields(node):
+            if isinstance(value, list) and value and isinstance(value[0], ast.stmt):
+                self.visit_block(value)
+            elif isinstance(value, list) and value and isinstance(value[0], (ast.excepthandler, ast.match_case)):
+                for handler in value:
+                    self.visit_fields(handler, touches)
+            elif touches and isinstance(value, (ast.AST, list)):
+                for root in value if isinstance(value, list) else [value]:
+                    for sub in ast.walk(root):
+                        if isinstance(sub, ast.Call):
+                            self.visit_call(sub)
+
+    # --- constant folding ---------------------------------------------------
+
+    def fold(self, node: ast.AST) -> str | None:
+        """String value of an expression, or None if it is not a known constant."""
+        if isinstance(node, ast.Constant):
+            return node.value if isinstance(node.value, str) else None
+        if isinstance(node, ast.Name):
+            return self.env.get(node.id)
+        if isinstance(node, ast.Attribute):
+            # settings module attributes: import config; config.DATA_DIR
+            if isinstance(node.value, ast.Name) and node.value.id in self.modules:
+                return self.env.get(node.attr)
+            return None
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.FormattedValue):
+                    if value.format_spec is not None or value.conversion not in (-1, ord("s")):
+                        return None
+                    value = value.value
+                part = self.fold(value)
+                if part is None:
+                    return None
+                parts.append(part)
+            return "".join(parts)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Div)):
+            left, right = self.fold(node.left), self.fold(node.right)
+            if left is None or right is None:
+                return None
+            return left + right if isinstance(node.op, ast.Add) else join_paths([left, right])
+        if isinstance(node, ast.Call) and not node.keywords:
+            name = dotted_name(node.func)
+            if name in ("os.path.join", "path.join", "join") or name in PATH_NAMES:
+                args = [self.fold(a) for a in node.args]
+                return None if None in args else join_paths(args)
+            if name == "str" and len(node.args) == 1:
+                return self.fold(node.args[0])
+            if isinstance(node.func, ast.Attribute) and node.func.attr == "joinpath":
+                base = self.fold(node.func.value)
+                args = [self.fold(a) for a in node.args]
+                return None if base is None or None in args else join_paths([base, *args])
+        return None
+
+    def assign(self, target: ast.AST, value: str | None) -> None:
+        if isinstance(target, ast.Name):
+            if value is None:
+                self.env.pop(target.id, None)
+            else:
+                self.env[target.id] = value
+
+    # --- call sites -----------------------------------------------------------
+
+    def path_arg(self, node: ast.Call, index: int, keywords: tuple[str, ...]) -> ast.AST | None:
+        for kw in node.keywords:
+            if kw.arg in keywords:
+                return kw.value
+        if len(node.args) > index and not isinstance(node.args[index], ast.Starred):
+            return node.args[index]
+        return None
+
+    def record(self, kind: str, expr: ast.AST | None, line: int) -> None:
+        if expr is not None:
+            self.sites.append((kind, self.fold(expr), ast.unparse(expr), line))
+
+    def visit_call(self, node: ast.Call) -> None:
+        func = node.func
+        if (isinstance(func, ast.Name) and func.id == "open") or dotted_name(func) == "io.open":
+            self.record_open(node, self.path_arg(node, 0, ("file",)), 1)
+            return
+        if not isinstance(func, ast.Attribute):
+            return
+        attr = func.attr
+        base = dotted_name(func.value)
+        if attr in READ_CALLS:
+            self.record("read", self.path_arg(node, *READ_CALLS[attr]), node.lineno)
+        elif attr in WRITE_CALLS:
+            self.record("write", self.path_arg(node, *WRITE_CALLS[attr]), node.lineno)
+        elif base in NUMPY_NAMES and attr in NUMPY_READ_CALLS:
+            self.record("read", self.path_arg(node, *NUMPY_READ_CALLS[attr]), node.lineno)
+        elif base in NUMPY_NAMES and attr in NUMPY_WRITE_CALLS:
+            self.record("write", self.path_arg(node, *NUMPY_WRITE_CALLS[attr]), node.lineno)
+        elif attr in PATH_READ_METHODS | PATH_WRITE_METHODS | {"open"}:
+            # Path methods, only when the receiver folds to a path
+            if self.fold(func.value) is None:
+                return
+            if attr == "open":
+                self.record_open(node, func.value, 0)
+            else:
+                kind = "read" if attr in PATH_READ_METHODS else "write"
+                self.record(kind, func.value, node.lineno)
+
+    def record_open(self, node: ast.Call, path: ast.AST | None, mode_index: int) -> None:
+        mode_node = self.path_arg(node, mode_index, ("mode",))
+        mode = self.fold(mode_node) if mode_node is not None else "r"
+        if mode is None:
+            mode = "r"
+        if "r" in mode or "+" in mode or not any(c in mode for c in "wax"):
+            self.record("read", path, node.lineno)
+        if any(c in mode for c in "wax+"):
+            self.record("write", path, node.lineno)
+
+
+def parse_python(code: str) -> ast.Module:
+    """ast.parse, retrying with IPython magics and shell escapes blanked out
+    (line numbers are kept) so notebook cells parse."""
+    try:
+        return ast.parse(code)
+    except SyntaxError:
+        if "%" not in code and "!" not in code:
+            raise
+        return ast.parse(_MAGIC_RE.sub("", code))
+
+
+def extract_python_io(code: str, env: dict[str, str]) -> list[tuple[str, str | None, str, int]]:
+    """I/O call sites in Python code as (kind, folded path or None, expression, line).
+
+    `env` seeds the constant folding (settings variables) and is updated with
+    this code's string assignments, so notebook cells can share one env.
+    Raises SyntaxError or ValueError if the code does not parse.
+    """
+    call_lines = []
+    line, last = 1, 0
+    for m in _CALL_RE.finditer(code):
+        line += code.count("\n", last, m.start())
+        last = m.start()
+        call_lines.append(line)
+    if not call_lines and not _ASSIGN_RE.search(code):
+        return []  # nothing to report or fold; skip the parse
+
+    extractor = IOExtractor(env, call_lines)
+    extractor.visit_block(parse_python(code).body)
+    return extractor.sites
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+reclaim.py — Replace identical duplicate data files with reflinks or hardlinks.
+
+Used by find_duplicates.py --reclaim. For each identical group one copy is kept
+(the one in the project tree outside server_copy*, else the newest) and every
+other copy is verified by full SHA256 and then swapped for a reflink (FICLONE,
+where the filesystem supports it) or a hardlink to the kept copy. The swap is a
+link to a temp name followed by an atomic rename, so a file is never missing.
+
+Verification always reads the files (never hash_cache.py, whose stat-keyed
+entries can be stale), and just before each swap both the kept copy and the
+target are re-stat'ed against the stat taken when they were hashed; a file
+that changed in between is left alone. Every replacement is journalled
+(written and fsync'ed) to a JSONL journal in current/ before the swap and
+marked done after it, and undo(journal) turns each replaced file back into
+an independent copy.
+
+Reflinks keep the replaced file's own mtime and mode. Hardlinks share one inode,
+so a hardlinked copy takes the kept copy's mtime.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+sys.path.insert(0, str(Path(__file__).parent))
+from hash_cache import sha256_file
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+METHODS = ("auto", "reflink", "hardlink")
+
+
+def choose_keeper(files: list[dict], project_dir: Path) -> dict:
+    """The copy to keep: in the project tree outside server_copy*, else the newest."""
+    def in_project(f: dict) -> bool:
+        rel = os.path.relpath(f["path"], project_dir)
+        return not rel.startswith("..") and not rel.startswith("server_copy")
+
+    return max(files, key=lambda f: (in_project(f), f["mtime"], f["path"]))
+
+
+def reflink(src: Path, dst: Path) -> None:
+    """Create dst as a copy-on-write clone of src; raises OSError if unsupported."""
+    if fcntl is None:
+        raise OSError("reflinks need fcntl")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def temp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.plumber-reclaim.tmp")
+
+
+def replace_with_link(keeper: Path, target: Path, method: str) -> str:
+    """Atomically replace target with a reflink or hardlink to keeper.
+
+    Returns the method used. With "auto", a reflink is tried first and a
+    hardlink is the fallback.
+    """
+    st = os.stat(target)
+    tmp = temp_path(target)
+    tmp.unlink(missing_ok=True)
+    tried = ["reflink", "hardlink"] if method == "auto" else [method]
+    error: OSError | None = None
+    for m in tried:
+        try:
+            if m == "reflink":
+                reflink(keeper, tmp)
+                os.chmod(tmp, st.st_mode & 0o7777)
+                os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            else:
+                os.link(keeper, tmp)
+            os.replace(tmp, target)
+            return m
+        except OSError as e:
+            error = e
+            tmp.unlink(missing_ok=True)
+    raise error
+
+
+def file_version(st: os.stat_result) -> tuple[int, int, int, int]:
+    """What must not change between hashing a file and linking it."""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def plan_group(files: list[dict], project_dir: Path) -> list[dict]:
+    """Verify a group by full hash and plan each identical subgroup.
+
+    A group matched on a sampled or partial hash may split into several
+    subgroups; each gets its own keeper. Files that could not be read, that
+    changed while being read, or that match nothing else are not replaced.
+    Each planned file gets "verified": the file_version it was hashed at.
+    """
+    def full_hash(f: dict) -> str | None:
+        path = Path(f["path"])
+        try:
+            before = file_version(os.stat(path))
+            digest = sha256_file(path)
+            if file_version(os.stat(path)) != before:
+                return None
+        except OSError:
+            return None
+        f["verified"] = before
+        return digest
+
+    by_hash: dict[str | None, list[dict]] = {}
+    for f in files:
+        by_hash.setdefault(full_hash(f), []).append(f)
+
+    plans = []
+    for digest, members in by_hash.items():
+        if digest is None or len(members) < 2:
+            continue
+        keeper = choose_keeper(members, project_dir)
+        kst = keeper["stat"]
+        replace, skipped = [], []
+        for f in members:
+            if f is keeper:
+                continue
+            if (f["stat"].st_dev, f["stat"].st_ino) == (kst.st_dev, kst.st_ino):
+                skipped.append((f, "already linked"))
+            else:
+                replace.append(f)
+        plans.append({"keeper": keeper, "hash": digest, "replace": replace, "skipped": skipped})
+    return plans
+
+
+def reclaim(groups: list[list[dict]], project_dir: Path, apply: bool = False,
+            method: str = "auto", workers: int = 8) -> dict:
+    """Plan (and with apply=True, perform) replacement of duplicate copies.
+
+    Returns a summary dict: per-file actions, the journal path (if applied) and
+    bytes_reclaimed (the size of each replaced file that was its data's last
+    link; the would-be figure on a dry run).
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        plans = [plan for group_plans in pool.map(lambda g: plan_group(g, project_dir), groups)
+                 for plan in group_plans]
+
+    jobs = [(plan, f) for plan in plans for f in plan["replace"]]
+    actions = [{"path": f["path"], "keeper": plan["keeper"]["path"], "status": "skipped",
+                "reason": reason, "bytes": 0}
+               for plan in plans for f, reason in plan["skipped"]]
+
+    journal_path = None
+    journal = None
+    lock = threading.Lock()
+    if apply and jobs:
+        out_dir = project_dir / "current"
+        out_dir.mkdir(exist_ok=True)
+        journal_path = out_dir / f"reclaim_journal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        journal = open(journal_path, "a")
+
+    def log(entry: dict) -> None:
+        with lock:
+            journal.write(json.dumps(entry) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def run(job: tuple[dict, dict]) -> dict:
+        plan, f = job
+        path, keeper = Path(f["path"]), Path(plan["keeper"]["path"])
+        action = {"path": str(path), "keeper": str(keeper), "status": "planned",
+                  "reason": "", "bytes": f["size"] if f["stat"].st_nlink == 1 else 0}
+        if not apply:
+            return action
+        try:
+            st = os.stat(path)
+            if file_version(st) != f["verified"]:
+                raise OSError("file changed since it was hashed")
+            if file_version(os.stat(keeper)) != plan["keeper"]["verified"]:
+                raise OSError("kept copy changed since it was hashed")
+            # Journalled before the swap, so a crash cannot lose the undo record
+            log({"path": str(path), "keeper": str(keeper), "sha256": plan["hash"],
+                 "size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": st.st_mode & 0o7777})
+            used = replace_with_link(keeper, path, method)
+        except OSError as e:
+            return {**action, "status": "failed", "reason": str(e), "bytes": 0}
+        log({"path": str(path), "done": used})
+        return {**action, "status": used}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            actions.extend(pool.map(run, jobs))
+    finally:
+        if journal is not None:
+            journal.close()
+    if journal_path and journal_path.stat().st_size == 0:
+        journal_path.unlink()
+        journal_path = None
+
+    actions.sort(key=lambda a: a["path"])
+    return {
+        "applied": apply,
+        "method": method,
+        "journal": str(journal_path) if journal_path else None,
+        "actions": actions,
+        "bytes_reclaimed": sum(a["bytes"] for a in actions if a["status"] != "failed"),
+    }
+
+
+def undo(journal_path: Path) -> list[tuple[str, str]]:
+    """Turn every file replaced in a reclaim journal back into an independent copy.
+
+    Returns (path, status) pairs. A file is restored only if it still holds the
+    journalled content; its original mode and mtime are put back. Entries
+    never marked done (a crash mid-swap) are restored too: the file holds the
+    same content either way, and copying it is harmless.
+    """
+    results = []
+    with open(journal_path) as f:
+        entries = []
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash mid-append
+    for entry in reversed([e for e in entries if "sha256" in e]):
+        path = Path(entry["path"])
+        try:
+            if sha256_file(path) != entry["sha256"]:
+                results.append((str(path), "skipped: content changed since reclaim"))
+                continue
+            tmp = temp_path(path)
+            shutil.copyfile(path, tmp)
+            os.chmod(tmp, entry["mode"])
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, path)
+            results.append((str(path), "restored"))
+        except OSError as e:
+            results.append((str(path), f"failed: {e}"))
+    return results
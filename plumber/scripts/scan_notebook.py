@@ -2,88 +2,32 @@
 """
 scan_notebook.py — Parse .ipynb files and extract file I/O operations.
 
-Usage: python3 scan_notebook.py <project_root> [--settings settings.R ...]
+Usage: python3 scan_notebook.py <project_root> [--jobs N] [--settings settings.R ...]
 Output: JSON list of {file, language, reads, writes, unresolved} to stdout.
 
+--jobs N scans files across N worker processes (0 = one per CPU); output order
+is the same as a serial scan.
+
 Handles R (fread, read.csv, readRDS, read_csv, etc.), Python (pd.read_csv,
 open, etc.), and resolves path variables from settings files.
+
+Library use (as build_dag does, in-process):
+    ctx = prepare_scan(project_root)
+    notebook_scan = scan_all_notebooks(ctx)
 """
 
 import json
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-
-def load_settings_vars(project_root: Path, settings_files: list[str]) -> dict[str, str]:
-    """Parse settings files to build a {VAR_NAME: resolved_path} map."""
-    variables: dict[str, str] = {}
-
-    for sf in settings_files:
-        sf_path = project_root / sf
-        if not sf_path.exists():
-            continue
-
-        text = sf_path.read_text(errors="replace")
-
-        if sf.endswith(".R") or sf.endswith(".r"):
-            # R patterns: VAR <- "path" or VAR = "path"
-            for m in re.finditer(r'''(\w+)\s*(?:<-|=)\s*["']([^"']+)["']''', text):
-                variables[m.group(1)] = m.group(2)
-            # R paste0() patterns: VAR = paste0(A, B, ...) — resolve in order
-            for m in re.finditer(r'''(\w+)\s*(?:<-|=)\s*paste0\(([^)]+)\)''', text):
-                var_name = m.group(1)
-                args = [a.strip() for a in m.group(2).split(",")]
-                resolved_parts = []
-                all_resolved = True
-                for a in args:
-                    a_stripped = a.strip('"').strip("'")
-                    if a.startswith('"') or a.startswith("'"):
-                        resolved_parts.append(a_stripped)
-                    elif a_stripped in variables:
-                        resolved_parts.append(variables[a_stripped])
-                    else:
-                        all_resolved = False
-                        break
-                if all_resolved:
-                    variables[var_name] = "".join(resolved_parts)
-
-        elif sf.endswith(".jl"):
-            # Julia patterns: VAR = "path" or VAR = joinpath(...)
-            for m in re.finditer(r'''(\w+)\s*=\s*["']([^"']+)["']''', text):
-                variables[m.group(1)] = m.group(2)
-            # joinpath patterns
-            for m in re.finditer(r'(\w+)\s*=\s*joinpath\(([^)]+)\)', text):
-                var_name = m.group(1)
-                args = [a.strip().strip('"').strip("'") for a in m.group(2).split(",")]
-                resolved_args = []
-                for a in args:
-                    if a == "@__DIR__":
-                        resolved_args.append(str(sf_path.parent))
-                    elif a in variables:
-                        resolved_args.append(variables[a])
-                    else:
-                        resolved_args.append(a)
-                variables[var_name] = os.path.join(*resolved_args)
-
-        elif sf.endswith(".py"):
-            # Python patterns: VAR = "path"
-            for m in re.finditer(r'''(\w+)\s*=\s*["']([^"']+)["']''', text):
-                variables[m.group(1)] = m.group(2)
-
-        elif sf == "Makefile" or sf.endswith("/Makefile"):
-            # Makefile: VAR = path or VAR := path
-            for m in re.finditer(r'^(\w+)\s*[:?]?=\s*(.+)$', text, re.MULTILINE):
-                val = m.group(2).strip()
-                # Resolve $(VAR) references
-                def resolve_make_var(match):
-                    ref = match.group(1)
-                    return variables.get(ref, f"$({ref})")
-                val = re.sub(r'\$\((\w+)\)', resolve_make_var, val)
-                variables[m.group(1)] = val
-
-    return variables
+sys.path.insert(0, str(Path(__file__).parent))
+from notebook_stream import read_code_cells
+from project_walk import NOTEBOOK_EXTENSIONS, SETTINGS_NAMES, walk_files, walk_project
+from py_ast_io import extract_python_io
+from settings_vars import settings_table
 
 
 def resolve_path_expr(expr: str, variables: dict[str, str], project_root: Path) -> str | None:
@@ -145,50 +89,148 @@ def resolve_path_expr(expr: str, variables: dict[str, str], project_root: Path)
     return None
 
 
-# I/O function patterns per language
+# I/O function patterns per language. Each has exactly one capture group (the
+# path expression); `[^,)\n]+?` stops at the first argument separator without
+# the backtracking a lazy `.+?` does on long lines.
 R_READ_PATTERNS = [
-    r'''fread\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''read[._]csv\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''readRDS\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''read\.dta\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''load\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''source\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''read_(?:xlsx?|feather|parquet)\(\s*(?:path\s*=\s*)?(.+?)\s*[,)]''',
+    r'''fread\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''read[._]csv\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''readRDS\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''read\.dta\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''load\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''source\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''read_(?:xlsx?|feather|parquet)\(\s*(?:path\s*=\s*)?([^,)\n]+?)\s*[,)]''',
 ]
 
 R_WRITE_PATTERNS = [
-    r'''fwrite\(.+?,\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''write[._]csv\(.+?,\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''saveRDS\(.+?,\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''ggsave\(\s*(?:filename\s*=\s*)?(.+?)\s*[,)]''',
-    r'''save\(.+?,\s*file\s*=\s*(.+?)\s*[,)]''',
-    r'''cat\(.+?,\s*file\s*=\s*(.+?)\s*[,)]''',
-    r'''write_(?:xlsx?|feather|parquet)\(.+?,\s*(?:path\s*=\s*)?(.+?)\s*[,)]''',
-    r'''pdf\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''png\(\s*(?:filename\s*=\s*)?(.+?)\s*[,)]''',
-    r'''sink\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
-    r'''tex\(\s*(?:file\s*=\s*)?(.+?)\s*[,)]''',
+    r'''fwrite\(.+?,\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''write[._]csv\(.+?,\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''saveRDS\(.+?,\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''ggsave\(\s*(?:filename\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''save\(.+?,\s*file\s*=\s*([^,)\n]+?)\s*[,)]''',
+    r'''cat\(.+?,\s*file\s*=\s*([^,)\n]+?)\s*[,)]''',
+    r'''write_(?:xlsx?|feather|parquet)\(.+?,\s*(?:path\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''pdf\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''png\(\s*(?:filename\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''sink\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
+    r'''tex\(\s*(?:file\s*=\s*)?([^,)\n]+?)\s*[,)]''',
 ]
 
 PY_READ_PATTERNS = [
-    r'''pd\.read_csv\(\s*(.+?)\s*[,)]''',
-    r'''pd\.read_excel\(\s*(.+?)\s*[,)]''',
-    r'''pd\.read_parquet\(\s*(.+?)\s*[,)]''',
-    r'''pd\.read_stata\(\s*(.+?)\s*[,)]''',
-    r'''open\(\s*(.+?)\s*[,)]''',
-    r'''np\.load(?:txt)?\(\s*(.+?)\s*[,)]''',
+    r'''pd\.read_csv\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''pd\.read_excel\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''pd\.read_parquet\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''pd\.read_stata\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''open\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''np\.load(?:txt)?\(\s*([^,)\n]+?)\s*[,)]''',
 ]
 
 PY_WRITE_PATTERNS = [
-    r'''\.to_csv\(\s*(.+?)\s*[,)]''',
-    r'''\.to_excel\(\s*(.+?)\s*[,)]''',
-    r'''\.to_parquet\(\s*(.+?)\s*[,)]''',
-    r'''\.savefig\(\s*(.+?)\s*[,)]''',
-    r'''plt\.savefig\(\s*(.+?)\s*[,)]''',
-    r'''np\.save(?:txt)?\(.+?,\s*(.+?)\s*[,)]''',
+    r'''\.to_csv\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''\.to_excel\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''\.to_parquet\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''\.savefig\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''plt\.savefig\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''np\.save(?:txt)?\(.+?,\s*([^,)\n]+?)\s*[,)]''',
 ]
 
 
+def _leading_literal(pattern: str) -> str | None:
+    """First character a pattern must match, if it starts with a plain or escaped literal."""
+    if pattern[0] == "\\" and len(pattern) > 1 and not pattern[1].isalnum():
+        literal, rest = pattern[1], pattern[2:]
+    elif pattern[0].isalnum() or pattern[0] in "_%":
+        literal, rest = pattern[0], pattern[1:]
+    else:
+        return None
+    # A quantifier would make the literal optional
+    if rest[:1] in ("?", "*", "{"):
+        return None
+    return literal
+
+
+# Above this many characters, one precompiled finditer per pattern beats the
+# single combined pass (bench_io_patterns.py: the crossover is 4-8KB)
+SINGLE_PASS_MAX_CHARS = 4096
+
+
+class IOPatternMatcher:
+    """Find every read/write call site of one language.
+
+    Every pattern is compiled once at import time. Short sources (notebook
+    cells) are scanned in a single pass: the patterns are joined into one
+    alternation, and since each pattern has exactly one capture group,
+    `m.lastindex` names the pattern that matched. Call sites can overlap
+    (`fread(` nested inside `write.csv(`), so after each hit the scan resumes
+    one character later and the other patterns are tried at the same
+    position; a pattern only reports hits that start after its previous hit
+    ended. That yields the same matches as one re.finditer pass per pattern,
+    which is what sources over SINGLE_PASS_MAX_CHARS get: there the regex
+    engine's literal-prefix search makes separate passes cheaper than the
+    alternation.
+    """
+
+    def __init__(self, read_patterns: list[str], write_patterns: list[str], flags: int = 0):
+        self.entries = ([("read", p) for p in read_patterns]
+                        + [("write", p) for p in write_patterns])
+        self.compiled = [re.compile(p, flags) for _, p in self.entries]
+        for (_, p), rx in zip(self.entries, self.compiled):
+            if rx.groups != 1:
+                raise ValueError(f"I/O pattern must have exactly one capture group: {p}")
+        self.combined = re.compile("|".join(p for _, p in self.entries), flags)
+        # Patterns that could also match where another one did, keyed by the
+        # character at the hit position. Patterns without a literal first
+        # character are tried everywhere.
+        self.fold = str.lower if flags & re.IGNORECASE else (lambda c: c)
+        leading = [_leading_literal(p) for _, p in self.entries]
+        anywhere = [k for k, ch in enumerate(leading) if ch is None]
+        self.by_first_char: dict[str, list[int]] = {}
+        for k, ch in enumerate(leading):
+            if ch is not None:
+                self.by_first_char.setdefault(self.fold(ch), list(anywhere)).append(k)
+        self.anywhere = anywhere
+
+    def finditer(self, code: str):
+        """Yield (kind, pattern, expression) for each call site, kind being "read" or "write"."""
+        if len(code) > SINGLE_PASS_MAX_CHARS:
+            return self.per_pattern(code)
+        return self.single_pass(code)
+
+    def per_pattern(self, code: str):
+        for (kind, pattern), rx in zip(self.entries, self.compiled):
+            for m in rx.finditer(code):
+                yield kind, pattern, m.group(1)
+
+    def single_pass(self, code: str):
+        entries, compiled = self.entries, self.compiled
+        by_first_char, anywhere, fold = self.by_first_char, self.anywhere, self.fold
+        next_start = [0] * len(entries)
+        search = self.combined.search
+        m = search(code)
+        while m:
+            pos = m.start()
+            hit = m.lastindex - 1
+            if pos >= next_start[hit]:
+                next_start[hit] = m.end()
+                yield entries[hit][0], entries[hit][1], m.group(hit + 1)
+            for k in by_first_char.get(fold(code[pos]), anywhere):
+                if k == hit or pos < next_start[k]:
+                    continue
+                other = compiled[k].match(code, pos)
+                if other:
+                    next_start[k] = other.end()
+                    yield entries[k][0], entries[k][1], other.group(1)
+            m = search(code, pos + 1)
+
+
+R_MATCHER = IOPatternMatcher(R_READ_PATTERNS, R_WRITE_PATTERNS)
+PY_MATCHER = IOPatternMatcher(PY_READ_PATTERNS, PY_WRITE_PATTERNS)
+
+R_PIPED_READ_RE = re.compile(r'''["']([^"']+)["']\s*(?:%>%|\|>)\s*(?:fread|read[._]csv|readRDS)''')
+R_PIPED_PASTE0_READ_RE = re.compile(r'''paste0\(([^)]+)\)\s*(?:%>%|\|>)\s*(?:fread|read[._]csv|readRDS)''')
+R_PASTE0_WRITE_RE = re.compile(r'''(?:fwrite|write[._]csv|saveRDS)\([^,]+,\s*paste0\(([^)]+)\)''')
+
+
 def detect_notebook_language(cells: list[dict]) -> str:
     """Detect language from notebook metadata or cell content."""
     for cell in cells:
@@ -203,48 +245,54 @@ def detect_notebook_language(cells: list[dict]) -> str:
 
 
 def extract_io_from_code(code: str, language: str, variables: dict[str, str],
-                         project_root: Path) -> tuple[list[str], list[str], list[str]]:
-    """Extract reads, writes, and unresolved paths from code."""
+                         project_root: Path, env: dict[str, str] | None = None,
+                         locations: list[dict] | None = None) -> tuple[list[str], list[str], list[str]]:
+    """Extract reads, writes, and unresolved paths from code.
+
+    Python goes through the AST extractor (py_ast_io), which also appends
+    {"kind", "path", "line"} entries to `locations` if given; `env` carries
+    folded string assignments between notebook cells. Python that does not
+    parse, and every other language, uses the regex patterns.
+    """
     reads, writes, unresolved = [], [], []
 
-    if language == "R":
-        read_patterns = R_READ_PATTERNS
-        write_patterns = R_WRITE_PATTERNS
-    else:
-        read_patterns = PY_READ_PATTERNS
-        write_patterns = PY_WRITE_PATTERNS
-
-    for pattern in read_patterns:
-        for m in re.finditer(pattern, code):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved and not resolved.startswith("{"):
-                reads.append(resolved)
-            else:
-                unresolved.append(f"READ: {raw}")
-
-    for pattern in write_patterns:
-        for m in re.finditer(pattern, code):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved and not resolved.startswith("{"):
-                writes.append(resolved)
-            else:
-                unresolved.append(f"WRITE: {raw}")
+    if language == "python":
+        try:
+            sites = extract_python_io(code, dict(variables) if env is None else env)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            for kind, path, expr, line in sites:
+                if path is None or path.startswith("{"):
+                    unresolved.append(f"{kind.upper()}: {expr}")
+                    continue
+                (reads if kind == "read" else writes).append(path)
+                if locations is not None:
+                    locations.append({"kind": kind, "path": path, "line": line})
+            return reads, writes, unresolved
+
+    matcher = R_MATCHER if language == "R" else PY_MATCHER
+    for kind, _pattern, expr in matcher.finditer(code):
+        raw = expr.strip().strip('"').strip("'")
+        resolved = resolve_path_expr(raw, variables, project_root)
+        if resolved and not resolved.startswith("{"):
+            (reads if kind == "read" else writes).append(resolved)
+        else:
+            unresolved.append(f"{kind.upper()}: {raw}")
 
     # Also catch piped R patterns: "path" %>% fread() or paste0(...) %>% fread()
-    for m in re.finditer(r'''["']([^"']+)["']\s*(?:%>%|\|>)\s*(?:fread|read[._]csv|readRDS)''', code):
+    for m in R_PIPED_READ_RE.finditer(code):
         reads.append(m.group(1))
     # Piped paste0: paste0(VAR, 'suffix') %>% fread()
     if language == "R":
-        for m in re.finditer(r'''paste0\(([^)]+)\)\s*(?:%>%|\|>)\s*(?:fread|read[._]csv|readRDS)''', code):
+        for m in R_PIPED_PASTE0_READ_RE.finditer(code):
             resolved = resolve_path_expr(f"paste0({m.group(1)})", variables, project_root)
             if resolved:
                 reads.append(resolved)
             else:
                 unresolved.append(f"READ: paste0({m.group(1)})")
         # Piped paste0 for writes: ... %>% fwrite(paste0(VAR, 'suffix'))
-        for m in re.finditer(r'''(?:fwrite|write[._]csv|saveRDS)\([^,]+,\s*paste0\(([^)]+)\)''', code):
+        for m in R_PASTE0_WRITE_RE.finditer(code):
             resolved = resolve_path_expr(f"paste0({m.group(1)})", variables, project_root)
             if resolved:
                 writes.append(resolved)
@@ -256,75 +304,163 @@ def extract_io_from_code(code: str, language: str, variables: dict[str, str],
 
 def scan_notebook(nb_path: Path, variables: dict[str, str],
                   project_root: Path) -> dict:
-    """Scan a single .ipynb file for I/O operations."""
+    """Scan a single .ipynb file for I/O operations.
+
+    Only code-cell sources are read (notebook_stream); outputs are skipped unparsed.
+    """
     try:
-        with open(nb_path, encoding="utf-8", errors="replace") as f:
-            nb = json.load(f)
-    except (json.JSONDecodeError, OSError):
+        cells = read_code_cells(nb_path)
+    except (ValueError, OSError):
         return {"file": str(nb_path.relative_to(project_root)), "error": "Could not parse notebook"}
 
-    cells = nb.get("cells", [])
     language = detect_notebook_language(cells)
 
     all_reads, all_writes, all_unresolved = [], [], []
+    env = dict(variables)  # assignments carry over from cell to cell
+    locations = []
 
-    for cell in cells:
+    for cell_index, cell in enumerate(cells):
         if cell.get("cell_type") != "code":
             continue
         code = "".join(cell.get("source", []))
-        reads, writes, unresolved = extract_io_from_code(code, language, variables, project_root)
+        cell_locations = []
+        reads, writes, unresolved = extract_io_from_code(code, language, variables, project_root,
+                                                         env, cell_locations)
         all_reads.extend(reads)
         all_writes.extend(writes)
         all_unresolved.extend(unresolved)
+        locations.extend({**loc, "cell": cell_index} for loc in cell_locations)
 
-    return {
+    record = {
         "file": str(nb_path.relative_to(project_root)),
         "language": language,
         "reads": sorted(set(all_reads)),
         "writes": sorted(set(all_writes)),
         "unresolved": sorted(set(all_unresolved)),
     }
+    if language == "python":
+        record["locations"] = locations
+    return record
+
+
+def discover_settings_files(project_root: Path,
+                            files: dict[str, list[Path]] | None = None) -> list[str]:
+    """Find settings files and Makefiles that define path variables.
+
+    `files` is a table from project_walk.walk_project; walks the tree if omitted.
+    """
+    if files is None:
+        files = walk_files(project_root, names=SETTINGS_NAMES)
+    settings_files = []
+    for name in SETTINGS_NAMES:
+        for p in files.get(name, []):
+            settings_files.append(str(p.relative_to(project_root)))
+    # Check for Makefiles
+    for mf in ["Makefile", "code/Makefile"]:
+        if (project_root / mf).exists():
+            settings_files.append(mf)
+    return settings_files
+
+
+def find_notebooks(project_root: Path, files: dict[str, list[Path]] | None = None) -> list[Path]:
+    """Find all notebooks; checkpoints and server_copy dirs are pruned by the walk."""
+    if files is None:
+        files = walk_files(project_root, NOTEBOOK_EXTENSIONS)
+    return sorted(p for ext in NOTEBOOK_EXTENSIONS for p in files.get(ext, []))
+
+
+def parse_jobs_arg(argv: list[str]) -> tuple[int, list[str]]:
+    """Pull `--jobs N` out of argv; returns (jobs, remaining argv). 0 means one per CPU."""
+    if "--jobs" not in argv:
+        return 1, argv
+    idx = argv.index("--jobs")
+    try:
+        jobs = int(argv[idx + 1])
+    except (IndexError, ValueError):
+        print("--jobs expects an integer", file=sys.stderr)
+        sys.exit(1)
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs, argv[:idx] + argv[idx + 2:]
+
+
+# Per-process state for pool workers, set once by _init_worker so the variable
+# table is pickled once per worker rather than once per file.
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(scan_fn, variables: dict[str, str], project_root: Path) -> None:
+    _WORKER_STATE["scan_fn"] = scan_fn
+    _WORKER_STATE["variables"] = variables
+    _WORKER_STATE["project_root"] = project_root
+
+
+def _scan_in_worker(path: Path) -> dict:
+    return _WORKER_STATE["scan_fn"](path, _WORKER_STATE["variables"], _WORKER_STATE["project_root"])
+
+
+def scan_files(paths: list[Path], scan_fn, variables: dict[str, str],
+               project_root: Path, jobs: int = 1) -> list[dict]:
+    """Run scan_fn over paths, in a process pool when jobs > 1. Results keep input order."""
+    if jobs <= 1 or len(paths) < 2:
+        return [scan_fn(p, variables, project_root) for p in paths]
+    jobs = min(jobs, len(paths))
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(scan_fn, variables, project_root)) as pool:
+        return list(pool.map(_scan_in_worker, paths, chunksize=chunksize))
+
+
+def has_io(record: dict) -> bool:
+    """Whether a scan record found any reads, writes or unresolved paths."""
+    return bool(record.get("reads") or record.get("writes") or record.get("unresolved"))
+
+
+def prepare_scan(project_root: Path, settings_files: list[str] | None = None,
+                 files: dict[str, list[Path]] | None = None, save_settings: bool = False) -> dict:
+    """Walk the project once and load the settings variable table for all scanners.
+
+    Returns a scan context {project_root, files, settings_files, variables}
+    that scan_all_notebooks and scan_script.scan_all_scripts both take. The
+    table comes from settings_vars.settings_table (cached in current/, and
+    written back only with save_settings=True).
+    """
+    if files is None:
+        files = walk_project(project_root)
+    if settings_files is None:
+        settings_files = discover_settings_files(project_root, files)
+    return {
+        "project_root": project_root,
+        "files": files,
+        "settings_files": settings_files,
+        "variables": settings_table(project_root, settings_files, save=save_settings),
+    }
+
+
+def scan_all_notebooks(ctx: dict, jobs: int = 1) -> list[dict]:
+    """Scan every notebook in a scan context; returns records that found any I/O."""
+    project_root = ctx["project_root"]
+    notebooks = find_notebooks(project_root, ctx["files"])
+    return [r for r in scan_files(notebooks, scan_notebook, ctx["variables"], project_root, jobs)
+            if has_io(r)]
+
+
+def parse_settings_arg(argv: list[str]) -> list[str] | None:
+    """Settings files listed after --settings, or None to auto-discover them."""
+    if "--settings" not in argv:
+        return None
+    return argv[argv.index("--settings") + 1:]
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 scan_notebook.py <project_root> [--settings file1 file2 ...]",
+    jobs, argv = parse_jobs_arg(sys.argv)
+    if len(argv) < 2:
+        print("Usage: python3 scan_notebook.py <project_root> [--jobs N] [--settings file1 file2 ...]",
               file=sys.stderr)
         sys.exit(1)
 
-    project_root = Path(sys.argv[1]).resolve()
-
-    # Parse --settings if provided
-    settings_files = []
-    if "--settings" in sys.argv:
-        idx = sys.argv.index("--settings")
-        settings_files = sys.argv[idx + 1:]
-    else:
-        # Auto-discover settings files
-        for name in ["settings.R", "settings.jl", "config.py", "settings.py"]:
-            for p in project_root.rglob(name):
-                settings_files.append(str(p.relative_to(project_root)))
-        # Check for Makefiles
-        for mf in ["Makefile", "code/Makefile"]:
-            if (project_root / mf).exists():
-                settings_files.append(mf)
-
-    variables = load_settings_vars(project_root, settings_files)
-
-    # Find all notebooks
-    notebooks = sorted(project_root.rglob("*.ipynb"))
-    # Exclude checkpoints and server_copy dirs
-    notebooks = [nb for nb in notebooks
-                 if ".ipynb_checkpoints" not in str(nb)
-                 and "server_copy" not in str(nb)]
-
-    results = []
-    for nb_path in notebooks:
-        result = scan_notebook(nb_path, variables, project_root)
-        if result.get("reads") or result.get("writes") or result.get("unresolved"):
-            results.append(result)
-
-    print(json.dumps(results, indent=2))
+    ctx = prepare_scan(Path(argv[1]).resolve(), parse_settings_arg(argv))
+    print(json.dumps(scan_all_notebooks(ctx, jobs), indent=2))
 
 
 if __name__ == "__main__":
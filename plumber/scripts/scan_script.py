@@ -2,8 +2,12 @@
 """
 scan_script.py — Parse .R, .jl, .py, .do standalone scripts for file I/O.
 
-Usage: python3 scan_script.py <project_root> [--settings file1 file2 ...]
+Usage: python3 scan_script.py <project_root> [--jobs N] [--settings file1 file2 ...]
 Output: JSON list of {file, language, reads, writes, unresolved} to stdout.
+
+Library use: scan_all_scripts(scan_notebook.prepare_scan(project_root)).
+
+--jobs N scans files across N worker processes (0 = one per CPU).
 """
 
 import json
@@ -14,33 +18,39 @@ from pathlib import Path
 
 # Reuse the shared logic from scan_notebook
 sys.path.insert(0, str(Path(__file__).parent))
+from project_walk import SCRIPT_EXTENSIONS, walk_project
 from scan_notebook import (
-    load_settings_vars,
+    has_io,
+    parse_jobs_arg,
+    parse_settings_arg,
+    prepare_scan,
     resolve_path_expr,
+    scan_files,
     extract_io_from_code,
+    IOPatternMatcher,
     R_READ_PATTERNS,
     R_WRITE_PATTERNS,
 )
 
 # Julia-specific I/O patterns
 JL_READ_PATTERNS = [
-    r'''CSV\.read\(\s*(.+?)\s*[,)]''',
-    r'''readdlm\(\s*(.+?)\s*[,)]''',
-    r'''open\(\s*(.+?)\s*[,)]''',
-    r'''load\(\s*(.+?)\s*[,)]''',
+    r'''CSV\.read\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''readdlm\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''open\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''load\(\s*([^,)\n]+?)\s*[,)]''',
     r'''read\(\s*(.+?)\s*,\s*String\)''',
-    r'''DataFrame\(\s*CSV\.File\(\s*(.+?)\s*[,)]''',
-    r'''Arrow\.Table\(\s*(.+?)\s*[,)]''',
+    r'''DataFrame\(\s*CSV\.File\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''Arrow\.Table\(\s*([^,)\n]+?)\s*[,)]''',
 ]
 
 JL_WRITE_PATTERNS = [
-    r'''CSV\.write\(\s*(.+?)\s*[,)]''',
-    r'''writedlm\(\s*(.+?)\s*[,)]''',
-    r'''savefig\(\s*(.+?)\s*[,)]''',
-    r'''save\(\s*(.+?)\s*[,)]''',
-    r'''write\(\s*(.+?)\s*,''',
-    r'''Arrow\.write\(\s*(.+?)\s*[,)]''',
-    r'''serialize\(\s*(.+?)\s*[,)]''',
+    r'''CSV\.write\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''writedlm\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''savefig\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''save\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''write\(\s*([^,\n]+?)\s*,''',
+    r'''Arrow\.write\(\s*([^,)\n]+?)\s*[,)]''',
+    r'''serialize\(\s*([^,)\n]+?)\s*[,)]''',
 ]
 
 # Stata I/O patterns
@@ -60,6 +70,12 @@ STATA_WRITE_PATTERNS = [
     r'''file\s+open\s+\w+\s+using\s+"?([^",\n]+)"?''',
 ]
 
+JL_MATCHER = IOPatternMatcher(JL_READ_PATTERNS, JL_WRITE_PATTERNS)
+STATA_MATCHER = IOPatternMatcher(STATA_READ_PATTERNS, STATA_WRITE_PATTERNS, re.IGNORECASE)
+
+JL_JOINPATH_RE = re.compile(r'joinpath\(([^)]+)\)')
+JL_WRITE_CONTEXT_RE = re.compile(r'write|save|export', re.IGNORECASE)
+
 EXTENSIONS_TO_LANGUAGE = {
     ".R": "R", ".r": "R",
     ".jl": "julia",
@@ -73,26 +89,16 @@ def extract_julia_io(code: str, variables: dict[str, str],
     """Extract I/O from Julia code."""
     reads, writes, unresolved = [], [], []
 
-    for pattern in JL_READ_PATTERNS:
-        for m in re.finditer(pattern, code):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved and not resolved.startswith("{"):
-                reads.append(resolved)
-            else:
-                unresolved.append(f"READ: {raw}")
-
-    for pattern in JL_WRITE_PATTERNS:
-        for m in re.finditer(pattern, code):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved and not resolved.startswith("{"):
-                writes.append(resolved)
-            else:
-                unresolved.append(f"WRITE: {raw}")
+    for kind, _pattern, expr in JL_MATCHER.finditer(code):
+        raw = expr.strip().strip('"').strip("'")
+        resolved = resolve_path_expr(raw, variables, project_root)
+        if resolved and not resolved.startswith("{"):
+            (reads if kind == "read" else writes).append(resolved)
+        else:
+            unresolved.append(f"{kind.upper()}: {raw}")
 
     # Julia joinpath expressions used inline
-    for m in re.finditer(r'joinpath\(([^)]+)\)', code):
+    for m in JL_JOINPATH_RE.finditer(code):
         args = [a.strip().strip('"').strip("'") for a in m.group(1).split(",")]
         resolved_args = []
         all_resolved = True
@@ -112,7 +118,7 @@ def extract_julia_io(code: str, variables: dict[str, str],
             # (heuristic: if it appears in CSV.write/savefig context, it's a write)
             full_match_start = max(0, m.start() - 20)
             context = code[full_match_start:m.start()]
-            if re.search(r'write|save|export', context, re.IGNORECASE):
+            if JL_WRITE_CONTEXT_RE.search(context):
                 writes.append(path)
             else:
                 reads.append(path)
@@ -125,23 +131,13 @@ def extract_stata_io(code: str, variables: dict[str, str],
     """Extract I/O from Stata code."""
     reads, writes, unresolved = [], [], []
 
-    for pattern in STATA_READ_PATTERNS:
-        for m in re.finditer(pattern, code, re.IGNORECASE):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved:
-                reads.append(resolved)
-            else:
-                unresolved.append(f"READ: {raw}")
-
-    for pattern in STATA_WRITE_PATTERNS:
-        for m in re.finditer(pattern, code, re.IGNORECASE):
-            raw = m.group(1).strip().strip('"').strip("'")
-            resolved = resolve_path_expr(raw, variables, project_root)
-            if resolved:
-                writes.append(resolved)
-            else:
-                unresolved.append(f"WRITE: {raw}")
+    for kind, _pattern, expr in STATA_MATCHER.finditer(code):
+        raw = expr.strip().strip('"').strip("'")
+        resolved = resolve_path_expr(raw, variables, project_root)
+        if resolved:
+            (reads if kind == "read" else writes).append(resolved)
+        else:
+            unresolved.append(f"{kind.upper()}: {raw}")
 
     return reads, writes, unresolved
 
@@ -157,70 +153,60 @@ def scan_script(script_path: Path, variables: dict[str, str],
     ext = script_path.suffix.lower()
     language = EXTENSIONS_TO_LANGUAGE.get(ext, "unknown")
 
+    locations = []
     if language == "julia":
         reads, writes, unresolved = extract_julia_io(code, variables, project_root)
     elif language == "stata":
         reads, writes, unresolved = extract_stata_io(code, variables, project_root)
     else:
         # R or Python — use shared logic
-        reads, writes, unresolved = extract_io_from_code(code, language, variables, project_root)
+        reads, writes, unresolved = extract_io_from_code(code, language, variables, project_root,
+                                                         locations=locations)
 
-    return {
+    record = {
         "file": str(script_path.relative_to(project_root)),
         "language": language,
         "reads": sorted(set(reads)),
         "writes": sorted(set(writes)),
         "unresolved": sorted(set(unresolved)),
     }
+    if language == "python":
+        record["locations"] = locations
+    return record
+
+
+def find_scripts(project_root: Path, settings_files: list[str],
+                 files: dict[str, list[Path]] | None = None) -> list[Path]:
+    """Find all script files, excluding the settings files themselves.
+
+    server_copy, __pycache__, .ipynb_checkpoints and venv dirs are pruned by the
+    walk. `files` is a table from project_walk.walk_project; walks the tree if omitted.
+    """
+    if files is None:
+        files = walk_project(project_root)
+    settings_abs = {os.path.normpath(project_root / sf) for sf in settings_files}
+    scripts = [s for ext in SCRIPT_EXTENSIONS for s in files.get(ext, [])
+               if str(s) not in settings_abs]
+    return sorted(scripts)
+
+
+def scan_all_scripts(ctx: dict, jobs: int = 1) -> list[dict]:
+    """Scan every script in a scan context (see prepare_scan); returns records that found any I/O."""
+    project_root = ctx["project_root"]
+    scripts = find_scripts(project_root, ctx["settings_files"], ctx["files"])
+    return [r for r in scan_files(scripts, scan_script, ctx["variables"], project_root, jobs)
+            if has_io(r)]
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 scan_script.py <project_root> [--settings file1 ...]",
+    jobs, argv = parse_jobs_arg(sys.argv)
+    if len(argv) < 2:
+        print("Usage: python3 scan_script.py <project_root> [--jobs N] [--settings file1 ...]",
               file=sys.stderr)
         sys.exit(1)
 
-    project_root = Path(sys.argv[1]).resolve()
-
-    settings_files = []
-    if "--settings" in sys.argv:
-        idx = sys.argv.index("--settings")
-        settings_files = sys.argv[idx + 1:]
-    else:
-        for name in ["settings.R", "settings.jl", "config.py", "settings.py"]:
-            for p in project_root.rglob(name):
-                settings_files.append(str(p.relative_to(project_root)))
-        for mf in ["Makefile", "code/Makefile"]:
-            if (project_root / mf).exists():
-                settings_files.append(mf)
-
-    variables = load_settings_vars(project_root, settings_files)
-
-    # Find all script files
-    script_exts = {".R", ".r", ".jl", ".py", ".do"}
-    scripts = []
-    for ext in script_exts:
-        scripts.extend(project_root.rglob(f"*{ext}"))
-
-    # Exclude server_copy, __pycache__, .ipynb_checkpoints, venv
-    exclude_dirs = {"server_copy", "__pycache__", ".ipynb_checkpoints", "venv", ".venv", "node_modules"}
-    scripts = [s for s in scripts
-               if not any(ex in str(s) for ex in exclude_dirs)
-               and s.suffix.lower() in script_exts]
-
-    # Also exclude settings files themselves
-    settings_abs = {(project_root / sf).resolve() for sf in settings_files}
-    scripts = [s for s in scripts if s.resolve() not in settings_abs]
-
-    scripts.sort()
-
-    results = []
-    for script_path in scripts:
-        result = scan_script(script_path, variables, project_root)
-        if result.get("reads") or result.get("writes") or result.get("unresolved"):
-            results.append(result)
-
-    print(json.dumps(results, indent=2))
+    ctx = prepare_scan(Path(argv[1]).resolve(), parse_settings_arg(argv))
+    print(json.dumps(scan_all_scripts(ctx, jobs), indent=2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+settings_vars.py — The project's path-variable table, shared by every plumber tool.
+
+Usage: python3 settings_vars.py <project_root> [--settings file1 file2 ...]
+Output: JSON {VAR_NAME: resolved_path} to stdout.
+
+Collects variable definitions from the settings files (settings.R, settings.jl,
+config.py, settings.py) and Makefiles, then resolves them to a fixed point:
+every definition is re-evaluated until nothing changes, so a reference to a
+variable defined later, or in another file, resolves regardless of file order.
+When a name is defined more than once the last definition wins; a definition
+that refers to its own name (X <- paste0(X, "sub/")) sees the previous one.
+
+settings_table caches the result in current/settings_vars.json, one entry per
+settings-file list, together with the files' mtimes; scan_notebook, scan_script
+and build_dag all load the table through it instead of re-parsing. Only
+build_dag writes the cache: the scanners and this CLI read it and leave the
+project untouched.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+CACHE_NAME = "settings_vars.json"
+CACHE_VERSION = 2
+
+_REF_RE = re.compile(r'\$\((\w+)\)')
+
+
+def _quoted(arg: str) -> bool:
+    return arg.startswith('"') or arg.startswith("'")
+
+
+def file_definitions(project_root: Path, sf: str) -> list[tuple[str, str, object]]:
+    """(name, kind, payload) definitions in one settings file, in source order.
+
+    Kinds: "literal" (payload: str), "paste0" (list of ("lit"|"var", str)),
+    "joinpath" (list of ("lit"|"var_or_lit", str)) and "make" (str with $(REF)s).
+    """
+    sf_path = project_root / sf
+    if not sf_path.exists():
+        return []
+    text = sf_path.read_text(errors="replace")
+    found: list[tuple[int, tuple[str, str, object]]] = []
+
+    if sf.endswith(".R") or sf.endswith(".r"):
+        # VAR <- "path" or VAR = "path"
+        for m in re.finditer(r'''(\w+)\s*(?:<-|=)\s*["']([^"']+)["']''', text):
+            found.append((m.start(), (m.group(1), "literal", m.group(2))))
+        # VAR = paste0(A, "b", ...)
+        for m in re.finditer(r'''(\w+)\s*(?:<-|=)\s*paste0\(([^)]+)\)''', text):
+            args = [a.strip() for a in m.group(2).split(",")]
+            parts = [("lit", a.strip('"').strip("'")) if _quoted(a) else ("var", a) for a in args]
+            found.append((m.start(), (m.group(1), "paste0", parts)))
+
+    elif sf.endswith(".jl"):
+        # VAR = "path"
+        for m in re.finditer(r'''(\w+)\s*=\s*["']([^"']+)["']''', text):
+            found.append((m.start(), (m.group(1), "literal", m.group(2))))
+        # VAR = joinpath(...); bare words that are not variables are taken literally
+        for m in re.finditer(r'(\w+)\s*=\s*joinpath\(([^)]+)\)', text):
+            parts = []
+            for a in (a.strip() for a in m.group(2).split(",")):
+                if a == "@__DIR__":
+                    parts.append(("lit", str(sf_path.parent)))
+                elif _quoted(a):
+                    parts.append(("lit", a.strip('"').strip("'")))
+                else:
+                    parts.append(("var_or_lit", a))
+            found.append((m.start(), (m.group(1), "joinpath", parts)))
+
+    elif sf.endswith(".py"):
+        # VAR = "path"
+        for m in re.finditer(r'''(\w+)\s*=\s*["']([^"']+)["']''', text):
+            found.append((m.start(), (m.group(1), "literal", m.group(2))))
+
+    elif sf == "Makefile" or sf.endswith("/Makefile"):
+        # VAR = path, VAR := path, VAR ?= path; $(REF) to unknown names stays as is
+        for m in re.finditer(r'^(\w+)\s*[:?]?=\s*(.+)$', text, re.MULTILINE):
+            found.append((m.start(), (m.group(1), "make", m.group(2).strip())))
+
+    found.sort(key=lambda item: item[0])
+    return [d for _, d in found]
+
+
+def resolve_definitions(defs: list[tuple[str, str, object]]) -> dict[str, str]:
+    """Evaluate definitions to a fixed point and return {name: value}.
+
+    Each definition's value is computed once all the variables it refers to
+    have values, so a pass can only add values; the loop stops after the first
+    pass that adds none.
+    """
+    last: dict[str, int] = {}
+    previous: list[int | None] = []
+    for i, (name, _, _) in enumerate(defs):
+        previous.append(last.get(name))
+        last[name] = i
+    values: list[str | None] = [None] * len(defs)
+    final = False
+
+    def lookup(i: int, ref: str) -> tuple[bool, str | None]:
+        """(is ref defined, its value so far) as seen from definition i. In the
+        final pass, refs that never resolved count as undefined."""
+        j = previous[i] if ref == defs[i][0] else last.get(ref)
+        if j is None or (final and values[j] is None):
+            return False, None
+        return True, values[j]
+
+    def evaluate(i: int) -> str | None:
+        _, kind, payload = defs[i]
+        if kind == "literal":
+            return payload
+        if kind == "make":
+            pending = False
+
+            def sub(m: re.Match) -> str:
+                nonlocal pending
+                defined, value = lookup(i, m.group(1))
+                if not defined:
+                    return m.group(0)
+                if value is None:
+                    pending = True
+                    return ""
+                return value
+
+            value = _REF_RE.sub(sub, payload)
+            return None if pending else value
+        parts = []
+        for part_kind, text in payload:
+            if part_kind == "lit":
+                parts.append(text)
+                continue
+            defined, value = lookup(i, text)
+            if value is not None:
+                parts.append(value)
+            elif defined or part_kind == "var":
+                return None
+            else:
+                parts.append(text)
+        return "".join(parts) if kind == "paste0" else os.path.join(*parts)
+
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(defs)):
+            if values[i] is None:
+                values[i] = evaluate(i)
+                changed = changed or values[i] is not None
+
+    # Definitions stuck on a cycle: Makefile refs stay as $(REF) text and
+    # joinpath bare words are taken literally, as with an undefined name
+    final = True
+    for i in range(len(defs)):
+        if values[i] is None:
+            values[i] = evaluate(i)
+
+    # A name whose last definition never resolved keeps its latest resolved one
+    variables: dict[str, str] = {}
+    for (name, _, _), value in zip(defs, values):
+        if value is not None:
+            variables[name] = value
+    return variables
+
+
+def load_settings_vars(project_root: Path, settings_files: list[str]) -> dict[str, str]:
+    """Parse settings files to build a {VAR_NAME: resolved_path} map (uncached)."""
+    defs = []
+    for sf in settings_files:
+        defs.extend(file_definitions(project_root, sf))
+    return resolve_definitions(defs)
+
+
+def settings_mtimes(project_root: Path, settings_files: list[str]) -> dict[str, int | None]:
+    mtimes = {}
+    for sf in settings_files:
+        try:
+            mtimes[sf] = os.stat(project_root / sf).st_mtime_ns
+        except OSError:
+            mtimes[sf] = None
+    return mtimes
+
+
+def settings_key(settings_files: list[str]) -> str:
+    """Cache key for one settings-file list (order matters: later files win)."""
+    return hashlib.sha256(json.dumps(settings_files).encode()).hexdigest()[:16]
+
+
+def read_cache(cache_path: Path) -> dict:
+    """{key: entry} from current/settings_vars.json; {} if missing or outdated."""
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get("version") == CACHE_VERSION and isinstance(cached.get("tables"), dict):
+            return cached["tables"]
+    except (OSError, json.JSONDecodeError, AttributeError):
+        pass
+    return {}
+
+
+def settings_table(project_root: Path, settings_files: list[str], save: bool = False) -> dict[str, str]:
+    """The resolved variable table, from current/settings_vars.json when this
+    settings-file list and the files' mtimes are unchanged, else recomputed.
+
+    With save=True (build_dag) a recomputed table is written back under its
+    list's key; other lists' entries are kept.
+    """
+    cache_path = project_root / "current" / CACHE_NAME
+    key = settings_key(settings_files)
+    mtimes = settings_mtimes(project_root, settings_files)
+    entry = read_cache(cache_path).get(key)
+    if (isinstance(entry, dict) and entry.get("settings_files") == settings_files
+            and entry.get("mtimes") == mtimes and isinstance(entry.get("variables"), dict)):
+        return entry["variables"]
+
+    variables = load_settings_vars(project_root, settings_files)
+    if not save:
+        return variables
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        tables = read_cache(cache_path)
+        tables[key] = {"settings_files": settings_files, "mtimes": mtimes, "variables": variables}
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": CACHE_VERSION, "tables": tables}, f, indent=2)
+            f.write("\n")
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # read-only project: the table is still returned
+    return variables
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 settings_vars.py <project_root> [--settings file1 file2 ...]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    from scan_notebook import discover_settings_files, parse_settings_arg
+
+    project_root = Path(sys.argv[1]).resolve()
+    settings_files = parse_settings_arg(sys.argv)
+    if settings_files is None:
+        settings_files = discover_settings_files(project_root)
+    print(json.dumps(settings_table(project_root, settings_files), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+staleness.py — Compare mtimes along DAG edges to find stale files.
+
+Usage: python3 staleness.py [project_dir] [--json] [--workers N] [--fingerprint]
+Reads current/dag.json. Stats every node once (on a thread pool, which hides
+latency on network filesystems), then propagates staleness downstream in one
+pass over the DAG's topological order.
+Output: human-readable staleness report to stdout (or the JSON report with
+--json); the JSON report is always written to current/staleness.json.
+--workers sets the stat thread pool (default 16, 0 for one per CPU).
+
+--fingerprint judges outputs by content instead of mtimes. When an output is up
+to date, the content hashes of the output, its producing script and that
+script's inputs are recorded in current/dag_meta.json; later the output is stale
+only if one of those input hashes changed. Outputs without a valid record (new,
+or rebuilt since it was taken), directories and files that cannot be read fall
+back to the mtime rule. Hashes come from hash_cache.HashCache, so unchanged
+files are not re-read.
+"""
+
+import json
+import os
+import stat
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from build_dag import analyze_cycles, graph_from_dag, load_previous_meta, write_json_atomic
+from hash_cache import HashCache
+from project_walk import find_root
+
+DEFAULT_WORKERS = 16
+
+
+def parallel_map(fn, items: list, workers: int) -> list:
+    if workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items))
+
+
+def stat_nodes(project_root: Path, node_ids: list[str],
+               workers: int) -> dict[str, os.stat_result | None]:
+    """stat of every node, None for missing files. One stat per node."""
+    def stat_one(node_id: str) -> os.stat_result | None:
+        try:
+            return os.stat(project_root / node_id)
+        except OSError:
+            return None
+
+    return dict(zip(node_ids, parallel_map(stat_one, node_ids, workers)))
+
+
+def outputs_of(graph, script: str) -> list[str]:
+    return [e["to"] for e in graph.out_edges.get(script, []) if e["relation"] == "produces"]
+
+
+def mtime_staleness(graph, mtimes: dict[str, float]) -> list[tuple[str, str, str]]:
+    """Stale (source, output, reason) triples by mtime: a producer is newer than
+    its output, or an input is newer than an output of the script that consumes it."""
+    stale_edges = []
+    for edge in graph.edges:
+        src, dst = edge["from"], edge["to"]
+        if src not in mtimes or dst not in mtimes:
+            continue
+        if edge["relation"] == "produces":
+            if mtimes[src] > mtimes[dst]:
+                stale_edges.append((src, dst, "script newer than output"))
+        elif edge["relation"] == "consumed_by":
+            for output in outputs_of(graph, dst):
+                if output in mtimes and mtimes[src] > mtimes[output]:
+                    stale_edges.append((src, output, f"input newer than output (via {dst})"))
+    return stale_edges
+
+
+def output_inputs(graph, output: str) -> list[tuple[str, str]]:
+    """(input, reason suffix) pairs an output depends on: its producing scripts
+    and everything those scripts consume."""
+    inputs = []
+    for script in graph.producers(output):
+        inputs.append((script, ""))
+        for e in graph.in_edges.get(script, []):
+            if e["relation"] == "consumed_by":
+                inputs.append((e["from"], f" (via {script})"))
+    return inputs
+
+
+def fingerprint_staleness(graph, project_root: Path, stats: dict, fingerprints: dict,
+                          cache: HashCache, workers: int) -> list[tuple[str, str, str]]:
+    """Stale (source, output, reason) triples by input content.
+
+    Updates `fingerprints` in place with fresh records for up-to-date outputs.
+    """
+    mtimes = {n: st.st_mtime for n, st in stats.items() if st is not None}
+    outputs = [n for n in graph.nodes if n in mtimes and graph.producers(n)]
+
+    # Hash every existing output and input once (cache misses only), in parallel.
+    # Directories and other non-regular nodes are left to the mtime rule.
+    needed = set(outputs)
+    needed.update(i for o in outputs for i, _ in output_inputs(graph, o) if i in mtimes)
+    needed = sorted(n for n in needed if stat.S_ISREG(stats[n].st_mode))
+    def digest(node_id: str) -> str | None:
+        try:
+            return cache.hash_file(project_root / node_id, stats[node_id])
+        except OSError:
+            return None
+
+    digests = {n: d for n, d in zip(needed, parallel_map(digest, needed, workers)) if d is not None}
+
+    stale_edges = []
+    for output in outputs:
+        record = fingerprints.get(output)
+        valid = record is not None and record["output"] == digests.get(output)
+        recorded = record["inputs"] if valid else {}
+
+        output_stale = []
+        for src, via in output_inputs(graph, output):
+            if src not in mtimes:
+                continue
+            kind = "input" if via else "script"
+            if src in recorded and src in digests:
+                if recorded[src] != digests[src]:
+                    output_stale.append((src, output, f"{kind} content changed since output was built{via}"))
+            elif mtimes[src] > mtimes[output]:
+                output_stale.append((src, output, f"{kind} newer than output{via}"))
+
+        stale_edges.extend(output_stale)
+        if output in digests and not valid and not output_stale:
+            fingerprints[output] = {
+                "output": digests[output],
+                "inputs": {src: digests[src] for src, _ in output_inputs(graph, output)
+                           if src in digests},
+            }
+    return stale_edges
+
+
+def check_staleness(dag: dict, project_root: Path, workers: int = DEFAULT_WORKERS,
+                    fingerprint: bool = False) -> dict:
+    """Compute the staleness report for a loaded dag.json."""
+    graph = graph_from_dag(dag)
+    order = dag.get("topological_order") or analyze_cycles(graph)[1]
+
+    stats = stat_nodes(project_root, list(graph.nodes), workers)
+    mtimes = {n: st.st_mtime for n, st in stats.items() if st is not None}
+    missing = sorted(n for n, st in stats.items() if st is None)
+
+    if fingerprint:
+        meta_path = project_root / "current" / "dag_meta.json"
+        fingerprints = load_previous_meta(meta_path).get("fingerprints", {})
+        cache = HashCache.for_project(project_root)
+        stale_edges = fingerprint_staleness(graph, project_root, stats, fingerprints,
+                                            cache, workers)
+        cache.save()
+        # Re-read right before writing so a build_dag or watch.py write made
+        # while hashing is kept; only the fingerprints are ours
+        meta = load_previous_meta(meta_path)
+        meta["fingerprints"] = fingerprints
+        write_json_atomic(meta_path, meta)
+    else:
+        stale_edges = mtime_staleness(graph, mtimes)
+    stale_files = {dst for _, dst, _ in stale_edges}
+
+    # Propagate downstream (data -> consuming script -> its outputs) in
+    # topological order, so each node is visited once. A node marked after it
+    # was visited can only sit on a cycle; those are re-walked from a worklist.
+    position = {n: i for i, n in enumerate(order)}
+    revisit = []
+
+    def mark_downstream(node: str, visited_upto: int) -> None:
+        for script in graph.consumers(node):
+            for output in outputs_of(graph, script):
+                if output not in stale_files:
+                    stale_files.add(output)
+                    if position.get(output, -1) <= visited_upto:
+                        revisit.append(output)
+
+    for i, node in enumerate(order):
+        if node in stale_files:
+            mark_downstream(node, i)
+    while revisit:
+        mark_downstream(revisit.pop(), len(order))
+
+    return {
+        "project_root": str(project_root),
+        "dag_scan": dag.get("scan_timestamp", "unknown"),
+        "mode": "fingerprint" if fingerprint else "mtime",
+        "missing": [{"id": m, "type": graph.nodes.get(m, {}).get("type", "unknown")}
+                    for m in missing],
+        "stale_edges": [{"source": s, "target": t, "reason": r,
+                         "source_mtime": mtimes.get(s), "target_mtime": mtimes.get(t)}
+                        for s, t, r in sorted(stale_edges)],
+        "stale_files": [{"id": f, "mtime": mtimes.get(f)} for f in sorted(stale_files)],
+        "node_count": len(dag["nodes"]),
+        "edge_count": len(dag["edges"]),
+    }
+
+
+def format_report(report: dict) -> str:
+    """Render the staleness report as text."""
+    def fmt(ts: float | None) -> str:
+        return datetime.fromtimestamp(ts or 0).strftime("%Y-%m-%d %H:%M")
+
+    lines = []
+    lines.append("=" * 60)
+    lines.append("STALENESS REPORT")
+    lines.append(f"Project: {report['project_root']}")
+    lines.append(f"DAG scan: {report['dag_scan']}")
+    lines.append("=" * 60)
+
+    missing = report["missing"]
+    stale_edges = report["stale_edges"]
+    stale_files = report["stale_files"]
+
+    if missing:
+        lines.append(f"\n## Missing files ({len(missing)})")
+        for m in missing:
+            lines.append(f"  [MISSING] {m['id']} ({m['type']})")
+
+    if stale_edges:
+        lines.append(f"\n## Stale edges ({len(stale_edges)})")
+        for e in stale_edges:
+            lines.append(f"  [STALE] {e['target']}")
+            lines.append(f"          {e['reason']}")
+            lines.append(f"          {e['source']}: {fmt(e['source_mtime'])}")
+            lines.append(f"          {e['target']}: {fmt(e['target_mtime'])}")
+
+    if stale_files:
+        lines.append(f"\n## All stale files ({len(stale_files)}, including transitive)")
+        for f in stale_files:
+            mtime_str = fmt(f["mtime"]) if f["mtime"] is not None else "MISSING"
+            lines.append(f"  {f['id']}  ({mtime_str})")
+
+    if not stale_edges and not missing:
+        lines.append("\nAll files are up to date.")
+
+    lines.append(f"\nSummary: {report['node_count']} nodes, {report['edge_count']} edges, "
+                 f"{len(stale_files)} stale, {len(missing)} missing")
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    as_json = "--json" in args
+    fingerprint = "--fingerprint" in args
+    workers = DEFAULT_WORKERS
+    if "--workers" in args:
+        idx = args.index("--workers")
+        try:
+            workers = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print("--workers expects an integer", file=sys.stderr)
+            sys.exit(1)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        del args[idx:idx + 2]
+    positional = [a for a in args if not a.startswith("--")]
+
+    project_dir = Path(positional[0] if positional else os.getcwd()).resolve()
+    project_root = find_root(project_dir)
+    dag_file = project_root / "current" / "dag.json"
+
+    if not dag_file.exists():
+        print(f"ERROR: No DAG found at {dag_file}")
+        print("Run '/plumber audit' or '/plumber status' to build the DAG first.")
+        sys.exit(1)
+
+    with open(dag_file) as f:
+        dag = json.load(f)
+
+    report = check_staleness(dag, project_root, workers, fingerprint)
+
+    write_json_atomic(project_root / "current" / "staleness.json", report)
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+synth_project.py — Generate a synthetic economics project for benchmarking plumber.
+
+Usage: python3 synth_project.py <out_dir> [--files N] [--seed S] [--mix R,PY,JL,DO,NB]
+                                [--lines L] [--output-kb K] [--data-kb K]
+Output: the project tree in out_dir; a one-line summary to stderr.
+
+--files counts scripts plus notebooks (default 100), split by --mix weights
+(default 30,25,15,10,20 for R, Python, Julia, Stata, notebooks) and spread over
+code/stage_<k>/ directories of 200. Script i reads 1-3 outputs of recent earlier
+scripts (or raw files) and writes 1-2 files of its own, through the settings
+variables (code/settings.R, settings.jl, config.py), in notebooks as in scripts.
+Each script has --lines lines of filler; each notebook carries a --output-kb
+base64 image output. Every raw and produced data file exists on disk
+(--data-kb each); about 5% are duplicated into data/archive/ and server_copy/,
+and about 5% of scripts are newer than their outputs, so find_duplicates and
+staleness have work to do. The Makefile declares targets for some outputs.
+
+The same --seed always produces the same project.
+"""
+
+import base64
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+DEFAULT_MIX = {"R": 30, "python": 25, "julia": 15, "stata": 10, "notebook": 20}
+EXTENSIONS = {"R": ".R", "python": ".py", "julia": ".jl", "stata": ".do", "notebook": ".ipynb"}
+FILES_PER_STAGE = 200
+WINDOW = 50  # inputs are drawn from the outputs of the last WINDOW scripts
+DUPLICATE_FRACTION = 0.05
+STALE_FRACTION = 0.05
+
+SETTINGS_R = '''DATA <- "data/"
+RAW <- paste0(DATA, "raw/")
+INT <- paste0(DATA, "int/")
+OUT <- "output/"
+'''
+SETTINGS_JL = '''RAW = "data/raw/"
+INT = "data/int/"
+OUT = "output/"
+'''
+CONFIG_PY = '''RAW_DIR = "data/raw/"
+INT_DIR = "data/int/"
+OUT_DIR = "output/"
+'''
+
+
+def read_line(language: str, path: str, i: int) -> str:
+    """A line reading data/<raw|int>/name in the language's usual style."""
+    folder, name = path.split("/")[1:]
+    if language == "R":
+        return f'x{i} <- paste0({"RAW" if folder == "raw" else "INT"}, "{name}") %>% fread()'
+    if language == "python":
+        return f'x{i} = pd.read_csv(os.path.join({"RAW_DIR" if folder == "raw" else "INT_DIR"}, "{name}"))'
+    if language == "julia":
+        return f'x{i} = CSV.read(joinpath({"RAW" if folder == "raw" else "INT"}, "{name}"), DataFrame)'
+    return f'import delimited "{path}", clear'
+
+
+def write_line(language: str, path: str, i: int) -> str:
+    name = path.split("/")[-1]
+    if language == "R":
+        return f'fwrite(x{i}, file = "{path}")'
+    if language == "python":
+        return f'x{i}.to_csv(os.path.join(INT_DIR, "{name}"), index=False)'
+    if language == "julia":
+        return f'CSV.write(joinpath(INT, "{name}"), x{i})'
+    return f'export delimited using "{path}", replace'
+
+
+def filler(language: str, n: int, rng: random.Random) -> list[str]:
+    lines = []
+    for j in range(n):
+        v = rng.randint(0, 99)
+        if language == "R":
+            lines.append(f"dt{j} <- dt[year > {2000 + v % 20} & state %in% states, "
+                         f".(v = sum(w * x{v})), by = .(id, year)]")
+        elif language == "python":
+            lines.append(f"df['y{j}'] = np.where(df['x{v}'] > {v}, df['a'] * 2, df['b'] - 1)")
+        elif language == "julia":
+            lines.append(f"df.y{j} = ifelse.(df.x{v} .> {v}, df.a .* 2, df.b .- 1)")
+        else:
+            lines.append(f"gen y{j} = cond(x{v} > {v}, a * 2, b - 1)")
+    return lines
+
+
+def header(language: str) -> list[str]:
+    if language == "R":
+        return ['source("code/settings.R")', "library(data.table)"]
+    if language == "python":
+        return ["import os", "import numpy as np", "import pandas as pd",
+                "from config import RAW_DIR, INT_DIR, OUT_DIR"]
+    if language == "julia":
+        return ['include("settings.jl")', "using CSV, DataFrames"]
+    return ["clear all", "set more off"]
+
+
+def notebook(lang: str, code_lines: list[str], output_kb: int, rng: random.Random) -> str:
+    """nbformat 4 JSON: one code cell per ~20 lines, the first with an image output."""
+    cells = []
+    for start in range(0, len(code_lines), 20):
+        source = [line + "\n" for line in code_lines[start:start + 20]]
+        cells.append({"cell_type": "code", "execution_count": len(cells) + 1, "metadata": {},
+                      "source": source, "outputs": []})
+    if cells and output_kb:
+        blob = base64.b64encode(rng.randbytes(output_kb * 768)).decode()
+        cells[0]["outputs"].append({"output_type": "display_data", "metadata": {},
+                                    "data": {"image/png": blob, "text/plain": ["<Figure>"]}})
+    kernel = {"R": ("ir", "R"), "python": ("python3", "python")}[lang]
+    return json.dumps({"cells": cells, "metadata": {"kernelspec": {"name": kernel[0], "language": kernel[1]}},
+                       "nbformat": 4, "nbformat_minor": 5}, indent=1)
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    weights = [int(w) for w in value.split(",")]
+    if len(weights) != len(DEFAULT_MIX) or sum(weights) <= 0 or min(weights) < 0:
+        raise ValueError("--mix expects five non-negative weights: R,PY,JL,DO,NB")
+    return dict(zip(DEFAULT_MIX, weights))
+
+
+def generate_project(root: Path, n_files: int = 100, seed: int = 0,
+                     mix: dict[str, int] | None = None, lines: int = 100,
+                     output_kb: int = 64, data_kb: int = 4) -> dict:
+    """Write the project under root; returns counts of what was generated."""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n_files)
+
+    for d in ("code", "data/raw", "data/int", "data/archive", "output", "server_copy/data/int"):
+        (root / d).mkdir(parents=True, exist_ok=True)
+    (root / "code" / "settings.R").write_text(SETTINGS_R)
+    (root / "code" / "settings.jl").write_text(SETTINGS_JL)
+    (root / "code" / "config.py").write_text(CONFIG_PY)
+
+    raw = [f"data/raw/raw_{j}.csv" for j in range(max(5, n_files // 20))]
+    produced: list[list[str]] = []  # outputs of each script, by index
+    scripts = []
+    for i, kind in enumerate(kinds):
+        language = rng.choice(["R", "python"]) if kind == "notebook" else kind
+        recent = [p for outs in produced[-WINDOW:] for p in outs]
+        pool = recent if recent and rng.random() < 0.85 else raw
+        inputs = rng.sample(pool, min(len(pool), rng.randint(1, 3)))
+        outputs = [f"data/int/s{i}_{k}.csv" for k in range(rng.randint(1, 2))]
+        produced.append(outputs)
+
+        code = header(language)
+        code += [read_line(language, p, n) for n, p in enumerate(inputs)]
+        code += filler(language, lines, rng)
+        code += [write_line(language, p, 0) for p in outputs]
+
+        rel = f"code/stage_{i // FILES_PER_STAGE}/s{i}{EXTENSIONS[kind]}"
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if kind == "notebook":
+            path.write_text(notebook(language, code, output_kb, rng))
+        else:
+            path.write_text("\n".join(code) + "\n")
+        scripts.append((rel, kind, outputs))
+
+    # Data files, with mtimes following the pipeline order so most are up to date
+    base = 1_600_000_000
+    data_files = raw + [p for outs in produced for p in outs]
+    for n, rel in enumerate(data_files):
+        path = root / rel
+        path.write_bytes(f"# {rel}\n".encode() + rng.randbytes(data_kb * 1024))
+        os.utime(path, (base + 10 * n + 5, base + 10 * n + 5))
+    position = {rel: n for n, rel in enumerate(data_files)}
+    for rel, _, outputs in scripts:
+        t = base + 10 * position[outputs[0]]
+        if rng.random() < STALE_FRACTION:
+            t += 10 ** 6  # edited after its outputs were written
+        os.utime(root / rel, (t, t))
+
+    duplicates = rng.sample(data_files, int(len(data_files) * DUPLICATE_FRACTION))
+    for rel in duplicates:
+        content = (root / rel).read_bytes()
+        name = rel.replace("/", "_")
+        (root / "data" / "archive" / name).write_bytes(content)
+        (root / "server_copy" / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / "server_copy" / rel).write_bytes(content)
+
+    # Makefile: variables plus rules for every tenth script's outputs
+    make = ["RAW := data/raw/", "INT := data/int/", "OUT := output/", "", ".PHONY: all", "all:", ""]
+    run = {"R": "Rscript", "python": "python3", "julia": "julia", "stata": "stata -b do",
+           "notebook": "jupyter nbconvert --execute --to notebook --inplace"}
+    for rel, kind, outputs in scripts[::10]:
+        targets = " ".join(f"$(INT){p.split('/')[-1]}" for p in outputs)
+        make += [f"{targets}: {rel}", f"\t{run[kind]} {rel}", ""]
+    (root / "Makefile").write_text("\n".join(make))
+
+    return {
+        "files": n_files,
+        "by_kind": {kind: kinds.count(kind) for kind in mix},
+        "data_files": len(data_files),
+        "duplicates": len(duplicates),
+    }
+
+
+def main():
+    usage = ("Usage: python3 synth_project.py <out_dir> [--files N] [--seed S] [--mix R,PY,JL,DO,NB] "
+             "[--lines L] [--output-kb K] [--data-kb K]")
+    if "-h" in sys.argv or "--help" in sys.argv:
+        print(usage)
+        sys.exit(0)
+    if len(sys.argv) < 2 or sys.argv[1].startswith("-"):
+        print(usage, file=sys.stderr)
+        sys.exit(1)
+
+    options = {"--files": 100, "--seed": 0, "--lines": 100, "--output-kb": 64, "--data-kb": 4}
+    mix = None
+    argv = sys.argv
+    try:
+        for flag in options:
+            if flag in argv:
+                options[flag] = int(argv[argv.index(flag) + 1])
+        if "--mix" in argv:
+            mix = parse_mix(argv[argv.index("--mix") + 1])
+    except (IndexError, ValueError) as e:
+        print(f"Bad option: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    root = Path(argv[1]).resolve()
+    if root.exists() and any(root.iterdir()):
+        print(f"{root} is not empty", file=sys.stderr)
+        sys.exit(1)
+    summary = generate_project(root, options["--files"], options["--seed"], mix, options["--lines"],
+                               options["--output-kb"], options["--data-kb"])
+    print(f"Generated {root}: {json.dumps(summary)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
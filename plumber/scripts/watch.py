@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+watch.py — Keep current/dag.json live while the project is being edited.
+
+Usage: python3 watch.py <project_root> [--poll] [--interval S] [--debounce S] [--jobs N]
+                [--make-db]
+       python3 watch.py <project_root> --status
+       python3 watch.py <project_root> --staleness [--json] [--fingerprint]
+Output: rewrites current/dag.json and current/dag_meta.json after every burst
+of changes, appending each structural change to current/dag_changes.jsonl
+(dag_diff.py); current/watch.json records the daemon's pid, last update and
+latest change_seq.
+--status asks the running daemon for its state (falling back to watch.json)
+and exits 0 if it is running, 1 if not. --staleness prints the staleness
+report (as staleness.py would) computed by the daemon from its in-memory DAG,
+and exits 1 if no daemon is running.
+
+Watches scripts, notebooks, settings files and Makefiles with inotify (via
+libc, no extra dependency), or by re-walking the tree every --interval seconds
+(default 2) where inotify is unavailable or with --poll. Changes are collected
+until the tree has been quiet for --debounce seconds (default 0.5), so an
+editor's save-rename-chmod burst or a git checkout triggers one update.
+
+The scan records of every file and the DAG's graph are held in memory. A
+change to a script or notebook rescans just that file and patches the graph:
+its old script node and edges come out, the new ones go in, and data nodes
+left with no edges (and not Makefile targets) are dropped. Warnings, cycles
+and the topological order are then re-derived from the patched graph
+(build_dag.complete_dag: no rescanning or path resolution). A change to a
+Makefile reloads its targets, and the whole state only if the variables it
+defines changed; a change to a settings file reloads the variable table and
+rescans what it affects (build_dag.py --incremental rules). --make-db reads
+Makefile targets from make's database, as build_dag.py --make-db does.
+
+Queries are answered over current/watch.sock (one JSON request and reply per
+connection) while the daemon runs.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from bisect import insort
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from build_dag import (
+    DependencyGraph,
+    PathNormalizer,
+    add_scan_record,
+    classify_data_node,
+    complete_dag,
+    dag_summary,
+    file_digest,
+    find_makefile_targets,
+    incremental_scan,
+    load_previous_meta,
+    set_project_type,
+    write_dag,
+    write_json_atomic,
+)
+from project_walk import NOTEBOOK_EXTENSIONS, SCRIPT_EXTENSIONS, SETTINGS_NAMES, is_excluded_dir, walk_files
+from scan_notebook import find_notebooks, has_io, parse_jobs_arg, prepare_scan, scan_notebook
+from scan_script import find_scripts, scan_script
+from settings_vars import load_settings_vars
+from staleness import check_staleness, format_report
+
+STATUS_NAME = "watch.json"
+SOCKET_NAME = "watch.sock"
+MAKEFILES = ("Makefile", "code/Makefile")
+MAX_DELAY = 5.0  # publish at least this often during a continuous burst
+QUERY_TIMEOUT_S = 120
+
+# linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")
+
+
+def is_relevant(rel: str) -> bool:
+    """Whether a file (relative to the project root) can affect the DAG."""
+    name = os.path.basename(rel)
+    return (os.path.splitext(name)[1].lower() in SCRIPT_EXTENSIONS | NOTEBOOK_EXTENSIONS
+            or name in SETTINGS_NAMES or rel in MAKEFILES)
+
+
+class PollingWatcher:
+    """Re-walks the tree each interval and reports files whose (mtime, size) changed."""
+
+    backend = "poll"
+
+    def __init__(self, project_root: Path, interval: float):
+        self.project_root = project_root
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self) -> dict[str, tuple[int, int]]:
+        found = walk_files(self.project_root, SCRIPT_EXTENSIONS | NOTEBOOK_EXTENSIONS,
+                           SETTINGS_NAMES + ["Makefile"])
+        snapshot = {}
+        for paths in found.values():
+            for p in paths:
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                rel = str(p.relative_to(self.project_root))
+                if is_relevant(rel):
+                    snapshot[rel] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def events(self, timeout: float) -> set[str] | None:
+        """Relative paths changed since the last call (waits up to timeout)."""
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.take_snapshot()
+        changed = {rel for rel in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(rel) != self.snapshot.get(rel)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """inotify watches on every non-excluded directory of the project.
+
+    Raises OSError if inotify is unavailable or the watch limit
+    (fs.inotify.max_user_watches) is too low for the tree.
+    """
+
+    backend = "inotify"
+
+    def __init__(self, project_root: Path):
+        self.project_root = project_root
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify not supported")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self.dirs: dict[int, str] = {}  # watch descriptor -> path relative to root ("" for root)
+        try:
+            self.add_tree("")
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_tree(self, rel_dir: str) -> list[str]:
+        """Watch rel_dir and its subdirectories; returns the relevant files found in them."""
+        found = []
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            full = os.path.join(self.project_root, rel)
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(full), WATCH_MASK)
+            if wd < 0:
+                e = ctypes.get_errno()
+                if e in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue  # vanished or unreadable: nothing to watch
+                raise OSError(e, f"inotify_add_watch {full}: {os.strerror(e)}")
+            self.dirs[wd] = rel
+            try:
+                with os.scandir(full) as it:
+                    for entry in it:
+                        child = os.path.join(rel, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            if not is_excluded_dir(entry.name):
+                                stack.append(child)
+                        elif is_relevant(child):
+                            found.append(child)
+            except OSError:
+                continue
+        return found
+
+    def events(self, timeout: float) -> set[str] | None:
+        """Relative paths changed since the last call, or None if events were
+        lost (queue overflow) and the whole tree must be rechecked."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[str] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    return self.rewatch()
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    self.dirs.pop(wd, None)
+                    continue
+                parent = self.dirs.get(wd)
+                if parent is None or not name:
+                    continue
+                rel = os.path.join(parent, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not is_excluded_dir(name):
+                        # Files may land before the watch is in place: report them all
+                        changed.update(self.add_tree(rel))
+                    elif mask & IN_MOVED_FROM:
+                        return self.rewatch()  # watches below it now have stale paths
+                elif is_relevant(rel):
+                    changed.add(rel)
+
+    def rewatch(self) -> None:
+        """Drop every watch and re-add them from the current tree."""
+        for wd in self.dirs:
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.dirs.clear()
+        self.add_tree("")
+        return None
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(project_root: Path, poll: bool, interval: float):
+    if not poll:
+        try:
+            return InotifyWatcher(project_root)
+        except OSError as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s", file=sys.stderr)
+    return PollingWatcher(project_root, interval)
+
+
+class DagState:
+    """Scan context, scan records, Makefile targets and the DAG's graph for a
+    project, kept in memory between updates. `lock` is held while the state
+    changes and while a query reads it."""
+
+    def __init__(self, project_root: Path, jobs: int = 1, use_make: bool = False):
+        self.project_root = project_root
+        self.jobs = jobs
+        self.use_make = use_make
+        self.lock = threading.Lock()
+        self.dag: dict | None = None
+        self.target_ids: set[str] = set()
+        self.reload(load_previous_meta(project_root / "current" / "dag_meta.json"))
+
+    def reload(self, previous_meta: dict) -> None:
+        """Re-walk the tree, reload the settings and rebuild the graph;
+        unchanged files keep their records."""
+        self.ctx = prepare_scan(self.project_root)
+        _, _, self.meta = incremental_scan(self.ctx, previous_meta, self.jobs)
+        self.normalizer = PathNormalizer(self.project_root)
+        self.graph = DependencyGraph()
+        self.unresolved: dict[str, list[dict]] = {}
+        notebook_scan, script_scan = self.scan_lists()
+        for record in notebook_scan + script_scan:
+            self.add_record(record)
+        self.target_ids = set()
+        self.load_targets()
+
+    def load_targets(self) -> None:
+        """Re-read the Makefile targets; data nodes only they kept alive are dropped."""
+        self.makefile_targets = find_makefile_targets(self.project_root, self.ctx["variables"], self.use_make)
+        old_ids = self.target_ids
+        self.target_ids = {self.normalizer.normalize(t) for t in self.makefile_targets}
+        for node_id in old_ids - self.target_ids:
+            self.drop_if_unused(node_id)
+
+    def drop_if_unused(self, node_id: str) -> None:
+        node = self.graph.nodes.get(node_id)
+        if (node is not None and node["type"] == "data" and not self.graph.degree(node_id)
+                and node_id not in self.target_ids):
+            self.graph.remove_node(node_id)
+
+    def add_record(self, record: dict) -> None:
+        if has_io(record):
+            self.unresolved[record["file"]] = add_scan_record(self.graph, record,
+                                                              self.normalizer.normalize)
+
+    def remove_record(self, rel: str) -> None:
+        """Take a file's script node and its own edges out of the graph."""
+        self.unresolved.pop(rel, None)
+        node = self.graph.nodes.get(rel)
+        if node is None:
+            return
+        # A script's own edges are its reads (in, consumed_by) and writes (out,
+        # produces); edges in the other direction belong to scripts that read
+        # or write the script's path as data
+        own = ([e for e in self.graph.out_edges.get(rel, []) if e["relation"] == "produces"]
+               + [e for e in self.graph.in_edges.get(rel, []) if e["relation"] == "consumed_by"])
+        for e in own:
+            self.graph.remove_edge(e["from"], e["to"], e["relation"])
+        if node["type"] == "script":
+            if self.graph.degree(rel) or rel in self.target_ids:
+                self.graph.nodes[rel] = {"id": rel, "type": "data", "subtype": classify_data_node(rel)}
+            else:
+                self.graph.remove_node(rel)
+        for e in own:
+            self.drop_if_unused(e["to"] if e["relation"] == "produces" else e["from"])
+
+    def affects_settings(self, rel: str) -> bool:
+        return (rel in self.ctx["settings_files"] and rel not in MAKEFILES
+                or os.path.basename(rel) in SETTINGS_NAMES)
+
+    def apply(self, changed: set[str] | None) -> int:
+        """Bring the records and graph up to date with changed files (None:
+        anything may have changed). Returns the number of records changed,
+        -1 after a reload."""
+        if changed is None or any(self.affects_settings(rel) for rel in changed):
+            self.reload(self.meta)
+            return -1
+        updated = 0
+        makefiles = {rel for rel in changed if rel in MAKEFILES}
+        if makefiles:
+            # Makefiles also define path variables: a change to those means a reload
+            settings_files = [sf for sf in self.ctx["settings_files"] if sf not in MAKEFILES]
+            settings_files += [mf for mf in MAKEFILES if (self.project_root / mf).exists()]
+            if (settings_files != self.ctx["settings_files"]
+                    or load_settings_vars(self.project_root, settings_files) != self.ctx["variables"]):
+                self.reload(self.meta)
+                return -1
+            self.load_targets()
+            updated += 1
+        return updated + sum(self.rescan(rel) for rel in sorted(changed - makefiles))
+
+    def rescan(self, rel: str) -> bool:
+        """Rescan one script or notebook, or drop it if it is gone, and patch
+        the graph. Returns whether its record changed."""
+        path = self.project_root / rel
+        ext = path.suffix.lower()
+        if ext not in SCRIPT_EXTENSIONS | NOTEBOOK_EXTENSIONS:
+            return False
+        bucket = self.ctx["files"].setdefault(ext, [])
+        file_hashes, scan_records = self.meta["file_hashes"], self.meta["scan_records"]
+        try:
+            digest = file_digest(path) if path.is_file() else None
+        except OSError:
+            digest = None
+        if digest is None:
+            if path in bucket:
+                bucket.remove(path)
+            file_hashes.pop(rel, None)
+            self.remove_record(rel)
+            return scan_records.pop(rel, None) is not None
+        if path not in bucket:
+            insort(bucket, path)
+        if file_hashes.get(rel) == digest and rel in scan_records:
+            return False  # touched or rewritten with the same content
+        scan_fn = scan_notebook if ext in NOTEBOOK_EXTENSIONS else scan_script
+        file_hashes[rel] = digest
+        scan_records[rel] = scan_fn(path, self.ctx["variables"], self.project_root)
+        self.remove_record(rel)
+        self.add_record(scan_records[rel])
+        return True
+
+    def scan_lists(self) -> tuple[list[dict], list[dict]]:
+        """(notebook_scan, script_scan) from the cached records, in scan order."""
+        root, ctx = self.project_root, self.ctx
+        records = self.meta["scan_records"]
+
+        def with_io(paths: list[Path]) -> list[dict]:
+            rels = (str(p.relative_to(root)) for p in paths)
+            return [records[rel] for rel in rels if rel in records and has_io(records[rel])]
+
+        return (with_io(find_notebooks(root, ctx["files"])),
+                with_io(find_scripts(root, ctx["settings_files"], ctx["files"])))
+
+    def publish(self) -> dict:
+        """Derive the DAG from the graph and write it (build_dag.write_dag)."""
+        unresolved = [u for entries in self.unresolved.values() for u in entries]
+        dag = complete_dag(self.project_root, self.graph, self.makefile_targets,
+                           self.normalizer.normalize, unresolved)
+        set_project_type(dag)
+        write_dag(self.project_root, dag, self.meta)
+        self.dag = dag
+        return dag
+
+
+def socket_path(project_root: Path) -> Path:
+    return project_root / "current" / SOCKET_NAME
+
+
+def answer(state: DagState, status: dict, request: dict) -> dict:
+    """Reply to one query: {"query": "status"} or {"query": "staleness"[, "fingerprint": true]}."""
+    query = request.get("query")
+    with state.lock:
+        if query == "status":
+            return {**status, "nodes": len(state.dag["nodes"]), "edges": len(state.dag["edges"]),
+                    "warnings": len(state.dag["warnings"])}
+        if query == "staleness":
+            report = check_staleness(state.dag, state.project_root,
+                                     fingerprint=bool(request.get("fingerprint")))
+            write_json_atomic(state.project_root / "current" / "staleness.json", report)
+            return report
+    return {"error": f"unknown query {query!r}"}
+
+
+def serve_queries(state: DagState, status: dict) -> socketserver.BaseServer | None:
+    """Answer queries on current/watch.sock from a background thread, or
+    return None if the socket cannot be created (the daemon runs without it)."""
+    path = socket_path(state.project_root)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                reply = answer(state, status, json.loads(self.rfile.readline()))
+            except (ValueError, AttributeError) as e:
+                reply = {"error": f"bad request: {e}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    server_class = getattr(socketserver, "ThreadingUnixStreamServer", None)
+    if server_class is None:
+        return None
+    try:
+        path.unlink(missing_ok=True)
+        server = server_class(str(path), Handler)
+    except OSError as e:
+        print(f"Query socket unavailable ({e}); --status reads watch.json", file=sys.stderr)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def query_daemon(project_root: Path, request: dict) -> dict | None:
+    """The running daemon's reply to request, or None if it cannot be reached."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(QUERY_TIMEOUT_S)
+            sock.connect(str(socket_path(project_root)))
+            sock.sendall((json.dumps(request) + "\n").encode())
+            with sock.makefile("rb") as f:
+                return json.loads(f.readline())
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def status_path(project_root: Path) -> Path:
+    return project_root / "current" / STATUS_NAME
+
+
+def running_status(project_root: Path) -> dict | None:
+    """watch.json of a live daemon for this project, else None."""
+    try:
+        with open(status_path(project_root)) as f:
+            status = json.load(f)
+        os.kill(status["pid"], 0)
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        return None
+    return status
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def parse_float_arg(argv: list[str], flag: str, default: float) -> float:
+    if flag not in argv:
+        return default
+    try:
+        return float(argv[argv.index(flag) + 1])
+    except (IndexError, ValueError):
+        print(f"{flag} expects a number of seconds", file=sys.stderr)
+        sys.exit(1)
+
+
+def watch(project_root: Path, poll: bool, interval: float, debounce: float, jobs: int,
+          use_make: bool = False) -> None:
+    state = DagState(project_root, jobs, use_make)
+    dag = state.publish()
+    watcher = make_watcher(project_root, poll, interval)
+    status = {"pid": os.getpid(), "project_root": str(project_root), "backend": watcher.backend,
+              "started": now_iso(), "last_update": now_iso(), "updates": 0,
+              "change_seq": dag["change_seq"], "pending": 0}
+    write_json_atomic(status_path(project_root), status)
+    server = serve_queries(state, status)
+    print(f"Watching {project_root} ({watcher.backend}): {dag_summary(dag)}", file=sys.stderr)
+
+    pending: set[str] | None = set()
+    first = last = 0.0
+    try:
+        while True:
+            waiting = pending is None or bool(pending)
+            changed = watcher.events(debounce if waiting else 1.0)
+            now = time.monotonic()
+            if changed is None or changed:
+                if not waiting:
+                    first = now
+                last = now
+                pending = None if changed is None or pending is None else pending | changed
+                status["pending"] = "all" if pending is None else len(pending)
+            elif not waiting:
+                continue
+            if now - last < debounce and now - first < MAX_DELAY:
+                continue
+
+            started = time.monotonic()
+            with state.lock:
+                rescanned = state.apply(pending)
+                if rescanned != 0:
+                    dag = state.publish()
+                    status["last_update"] = now_iso()
+                    status["updates"] += 1
+                    status["change_seq"] = dag["change_seq"]
+                status["pending"] = 0
+            if rescanned != 0:
+                write_json_atomic(status_path(project_root), status)
+                what = "settings reloaded" if rescanned < 0 else f"{rescanned} file(s) changed"
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {what}, "
+                      f"updated in {time.monotonic() - started:.2f}s: {dag_summary(dag)} "
+                      f"(change #{dag['change_seq']})",
+                      file=sys.stderr)
+            pending = set()
+    finally:
+        watcher.close()
+        if server is not None:
+            server.server_close()
+        if (running_status(project_root) or {}).get("pid") == os.getpid():
+            status_path(project_root).unlink(missing_ok=True)
+            if server is not None:
+                socket_path(project_root).unlink(missing_ok=True)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 watch.py <project_root> [--poll] [--interval S] [--debounce S] "
+              "[--jobs N] [--make-db] [--status] [--staleness [--json] [--fingerprint]]", file=sys.stderr)
+        sys.exit(1)
+
+    jobs, argv = parse_jobs_arg(sys.argv)
+    project_root = Path(argv[1]).resolve()
+    status = running_status(project_root)
+
+    if "--status" in argv:
+        if status is None:
+            print("No watch daemon running", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(query_daemon(project_root, {"query": "status"}) or status, indent=2))
+        return
+
+    if "--staleness" in argv:
+        report = None
+        if status is not None:
+            report = query_daemon(project_root, {"query": "staleness", "fingerprint": "--fingerprint" in argv})
+        if report is None or "error" in report:
+            print((report or {}).get("error", "No watch daemon answering; run staleness.py instead"),
+                  file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(report, indent=2) if "--json" in argv else format_report(report))
+        return
+
+    if status is not None:
+        print(f"Already watching {project_root} (pid {status['pid']})", file=sys.stderr)
+        sys.exit(1)
+
+    def stop(signum, frame):
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, stop)
+    try:
+        watch(project_root, "--poll" in argv, parse_float_arg(argv, "--interval", 2.0),
+              parse_float_arg(argv, "--debounce", 0.5), jobs, "--make-db" in argv)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()